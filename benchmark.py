@@ -0,0 +1,246 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import timeit
+import numpy as np
+
+RESULTS_FILE = 'bench_results.json'  # Written by every run
+BASELINE_FILE = 'bench_baseline.json'  # Compared against with --compare
+DEFAULT_THRESHOLD = 0.20  # A benchmark this much slower than the baseline is a regression
+REPEAT = 5  # Timed repetitions; the median is reported
+
+SELECTION_SIZES = (1, 10, 100, 1000, 10000, 100000)  # Event ids per selection expression
+ROW_COUNTS = (100, 1000, 5000)  # Rows added to EventsScreen
+CUBE_SIZES = (8, 16, 32)  # LEDs per cube edge
+HIT_COUNTS = (10000, 100000, 1000000)  # Hits per rendered event
+CHANGED_FRACTION = 0.05  # Voxels changing between two frames in the delta encoding benchmark
+
+
+def measure(function, repeat=REPEAT, **extra):
+    """Time `function()`; the call count per repetition is calibrated to run for at least 0.2 s."""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    times = [total / number for total in timer.repeat(repeat, number)]
+    return {'seconds': float(np.median(times)), 'best': min(times), 'calls': number, **extra}
+
+
+def throughput(result, amount, unit):
+    """Add a rate (amount per second) to a result."""
+    result['rate'] = amount / result['seconds']
+    result['unit'] = unit
+    return result
+
+
+def random_hits(count, seed=0):
+    """Synthetic event: hits spread over a 100-unit detector box over 1000 time units."""
+    random = np.random.default_rng(seed)
+    hits = random.random((count, 5))
+    hits[:, :3] *= 100.0
+    hits[:, 4] *= 1000.0
+    return hits
+
+
+def bench_catalog():
+    from event_catalog import EventCatalog, SELECT_FILE
+    return {'catalog.load': measure(lambda: EventCatalog(SELECT_FILE))}
+
+
+def bench_selection():
+    from event_selection import EventSelection
+    results = {}
+    for size in SELECTION_SIZES:
+        # Worst case for the parser: one token per id; and the common case of one range
+        listed = ','.join(str(event_id) for event_id in range(1, 2 * size, 2))
+        ranged = f'1-{size},!{max(1, size // 2)}'
+        results[f'selection.parse_list.{size}'] = throughput(
+            measure(lambda: EventSelection.parse(listed).within(2 * size), ids=size), size, 'ids/s')
+        results[f'selection.parse_range.{size}'] = measure(
+            lambda: EventSelection.parse(ranged).within(size), ids=size)
+    return results
+
+
+def bench_rows():
+    """add_input_row and validation on a real EventsScreen, in an offscreen window."""
+    os.environ.setdefault('KIVY_NO_ARGS', '1')
+    os.environ.setdefault('SDL_VIDEODRIVER', 'offscreen')
+    from kivy.base import EventLoop
+    from kivy.clock import Clock
+    from events_screen import EventsScreen
+    from frame_ring import close_render_client
+
+    EventLoop.ensure_window()
+    screen = EventsScreen(name='events')
+    EventLoop.window.add_widget(screen)
+    data = screen.catalog.data
+    results = {}
+    try:
+        for count in ROW_COUNTS:
+            del screen.input_rows[:]
+            started = time.perf_counter()
+            for _ in range(count):
+                screen.add_input_row()
+            added = time.perf_counter() - started
+
+            started = time.perf_counter()
+            Clock.tick()  # The RecycleView lays out and creates the visible row widgets
+            layout = time.perf_counter() - started
+
+            for row in screen.input_rows:
+                row.update(flavour='Background', energy='N/A', events='1-5,8')
+            validate = measure(lambda: [screen.validate_input(row, row['events'], data) for row in screen.input_rows],
+                               repeat=3, rows=count)
+
+            results[f'rows.add.{count}'] = throughput({'seconds': added, 'rows': count}, count, 'rows/s')
+            results[f'rows.layout.{count}'] = {'seconds': layout, 'rows': count}
+            results[f'rows.validate.{count}'] = throughput(validate, count, 'rows/s')
+    finally:
+        close_render_client()
+    return results
+
+
+def bench_render():
+    from voxel_renderer import CubeGeometry, VoxelRenderer
+    from colour_map import ColourMap
+    results = {}
+    for size in CUBE_SIZES:
+        renderer = VoxelRenderer(CubeGeometry(size))
+        for count in HIT_COUNTS:
+            hits = random_hits(count)
+            results[f'render.{size}.{count}'] = throughput(
+                measure(lambda: renderer.render(hits), repeat=3, size=size, hits=count), count, 'hits/s')
+            # The same hits as EventStore hands them out: float32, one contiguous array per column
+            stored = np.asfortranarray(hits, dtype=np.float32)
+            results[f'render.store.{size}.{count}'] = throughput(
+                measure(lambda: renderer.render(stored), repeat=3, size=size, hits=count), count, 'hits/s')
+
+        # Colouring a full second of Dynamic frames: single colour vs lookup tables with power limiting
+        grid = np.random.default_rng(2).random((60, size ** 3))
+        mapped = VoxelRenderer(CubeGeometry(size), colour_map=ColourMap(max_current=size ** 3 * 0.01), palette='heat')
+        for name, shading in (('linear', renderer), ('lut', mapped)):
+            results[f'render.shade.{name}.{size}'] = throughput(
+                measure(lambda: shading.shade(grid), size=size), grid.size, 'voxels/s')
+    return results
+
+
+def bench_output():
+    from cube_output import SimulatorDriver, encode_delta, encode_keyframe
+    from voxel_renderer import CubeGeometry, VoxelRenderer
+    results = {}
+    for size in CUBE_SIZES:
+        frame = VoxelRenderer(CubeGeometry(size)).render(random_hits(size ** 3 // 4))
+        changed = frame.copy()
+        voxels = changed.reshape(-1, 3)
+        picked = np.random.default_rng(1).choice(len(voxels), int(len(voxels) * CHANGED_FRACTION), replace=False)
+        voxels[picked] ^= 0x40
+
+        # Rates are in bytes of raw frame data encoded per second
+        results[f'output.keyframe.{size}'] = throughput(
+            measure(lambda: encode_keyframe(frame), size=size), frame.nbytes, 'B/s')
+        results[f'output.delta.{size}'] = throughput(
+            measure(lambda: encode_delta(frame, changed), size=size), frame.nbytes, 'B/s')
+
+        # Full driver path: alternating frames, so every send encodes and applies a delta
+        driver = SimulatorDriver()
+        frames = (frame, changed)
+        sent = [0]
+
+        def send():
+            driver.send_frame(frames[sent[0] & 1])
+            sent[0] += 1
+        results[f'output.driver.{size}'] = throughput(measure(send, size=size), 1, 'frames/s')
+    return results
+
+
+BENCHMARKS = {
+    'catalog': bench_catalog,
+    'selection': bench_selection,
+    'rows': bench_rows,
+    'render': bench_render,
+    'output': bench_output
+}
+
+
+def run(names):
+    results = {}
+    for name in names:
+        print(f"Running {name}...")
+        results.update(BENCHMARKS[name]())
+    return {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'cpus': os.cpu_count()
+        },
+        'results': results
+    }
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """Print current vs baseline times; returns the names of the benchmarks that regressed."""
+    regressions = []
+    for name, result in sorted(current['results'].items()):
+        reference = baseline['results'].get(name)
+        if reference is None:
+            print(f"  {name:<36}{result['seconds'] * 1000.0:12.3f} ms   (new)")
+            continue
+        ratio = result['seconds'] / reference['seconds']
+        flag = ''
+        if ratio > 1.0 + threshold:
+            flag = 'REGRESSION'
+            regressions.append(name)
+        elif ratio < 1.0 - threshold:
+            flag = 'faster'
+        print(f"  {name:<36}{result['seconds'] * 1000.0:12.3f} ms  {ratio:6.2f}x  {flag}")
+    return regressions
+
+
+def report(current):
+    for name, result in sorted(current['results'].items()):
+        rate = f"  {result['rate']:.3g} {result['unit']}" if 'rate' in result else ''
+        print(f"  {name:<36}{result['seconds'] * 1000.0:12.3f} ms{rate}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Headless performance benchmarks for the LED cube GUI.')
+    parser.add_argument('names', nargs='*', metavar='name',
+                        help=f"benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument('--no-window', action='store_true', help='skip the benchmarks that need a Kivy window')
+    parser.add_argument('--output', default=RESULTS_FILE, help='JSON file for the results')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='stored baseline JSON')
+    parser.add_argument('--compare', action='store_true', help='flag regressions against the baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='relative slowdown counted as a regression (default 0.2)')
+    parser.add_argument('--update-baseline', action='store_true', help='store these results as the baseline')
+    args = parser.parse_args()
+
+    names = args.names or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+    if args.no_window:
+        names = [name for name in names if name != 'rows']
+    current = run(names)
+
+    with open(args.output, 'w') as file:
+        json.dump(current, file, indent=2)
+    print(f"Wrote {len(current['results'])} results to {args.output}")
+
+    if args.compare:
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+        regressions = compare(current, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+    else:
+        report(current)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(current, file, indent=2)
+        print(f"Stored the baseline in {args.baseline}")
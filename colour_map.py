@@ -0,0 +1,133 @@
+import colorsys
+import os
+import numpy as np
+from event_catalog import BACKGROUND
+
+LUT_SIZE = 256  # Brightness levels: quantized charge indexes the tables directly as uint8
+DEFAULT_GAMMA = 2.2  # LEDs are linear in PWM, eyes are not
+CHANNEL_CURRENT = 0.020  # Amps drawn by one LED channel at full brightness
+MAX_CURRENT_ENV = 'CUBE_MAX_CURRENT'  # Power supply budget in amps for the default colour map, 0 for none
+# Budget when neither the caller nor $CUBE_MAX_CURRENT sets one: a 5 V 10 A supply, about a third of
+# a fully lit 8x8x8 cube (512 LEDs x 3 channels x CHANNEL_CURRENT)
+DEFAULT_MAX_CURRENT = 10.0
+BY_FLAVOUR = 'flavour'  # Renderer palette meaning "the palette of each event's flavour"
+DEFAULT_PALETTE = 'white'
+
+# Colour stops from the faintest to the strongest deposit; brightness comes from the gamma curve
+PALETTES = {
+    'white': [(255, 255, 255)],
+    'heat': [(0, 0, 255), (0, 255, 0), (255, 255, 0), (255, 0, 0)],
+    'ice': [(0, 40, 255), (0, 200, 255), (255, 255, 255)]
+}
+
+# Palettes of the flavours in select.json (by name); flavours not listed here get a hue of their own
+FLAVOUR_PALETTES = {
+    'nue': [(0, 80, 255), (0, 200, 255), (255, 255, 255)],
+    'nue_bar': [(120, 0, 255), (200, 120, 255), (255, 255, 255)],
+    'numu': [(0, 160, 0), (120, 255, 0), (255, 255, 255)],
+    'numu_bar': [(0, 150, 120), (0, 255, 200), (255, 255, 255)],
+    'nutau': [(200, 0, 0), (255, 120, 0), (255, 255, 255)],
+    'nutau_bar': [(200, 0, 120), (255, 80, 200), (255, 255, 255)],
+    BACKGROUND: [(90, 90, 90), (170, 170, 170), (255, 255, 255)]
+}
+
+
+def hue_palette(index, count):
+    """Palette for a flavour without a predefined one: a hue of its own, fading to white."""
+    r, g, b = colorsys.hsv_to_rgb(index / max(count, 1), 1.0, 1.0)
+    return [(int(r * 255), int(g * 255), int(b * 255)), (255, 255, 255)]
+
+
+def build_lut(stops, gamma=DEFAULT_GAMMA, size=LUT_SIZE):
+    """(size, 3) uint8 table: colour interpolated between the stops, brightness level ** gamma."""
+    stops = np.asarray(stops, dtype=np.float64).reshape(-1, 3)
+    level = np.linspace(0.0, 1.0, size)
+    positions = np.linspace(0.0, 1.0, len(stops))
+    colours = np.stack([np.interp(level, positions, stops[:, channel]) for channel in range(3)], axis=1)
+    return np.rint(colours * (level ** gamma)[:, None]).astype(np.uint8)
+
+
+class ColourMap:
+    """Charge level -> LED colour through precomputed lookup tables, with frame-level power limiting.
+
+    Every palette is baked into its own table once, gamma included, so colouring a frame is a
+    single quantization to uint8 plus one table lookup, and switching palettes only picks another
+    table. With `max_current` (amps), frames that would draw more are dimmed to fit the budget.
+    """
+
+    def __init__(self, palettes=None, gamma=DEFAULT_GAMMA, max_current=None, channel_current=CHANNEL_CURRENT):
+        self.palettes = dict(PALETTES if palettes is None else palettes)
+        self.gamma = gamma
+        self.max_current = max_current
+        self.channel_current = channel_current
+        self.luts = {name: build_lut(stops, gamma) for name, stops in self.palettes.items()}
+        # Current of each table entry in channel units (255 = one channel fully on)
+        self.currents = {name: lut.sum(axis=1, dtype=np.uint32) for name, lut in self.luts.items()}
+        self._key = (tuple(sorted((name, tuple(map(tuple, stops))) for name, stops in self.palettes.items())),
+                     gamma, max_current, channel_current)
+
+    @classmethod
+    def from_catalog(cls, catalog, **kwargs):
+        """Generic palettes plus one palette per flavour in the catalog (and Background)."""
+        palettes = dict(PALETTES)
+        names = catalog.flavour_names + [BACKGROUND]
+        for index, name in enumerate(names):
+            palettes[name] = FLAVOUR_PALETTES.get(name) or hue_palette(index, len(names))
+        return cls(palettes, **kwargs)
+
+    def key(self):
+        """Hashable description of the tables (used e.g. to key caches)."""
+        return self._key
+
+    def palette_for(self, flavour):
+        """Palette name used for a flavour's events."""
+        return flavour if flavour in self.luts else DEFAULT_PALETTE
+
+    def quantize(self, level):
+        """Levels in [0, 1] (any shape) -> uint8 table indices."""
+        return (np.asarray(level) * (LUT_SIZE - 1) + 0.5).astype(np.uint8)
+
+    def apply(self, level, palette=None):
+        """Colour levels in [0, 1] of shape (..., voxels) -> uint8 RGB of shape (..., voxels, 3)."""
+        palette = palette if palette in self.luts else DEFAULT_PALETTE
+        index = self.quantize(level)
+        rgb = self.luts[palette][index]
+        if self.max_current is not None:
+            rgb = self.limit(rgb, self.currents[palette][index].sum(axis=-1))
+        return rgb
+
+    @property
+    def budget(self):
+        """Allowed current per frame in channel units, or None without a limit."""
+        if self.max_current is None:
+            return None
+        return self.max_current / self.channel_current * 255.0
+
+    def limit(self, rgb, current=None):
+        """Dim the frames of (..., voxels, 3) uint8 `rgb` whose current exceeds the budget."""
+        if self.max_current is None:
+            return rgb
+        if current is None:
+            current = rgb.sum(axis=(-2, -1), dtype=np.uint64)
+        over = current > self.budget
+        if not np.any(over):
+            return rgb
+        scale = np.where(over, self.budget / np.maximum(current, 1), 1.0)[..., None, None]
+        return (rgb * scale).astype(np.uint8)  # Rounds down, so the result stays within budget
+
+
+def default_colour_map(catalog, max_current=None):
+    """Colour map of the application: flavour palettes and a power budget in amps.
+
+    The budget is `max_current`, else $CUBE_MAX_CURRENT, else DEFAULT_MAX_CURRENT; 0 turns limiting off.
+    """
+    if max_current is None:
+        max_current = float(os.environ.get(MAX_CURRENT_ENV) or DEFAULT_MAX_CURRENT)
+    return ColourMap.from_catalog(catalog, max_current=max_current or None)
+
+
+def power_limit_text(colour_map):
+    """Short description of the power limiting of `colour_map`, for the UI."""
+    if colour_map is None or colour_map.max_current is None:
+        return "Power limit: off"
+    return f"Power limit: {colour_map.max_current:g} A"
@@ -0,0 +1,112 @@
+from collections import namedtuple
+import numpy as np
+from voxel_renderer import T
+from instrumentation import span
+
+ADD, MAX = 'add', 'max'  # Blend modes: sum of the sources (clipped) or brightest source per channel
+STRETCH, ABSOLUTE = 'stretch', 'absolute'  # Time alignment of Dynamic sources, see composite()
+
+# Row colours handed out in turn as rows are added
+PALETTE = [(255, 255, 255), (0, 120, 255), (255, 80, 0), (0, 255, 80), (255, 0, 200), (255, 220, 0)]
+
+# One source of a composite: its rendered frames (frames, N, N, N, 3), the RGB colour it is shown in
+# (None keeps the colours it was rendered in), its weight, and the (start, end) hit time of its event
+# (only needed for ABSOLUTE alignment)
+Layer = namedtuple('Layer', 'frames colour weight t_range')
+
+
+def event_time_range(hits):
+    """(first, last) hit time of an event, (0, 0) if it has no hits."""
+    hits = np.asarray(hits)
+    if not len(hits):
+        return 0.0, 0.0
+    return float(hits[:, T].min()), float(hits[:, T].max())
+
+
+def align_indices(t_ranges, n_frames):
+    """(sources, n_frames) frame index of each source at each output frame on a shared time axis.
+
+    Output frame k shows time up to the end of slice k of [earliest start, latest end]; a source's
+    frame j covers its own event up to the end of its slice j. -1 means the source has not started.
+    """
+    t_ranges = np.asarray(t_ranges, dtype=np.float64).reshape(-1, 2)
+    first, last = t_ranges[:, 0].min(), t_ranges[:, 1].max()
+    ends = first + (last - first) * np.arange(1, n_frames + 1) / n_frames  # End time of each output frame
+
+    starts, durations = t_ranges[:, :1], t_ranges[:, 1:] - t_ranges[:, :1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        position = np.ceil((ends - starts) / durations * n_frames) - 1
+    # Events without duration appear all at once at their start time
+    position = np.where(durations > 0, position, np.where(ends >= starts, n_frames - 1, -1))
+    return np.clip(position, -1, n_frames - 1).astype(np.intp)
+
+
+class Accumulator:
+    """Blends sources into one sequence one at a time, so only one source's frames need to be held.
+
+    With `t_ranges` (every source's hit time range, in the order they will be added) sources are
+    placed on a common time axis (ABSOLUTE); without, each spans the whole sequence (STRETCH).
+    """
+
+    def __init__(self, n_frames, blend=ADD, t_ranges=None):
+        if blend not in (ADD, MAX):
+            raise ValueError(f"unknown blend mode '{blend}'")
+        self.n_frames = n_frames
+        self.blend = blend
+        self._indices = align_indices(t_ranges, n_frames) if t_ranges is not None and n_frames > 1 else None
+        self._out = None  # (frames, voxels, 3) float32 running blend
+        self._shape = None
+        self.added = 0
+
+    def add(self, frames, colour=None, weight=1.0, source=None):
+        """Blend in a source's rendered (frames, N, N, N, 3) sequence, tinted with `colour` if not None.
+
+        `source` is its position in `t_ranges`, by default the order sources are added in.
+        """
+        frames = np.asarray(frames)
+        values = frames.reshape(len(frames), -1, 3)
+        if self._indices is not None:
+            indices = self._indices[self.added if source is None else source]
+            values = values[np.maximum(indices, 0)]
+            dark = indices < 0  # Not started yet
+        self.added += 1
+        if self._out is None:
+            self._out = np.zeros((self.n_frames,) + values.shape[1:], dtype=np.float32)
+            self._shape = frames.shape[1:]
+
+        if colour is not None:
+            # Brightness is the channel maximum of a monochrome frame, shown in the colour
+            gain = np.asarray(colour, dtype=np.float32) / 255.0 * np.float32(weight)
+            contribution = values.max(axis=-1, keepdims=True).astype(np.float32) * gain
+        else:
+            contribution = values.astype(np.float32)
+            contribution *= np.float32(weight)
+        if self._indices is not None:
+            contribution[dark] = 0.0
+
+        if self.blend == ADD:
+            self._out += contribution
+        else:
+            np.maximum(self._out, contribution, out=self._out)
+
+    def result(self):
+        """The blended (frames, N, N, N, 3) uint8 sequence."""
+        np.clip(self._out, 0.0, 255.0, out=self._out)
+        return self._out.astype(np.uint8).reshape((self.n_frames,) + self._shape)
+
+
+def composite(layers, blend=ADD, align=STRETCH):
+    """Merge several rendered sources into one (frames, N, N, N, 3) uint8 sequence.
+
+    A coloured source's brightness is taken from its (monochrome) rendered frames, scaled by its
+    weight and coloured; a source without a colour keeps its rendered (e.g. palette) colours, scaled
+    by its weight. Sources are blended in one by one (see Accumulator). With STRETCH every source
+    spans the whole sequence; with ABSOLUTE sources are placed on a common time axis by their hit
+    times, so a short event plays out within the longer ones around it.
+    """
+    with span('composite'):
+        accumulator = Accumulator(len(layers[0].frames), blend,
+                                  [layer.t_range for layer in layers] if align == ABSOLUTE else None)
+        for layer in layers:
+            accumulator.add(layer.frames, layer.colour, layer.weight)
+        return accumulator.result()
@@ -0,0 +1,211 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from event_catalog import SELECT_FILE, EventCatalog
+from event_selection import validate_selection
+from event_store import EVENTS_DIR, FIRST_EVENT, EventStore
+from voxel_renderer import CubeGeometry, VoxelRenderer
+from colour_map import BY_FLAVOUR, DEFAULT_MAX_CURRENT, PALETTES, default_colour_map, power_limit_text
+from frame_cache import FrameCache, frame_key
+from frame_pipeline import DEFAULT_FRAMES_PER_EVENT, FramePacer
+from submission_worker import CHUNK_EVENTS, cache_mode, render_chunk
+from cube_output import open_driver
+from sequence_file import SequenceFile
+
+# Example: python cube_cli.py -s numu 100 1-5,8 -s Background N/A 1-30 --mode Dynamic --output file:run.cube
+
+
+def validate(catalog, flavour, energy, events):
+    """(flavour name, energy, selection) for one selection, checked like an EventsScreen row.
+
+    Flavours may be given by name or symbol; raises ValueError for anything the GUI would reject.
+    """
+    name = catalog.flavour_name(flavour)
+    energy = str(energy)
+    if catalog.energy_index(name, energy) is None:
+        options = ', '.join(catalog.energies(name)) or 'none, unknown flavour'
+        raise ValueError(f"Unknown energy '{energy}' for {flavour} (options: {options})")
+    return name, energy, validate_selection(str(events), catalog.event_limit(name, energy), minimum=FIRST_EVENT)
+
+
+def load_selections(path):
+    """(flavour, energy, events, mode or None) from a JSON playlist.
+
+    The file is a list of objects with "flavour", "energy", either "events" (an expression such as
+    '1-5,8') or "event" (one id), and optionally "mode". DEMO playlists (demo.json) work as is.
+    """
+    with open(path, 'r') as file:
+        entries = json.load(file)
+    return [(entry['flavour'], entry['energy'], entry.get('events', entry.get('event')), entry.get('mode'))
+            for entry in entries]
+
+
+def expand(selections):
+    """Validated selections -> (mode, (flavour name, energy, event id)) items, in order."""
+    for name, energy, selection, mode in selections:
+        for event_id in selection:
+            yield mode, (name, energy, event_id)
+
+
+def rendered(items, source, renderer, n_frames, workers, cache=None):
+    """Frames of every item in order, rendered up to 2 * `workers` chunks ahead on a process pool.
+
+    With a cache, events are looked up and rendered in this process instead. Items that fail to
+    load are reported on stderr and skipped, as the GUI reports them per row.
+    """
+    def cached(mode, chunk):
+        """render_chunk() in this process, through the frame cache the GUI uses."""
+        results = []
+        for item in chunk:
+            key = frame_key(*item, cache_mode(mode, n_frames), renderer)
+            frames = cache.get(key)
+            if frames is None:
+                result = render_chunk(source, renderer, mode, [item], n_frames)[0]
+                if result[1] is not None:
+                    cache.put(key, result[1])
+            else:
+                result = (item, frames, None)
+            results.append(result)
+        return results
+
+    chunks = _chunks(items)
+    if cache is not None:
+        batches = (cached(mode, chunk) for mode, chunk in chunks)
+    elif workers == 0:
+        batches = (render_chunk(source, renderer, mode, chunk, n_frames) for mode, chunk in chunks)
+    else:
+        batches = _ordered_map(chunks, source, renderer, n_frames, workers)
+
+    for batch in batches:
+        for item, frames, error in batch:
+            if error is not None:
+                print(f"Skipping {item}: {error}", file=sys.stderr)
+                continue
+            yield from frames
+
+
+def _chunks(items):
+    """Group consecutive items of the same mode into chunks of at most CHUNK_EVENTS."""
+    chunk, chunk_mode = [], None
+    for mode, item in items:
+        if chunk and (mode != chunk_mode or len(chunk) == CHUNK_EVENTS):
+            yield chunk_mode, chunk
+            chunk = []
+        chunk_mode = mode
+        chunk.append(item)
+    if chunk:
+        yield chunk_mode, chunk
+
+
+def _ordered_map(chunks, source, renderer, n_frames, workers):
+    """Render chunks on a pool with a bounded window of outstanding chunks, yielding in order."""
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        window = deque()
+        for mode, chunk in chunks:
+            window.append(executor.submit(render_chunk, source, renderer, mode, chunk, n_frames))
+            if len(window) > 2 * workers:  # Keep every worker busy without holding the whole run
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Drive the LED cube without the GUI.')
+    parser.add_argument('-s', '--select', nargs=3, action='append', default=[], metavar=('FLAVOUR', 'ENERGY', 'EVENTS'),
+                        help="a selection like an EventsScreen row, e.g. -s numu 100 '1-5,8,!3' (repeatable)")
+    parser.add_argument('-p', '--playlist', help='JSON playlist of selections (demo.json format, "events" allowed)')
+    parser.add_argument('--mode', choices=('Static', 'Dynamic'), default='Static',
+                        help='default mode for selections that do not set one')
+    parser.add_argument('--output', default=None,
+                        help="cube output: 'sim', 'serial:<path>[@baud]', 'udp:<host>:<port>' or 'file:<path>' "
+                             "(default: $CUBE_OUTPUT or sim)")
+    parser.add_argument('--max-rate', type=float, default=None,
+                        help='cube link limit in bytes/s, frames beyond it are coalesced; 0 for none '
+                             '(default: baud/10 for serial outputs, else none)')
+    parser.add_argument('--fps', type=float, default=0, help='pace the output (default: as fast as possible)')
+    parser.add_argument('--frames', type=int, default=DEFAULT_FRAMES_PER_EVENT, help='frames per Dynamic event')
+    parser.add_argument('--size', type=int, default=8, help='LEDs per cube edge')
+    parser.add_argument('--palette', choices=[BY_FLAVOUR] + list(PALETTES), default=BY_FLAVOUR,
+                        help="colour palette (default: each event's flavour palette)")
+    parser.add_argument('--max-current', type=float, default=None,
+                        help='power budget in amps, brighter frames are dimmed; 0 for none '
+                             f'(default: $CUBE_MAX_CURRENT or {DEFAULT_MAX_CURRENT:g})')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='render processes (0 renders in this process)')
+    parser.add_argument('--cache', action='store_true', help='read and fill the frame cache like the GUI')
+    parser.add_argument('--catalog', default=SELECT_FILE, help='selection catalog')
+    parser.add_argument('--events', default=EVENTS_DIR, help='event store directory')
+    parser.add_argument('--check', action='store_true', help='only validate the selections')
+    parser.add_argument('--sequence', help='stream a pre-rendered .cubeseq file instead of selections')
+    args = parser.parse_args(argv)
+
+    if args.sequence:
+        with SequenceFile(args.sequence) as sequence:
+            print(f"{sequence.metadata['flavour']} {sequence.metadata['energy']} event {sequence.metadata['event_id']}, "
+                  f"{len(sequence)} frame(s)")
+            return stream(sequence.frames(), args)
+
+    catalog = EventCatalog(args.catalog)
+    requested = [(flavour, energy, events, None) for flavour, energy, events in args.select]
+    if args.playlist:
+        requested += load_selections(args.playlist)
+    if not requested:
+        parser.error('no selections: use --select and/or --playlist')
+
+    # Validate everything before streaming anything, reporting every bad entry
+    selections, errors = [], []
+    for flavour, energy, events, mode in requested:
+        try:
+            selections.append(validate(catalog, flavour, energy, events) + (mode or args.mode,))
+        except ValueError as e:
+            errors.append(f"{flavour} {energy} '{events}': {e}")
+    for error in errors:
+        print(f"Invalid selection {error}", file=sys.stderr)
+    if errors:
+        return 2
+    total = sum(len(selection) for _, _, selection, _ in selections)
+    print(f"{len(selections)} selection(s), {total} event(s)")
+    if args.check:
+        return 0
+
+    renderer = VoxelRenderer(CubeGeometry(args.size), colour_map=default_colour_map(catalog, args.max_current),
+                             palette=args.palette)
+    print(power_limit_text(renderer.colour_map))
+    return stream(rendered(expand(selections), EventStore(args.events), renderer, args.frames, args.workers,
+                           FrameCache() if args.cache else None), args)
+
+
+def stream(frames, args):
+    """Send frames to the --output driver (paced by --fps) and print throughput statistics."""
+    driver = open_driver(args.output, **({} if args.max_rate is None else {'max_rate': args.max_rate}))
+    started = time.perf_counter()
+    try:
+        if args.fps > 0:
+            pacer = FramePacer(args.fps)
+            pacer.run(frames, driver.send_frame)
+        else:
+            for frame in frames:
+                driver.send_frame(frame)
+        driver.flush()
+    finally:
+        driver.close()
+    elapsed = time.perf_counter() - started
+
+    stats = driver.stats()
+    print(f"Sent {stats['frames']} frames ({stats['keyframes']} keyframes, {stats['skipped']} unchanged, "
+          f"{stats['coalesced']} coalesced) "
+          f"in {elapsed:.2f} s: {stats['frames'] / elapsed if elapsed else 0:.0f} fps, "
+          f"{stats['bytes'] / elapsed / 1e6 if elapsed else 0:.2f} MB/s")
+    for index, shard in enumerate(stats.get('shards', ())):
+        print(f"  shard {index} (layers {shard['layers'][0]}-{shard['layers'][1] - 1}): "
+              f"{shard['bytes_per_second'] / 1e6:.2f} MB/s, {shard['busy']:.0%} busy, "
+              f"lag p50 {shard['lag_p50']:.1f} ms, p99 {shard['lag_p99']:.1f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,595 @@
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+import numpy as np
+from instrumentation import RollingHistogram, interval, span
+
+# e.g. 'sim', 'serial:/dev/ttyUSB0@115200', 'udp:192.168.1.50:7777', 'file:out.cube' or, for a cube driven by
+# several controllers, 'shards:udp:10.0.0.1:7777,udp:10.0.0.2:7777'. A '?max_rate=<bytes/s>' suffix limits the
+# link, e.g. 'udp:192.168.1.50:7777?max_rate=200000'
+OUTPUT_ENV = 'CUBE_OUTPUT'
+DEFAULT_BAUDRATE = 115200
+SERIAL_BITS_PER_BYTE = 10  # 8N1: start bit, 8 data bits, stop bit
+DEFAULT_KEYFRAME_INTERVAL = 30  # Frames between full keyframes
+SHARD_MAX_LAG = 1  # Frames a shard may still be sending when the next frame is submitted
+SHARD_TIMEOUT = 10.0  # Seconds to wait for a shard before giving up on its controller
+UDP_PAYLOAD = 1400  # Datagram payload that fits a standard Ethernet MTU
+
+# Packet: magic, kind, cube size, sequence number, payload length. Frames are (layers, N, N, 3) with N the
+# cube size: layers == N for a whole cube, fewer for the slab of one controller of a sharded cube
+HEADER = struct.Struct('<2sBBHI')
+MAGIC = b'CB'
+KEYFRAME, RLE_KEYFRAME, DELTA = 0, 1, 2
+RUN_HEADER = 6  # Delta runs: uint32 first voxel, uint16 voxel count, then count RGB triples
+MAX_RUN = 0xFFFF  # Longest delta run a uint16 count can describe; longer runs are split
+RLE_RUN = 7  # RLE keyframe runs: uint32 voxel count, then one RGB triple
+
+# UDP datagrams carry one fragment of a packet: sequence number, fragment index, fragment count
+FRAGMENT = struct.Struct('<HHH')
+MAX_FRAGMENTS = 0xFFFF
+
+
+def encode_keyframe(frame):
+    """Full frame, run-length encoded when that is smaller than the raw RGB bytes."""
+    colours = frame.reshape(-1, 3)
+    codes = (colours[:, 0].astype(np.uint32) << 16) | (colours[:, 1].astype(np.uint32) << 8) | colours[:, 2]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    if starts.size * RLE_RUN >= colours.size:
+        return KEYFRAME, colours.tobytes()
+
+    counts = np.diff(np.r_[starts, codes.size]).astype('<u4')
+    runs = np.empty((starts.size, RLE_RUN), dtype=np.uint8)
+    runs[:, :4] = counts.view(np.uint8).reshape(-1, 4)
+    runs[:, 4:] = colours[starts]
+    return RLE_KEYFRAME, runs.tobytes()
+
+
+def encode_delta(previous, frame):
+    """Runs of voxels that changed since `previous`, or None if nothing changed."""
+    changed = np.flatnonzero((previous != frame).any(axis=-1).ravel())
+    if not changed.size:
+        return None
+
+    # Runs of consecutive changed voxels
+    breaks = np.flatnonzero(np.diff(changed) != 1) + 1
+    first = np.r_[0, breaks]  # Position in `changed` where each run begins
+    counts = np.diff(np.r_[first, changed.size])
+
+    # Cubes of 41^3 and up can change more than MAX_RUN consecutive voxels: split those runs
+    pieces = (counts + MAX_RUN - 1) // MAX_RUN
+    if pieces.max() > 1:
+        run = np.repeat(np.arange(first.size), pieces)
+        within = np.arange(run.size) - np.repeat(np.cumsum(pieces) - pieces, pieces)  # Piece number in its run
+        first = first[run] + within * MAX_RUN
+        counts = np.minimum(counts[run] - within * MAX_RUN, MAX_RUN)
+
+    # Every run header is followed by its RGB triples; place both with one scatter each
+    run_of = np.repeat(np.arange(first.size), counts)
+    colour_at = RUN_HEADER * (run_of + 1) + 3 * np.arange(changed.size)
+    header_at = RUN_HEADER * np.arange(first.size) + 3 * first
+
+    headers = np.empty((first.size, RUN_HEADER), dtype=np.uint8)
+    headers[:, :4] = changed[first].astype('<u4').view(np.uint8).reshape(-1, 4)
+    headers[:, 4:] = counts.astype('<u2').view(np.uint8).reshape(-1, 2)
+
+    payload = np.empty(RUN_HEADER * first.size + 3 * changed.size, dtype=np.uint8)
+    payload[header_at[:, None] + np.arange(RUN_HEADER)] = headers
+    payload[colour_at[:, None] + np.arange(3)] = frame.reshape(-1, 3)[changed]
+    return payload.tobytes()
+
+
+def decode_packet(packet, frame=None):
+    """Apply one packet to `frame` (allocated if None or of the wrong size) and return the frame."""
+    magic, kind, size, _, length = HEADER.unpack_from(packet)
+    if magic != MAGIC:
+        raise ValueError("not a cube packet")
+    payload = np.frombuffer(packet, dtype=np.uint8, count=length, offset=HEADER.size)
+
+    if kind in (KEYFRAME, RLE_KEYFRAME):
+        # Keyframes carry every voxel, so they also tell how many layers the frame has
+        if kind == KEYFRAME:
+            colours = payload.reshape(-1, 3)
+        else:
+            runs = payload.reshape(-1, RLE_RUN)
+            colours = np.repeat(runs[:, 4:], runs[:, :4].copy().view('<u4').ravel(), axis=0)
+        if frame is None or frame.shape[1:] != (size, size, 3) or frame.size != colours.size:
+            frame = np.zeros((len(colours) // (size * size), size, size, 3), dtype=np.uint8)
+        frame.reshape(-1, 3)[:] = colours
+    elif kind == DELTA:
+        if frame is None or frame.shape[1:] != (size, size, 3):
+            frame = np.zeros((size, size, size, 3), dtype=np.uint8)
+        colours = frame.reshape(-1, 3)
+        offset = 0
+        while offset < length:
+            start, count = struct.unpack_from('<IH', payload, offset)
+            offset += RUN_HEADER
+            colours[start:start + count] = payload[offset:offset + 3 * count].reshape(-1, 3)
+            offset += 3 * count
+    else:
+        raise ValueError(f"unknown packet kind {kind}")
+    return frame
+
+
+class CubeDriver:
+    """Common output path: double-buffered frames, delta/RLE packets, keyframes and rate limiting.
+
+    Subclasses implement _write(packet). `max_rate` (bytes per second) models a constrained link:
+    a frame that does not fit the budget is coalesced into the next one instead of queueing up.
+    """
+
+    def __init__(self, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL, max_rate=None):
+        self.keyframe_interval = keyframe_interval
+        self.max_rate = max_rate
+        self._front = None  # What the cube currently shows
+        self._back = None  # Staging buffer for the frame being sent
+        self._since_keyframe = 0
+        self._sequence = 0
+        self._tokens = None  # Token bucket level in bytes; starts full with the first frame
+        self._refilled = time.perf_counter()
+        self._staged = None  # Last coalesced frame, sent by flush()
+        self.metric = 'frame'  # Instrumentation name of the frame-to-frame time
+        self._lock = threading.Lock()  # Frames arrive from playback, worker and UI threads
+
+        # Statistics
+        self.frames = 0
+        self.keyframes = 0
+        self.skipped = 0  # Frames identical to the previous one
+        self.coalesced = 0  # Frames merged into a later one to stay within max_rate
+        self.bytes = 0
+
+    def send_frame(self, frame):
+        """Send one (N, N, N, 3) uint8 frame. Returns False if it was coalesced into a later one."""
+        with self._lock:
+            if self._back is None or self._back.shape != frame.shape:
+                self._front = np.zeros(frame.shape, dtype=np.uint8)
+                self._back = np.zeros(frame.shape, dtype=np.uint8)
+                self._since_keyframe = self.keyframe_interval  # New geometry starts with a keyframe
+            np.copyto(self._back, frame)
+
+            interval(self.metric)  # Frame-to-frame time, for the frame rate and its p99
+            payload = None
+            kind = DELTA
+            with span('encode'):
+                if self._since_keyframe < self.keyframe_interval:
+                    payload = encode_delta(self._front, self._back)
+                    if payload is None:
+                        self.skipped += 1
+                        self._staged = None  # The cube already shows this frame
+                        return True
+                if payload is None or len(payload) >= self._back.size:
+                    kind, payload = encode_keyframe(self._back)
+
+            packet = HEADER.pack(MAGIC, kind, frame.shape[1], self._sequence, len(payload)) + payload
+            if not self._spend(len(packet)):
+                self.coalesced += 1
+                self._staged = self._back.copy()  # The caller may reuse its buffer
+                return False
+            self._staged = None
+
+            with span('send'):
+                self._write(packet)
+            self._sequence = (self._sequence + 1) & 0xFFFF
+            self._front, self._back = self._back, self._front  # The sent frame is now what the cube shows
+            self._since_keyframe = 0 if kind != DELTA else self._since_keyframe + 1
+            self.frames += 1
+            self.keyframes += kind != DELTA
+            self.bytes += len(packet)
+            return True
+
+    def flush(self):
+        """Send the last coalesced frame regardless of the rate budget (e.g. when playback ends)."""
+        frame, self._staged = self._staged, None
+        if frame is not None:
+            rate, self.max_rate = self.max_rate, None
+            try:
+                self.send_frame(frame)
+            finally:
+                self.max_rate = rate
+
+    def _spend(self, size):
+        """Token bucket for max_rate; a burst of up to 100 ms of link time is allowed."""
+        if self.max_rate is None:
+            return True
+        now = time.perf_counter()
+        burst = max(self.max_rate * 0.1, size)
+        tokens = burst if self._tokens is None else self._tokens
+        self._tokens = min(burst, tokens + (now - self._refilled) * self.max_rate)
+        self._refilled = now
+        if self._tokens < size:
+            return False
+        self._tokens -= size
+        return True
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'keyframes': self.keyframes,
+            'skipped': self.skipped,
+            'coalesced': self.coalesced,
+            'bytes': self.bytes
+        }
+
+    def _write(self, packet):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SimulatorDriver(CubeDriver):
+    """In-process cube: decodes every packet, so `frame` is exactly what hardware would show."""
+
+    def __init__(self, **kwargs):
+        super(SimulatorDriver, self).__init__(**kwargs)
+        self.frame = None
+
+    def _write(self, packet):
+        self.frame = decode_packet(packet, self.frame)
+
+
+class SerialDriver(CubeDriver):
+    """Serial link to the cube controller (any tty, including a pty for testing)."""
+
+    def __init__(self, path, baudrate=DEFAULT_BAUDRATE, **kwargs):
+        super(SerialDriver, self).__init__(**kwargs)
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_NOCTTY)
+        self._configure(baudrate)
+
+    def _configure(self, baudrate):
+        """Raw mode at the requested speed (no-op for paths that are not terminals)."""
+        if not os.isatty(self._fd):
+            return
+        import termios
+        import tty
+        tty.setraw(self._fd)
+        speed = getattr(termios, f'B{baudrate}', None)
+        if speed is not None:
+            attributes = termios.tcgetattr(self._fd)
+            attributes[4] = attributes[5] = speed  # Input and output speed
+            termios.tcsetattr(self._fd, termios.TCSANOW, attributes)
+
+    def _write(self, packet):
+        view = memoryview(packet)
+        while view:
+            view = view[os.write(self._fd, view):]  # One batched write per packet, resumed if partial
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class FileDriver(CubeDriver):
+    """Writes the packet stream a controller would receive to a file, e.g. to capture or pre-render."""
+
+    def __init__(self, path, **kwargs):
+        super(FileDriver, self).__init__(**kwargs)
+        self.path = path
+        self._file = open(path, 'wb')
+
+    def _write(self, packet):
+        self._file.write(packet)
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+def read_packets(path):
+    """Yield the packets of a file written by FileDriver, in order."""
+    with open(path, 'rb') as file:
+        while True:
+            header = file.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            length = HEADER.unpack(header)[4]
+            yield header + file.read(length)
+
+
+class UDPDriver(CubeDriver):
+    """UDP link to a networked cube controller; packets are split into MTU-sized fragments."""
+
+    def __init__(self, host, port, payload_size=UDP_PAYLOAD, **kwargs):
+        super(UDPDriver, self).__init__(**kwargs)
+        self.address = (host, port)
+        self.payload_size = payload_size
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def _write(self, packet):
+        sequence = self._sequence & 0xFFFF
+        count = -(-len(packet) // self.payload_size)
+        if count > MAX_FRAGMENTS:
+            raise ValueError(f"{len(packet)} byte packet needs {count} fragments, more than UDP output supports")
+        for index in range(count):
+            fragment = packet[index * self.payload_size:(index + 1) * self.payload_size]
+            self._socket.sendto(FRAGMENT.pack(sequence, index, count) + fragment, self.address)
+
+    def close(self):
+        self._socket.close()
+
+
+class UDPReceiver:
+    """Cube-side (or test) receiver: reassembles fragments and decodes packets into `frame`."""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind((host, port))
+        self.address = self._socket.getsockname()
+        self.frame = None
+        self.packets = 0
+        self.incomplete = 0  # Packets abandoned because a fragment never arrived
+        self._fragments = {}
+
+    def receive(self, timeout=1.0):
+        """Read datagrams until one packet is complete and applied; returns False on timeout."""
+        self._socket.settimeout(timeout)
+        while True:
+            try:
+                datagram = self._socket.recv(65535)
+            except socket.timeout:
+                return False
+            if len(datagram) < FRAGMENT.size:
+                continue
+            sequence, index, count = FRAGMENT.unpack_from(datagram)
+            parts = self._fragments.setdefault(sequence, {})
+            parts[index] = datagram[FRAGMENT.size:]
+            if len(parts) == count:
+                del self._fragments[sequence]
+                # Older packets still missing fragments never will be; drop them before the sequence wraps
+                stale = [other for other in self._fragments if (sequence - other) & 0xFFFF < 0x8000]
+                for other in stale:
+                    del self._fragments[other]
+                self.incomplete += len(stale)
+                self.frame = decode_packet(b''.join(parts[i] for i in range(count)), self.frame)
+                self.packets += 1
+                return True
+
+    def close(self):
+        self._socket.close()
+
+
+class _Shard:
+    """One controller's slab of layers: its own driver, fed by its own worker thread."""
+
+    def __init__(self, index, driver, layers, buffers):
+        self.index = index
+        self.driver = driver
+        self.layers = layers  # slice of cube layers this controller owns
+        self.buffers = buffers  # Preallocated slab copies, used round-robin by frame sequence
+        self.inbox = queue.Queue()
+        self.completed = 0  # Sequence number of the last frame this shard has sent
+        self.lag = RollingHistogram()  # Submit-to-sent time per frame
+        self.busy = 0.0  # Seconds spent encoding and sending
+        self.error = None  # Exception that stopped the worker (e.g. a serial or socket error)
+        self.thread = None
+
+
+class ShardedDriver:
+    """Drives a cube whose layers are split across several controllers, one slab per driver.
+
+    Each slab is encoded and sent by its own worker thread, in parallel. Frame boundaries stay
+    synchronized: every shard sends a frame under the same sequence number, and a new frame is
+    only handed out once every shard has finished the frame `max_lag` before it, so no controller
+    drifts more than `max_lag` frames behind the others. The shard drivers should not have a max_rate:
+    they would coalesce frames independently and break the synchronization. `max_rate` here is the
+    budget of the whole cube: frames over it are coalesced on every shard at once.
+
+    A shard whose driver fails stops the cube: its exception is raised from the next send_frame(),
+    wait() or flush(), and a shard that makes no progress for SHARD_TIMEOUT seconds raises TimeoutError.
+    """
+
+    def __init__(self, drivers, layers=None, axis=0, max_lag=SHARD_MAX_LAG, max_rate=None):
+        self.drivers = list(drivers)
+        self.layer_counts = layers  # Layers per shard; None splits the cube as evenly as possible
+        self.axis = axis  # Cube axis the slabs are cut along
+        self.max_lag = max_lag
+        self.max_rate = max_rate
+        self.shards = None  # Created for the first frame, when the cube size is known
+        self._sequence = 0
+        self._submitted = {}  # Sequence -> submit time, for the lag
+        self._done = threading.Condition()
+        self._started = None
+        self._tokens = None  # Rate budget, full until the first frame is charged
+        self._refilled = time.perf_counter()
+        self._charged = 0  # Shard bytes already paid for
+        self._staged = None  # Last coalesced frame, sent by flush()
+        self.coalesced = 0
+
+    def _start(self, frame):
+        size = frame.shape[self.axis]
+        counts = self.layer_counts
+        if counts is None:
+            counts = [len(part) for part in np.array_split(np.arange(size), len(self.drivers))]
+        if len(counts) != len(self.drivers) or sum(counts) != size:
+            raise ValueError(f"shard layers {list(counts)} do not split {size} layers over {len(self.drivers)} drivers")
+
+        self.shards = []
+        edges = np.concatenate([[0], np.cumsum(counts)])
+        for index, driver in enumerate(self.drivers):
+            layers = slice(int(edges[index]), int(edges[index + 1]))
+            shape = (counts[index],) + np.moveaxis(frame, self.axis, 0).shape[1:]
+            buffers = [np.zeros(shape, dtype=np.uint8) for _ in range(self.max_lag + 2)]
+            shard = _Shard(index, driver, layers, buffers)
+            driver.metric = f'frame.shard{index}'
+            shard.thread = threading.Thread(target=self._work, args=(shard,), daemon=True)
+            shard.thread.start()
+            self.shards.append(shard)
+        self._started = time.perf_counter()
+
+    def _work(self, shard):
+        while True:
+            job = shard.inbox.get()
+            if job is None:
+                return
+            sequence, slab = job
+            started = time.perf_counter()
+            shard.driver._sequence = sequence & 0xFFFF  # Same packet sequence on every controller
+            try:
+                shard.driver.send_frame(slab)
+            except Exception as e:
+                with self._done:
+                    shard.error = e  # Raised to the caller; waiting for this shard would never end
+                    self._done.notify_all()
+                return
+            finished = time.perf_counter()
+            shard.busy += finished - started
+            shard.lag.record(finished - self._submitted[sequence], finished)
+            with self._done:
+                shard.completed = sequence
+                self._done.notify_all()
+
+    def _wait(self, predicate):
+        """Wait for `predicate` over the shards, raising a shard's error or TimeoutError instead of hanging."""
+        with self._done:
+            failed = lambda: any(shard.error is not None for shard in self.shards)
+            if not self._done.wait_for(lambda: failed() or predicate(), timeout=SHARD_TIMEOUT):
+                raise TimeoutError(f"cube shards made no progress for {SHARD_TIMEOUT} s")
+            for shard in self.shards:
+                if shard.error is not None:
+                    raise RuntimeError(f"cube shard {shard.index} failed: {shard.error}") from shard.error
+
+    def _spend(self):
+        """Whole-cube token bucket for max_rate, charged with the bytes the shards have sent since."""
+        now = time.perf_counter()
+        burst = self.max_rate * 0.1
+        sent = sum(shard.driver.bytes for shard in self.shards)
+        cost, self._charged = sent - self._charged, sent
+        tokens = burst if self._tokens is None else self._tokens
+        self._tokens = min(burst, tokens + (now - self._refilled) * self.max_rate) - cost
+        self._refilled = now
+        return self._tokens > 0
+
+    def send_frame(self, frame):
+        """Split one (N, N, N, 3) frame into slabs and hand them to the shard workers.
+
+        Returns False if the frame was coalesced into a later one to stay within max_rate.
+        """
+        if self.shards is None:
+            self._start(frame)
+        interval('frame')
+        if self.max_rate is not None and not self._spend():
+            self.coalesced += 1
+            self._staged = frame.copy()  # The caller may reuse its buffer
+            return False
+        self._staged = None
+        self._sequence += 1
+        sequence = self._sequence
+        # The frame boundary: the slab buffers about to be reused must have been sent
+        self._wait(lambda: min(shard.completed for shard in self.shards) >= sequence - 1 - self.max_lag)
+        self._submitted.pop(sequence - len(self.shards[0].buffers), None)
+        self._submitted[sequence] = time.perf_counter()
+
+        layered = np.moveaxis(frame, self.axis, 0)
+        for shard in self.shards:
+            slab = shard.buffers[sequence % len(shard.buffers)]
+            np.copyto(slab, layered[shard.layers])
+            shard.inbox.put((sequence, slab))
+        return True
+
+    def wait(self):
+        """Block until every shard has sent every submitted frame."""
+        if self.shards is not None:
+            self._wait(lambda: all(shard.completed == self._sequence for shard in self.shards))
+
+    def flush(self):
+        """Send the last coalesced frame regardless of max_rate, then wait for every shard."""
+        frame, self._staged = self._staged, None
+        if frame is not None:
+            rate, self.max_rate = self.max_rate, None
+            try:
+                self.send_frame(frame)
+            finally:
+                self.max_rate = rate
+        self.wait()
+        for driver in self.drivers:
+            driver.flush()
+
+    def stats(self):
+        """Totals like CubeDriver.stats(), plus per-shard throughput and lag under 'shards'."""
+        totals = {'frames': self._sequence, 'keyframes': 0, 'skipped': 0, 'coalesced': self.coalesced, 'bytes': 0}
+        shards = []
+        now = time.perf_counter()
+        elapsed = now - self._started if self._started is not None else 0.0
+        for shard in self.shards or ():
+            stats = shard.driver.stats()
+            for name in ('keyframes', 'skipped', 'coalesced', 'bytes'):
+                totals[name] += stats[name]
+            lag = shard.lag.summary(now) if len(shard.lag) else {'p50': 0.0, 'p99': 0.0}
+            shards.append({
+                'layers': (shard.layers.start, shard.layers.stop),
+                'frames': shard.completed,
+                'behind': self._sequence - shard.completed,
+                'bytes': stats['bytes'],
+                'fps': shard.completed / elapsed if elapsed else 0.0,
+                'bytes_per_second': stats['bytes'] / elapsed if elapsed else 0.0,
+                'busy': shard.busy / elapsed if elapsed else 0.0,  # Fraction of the time the worker was sending
+                'lag_p50': lag['p50'],
+                'lag_p99': lag['p99']
+            })
+        totals['shards'] = shards
+        return totals
+
+    def close(self):
+        for shard in self.shards or ():
+            shard.inbox.put(None)
+            shard.thread.join(timeout=1.0)
+        for driver in self.drivers:
+            driver.close()
+
+
+def link_rate(spec):
+    """Bytes per second a spec's link can carry, or None if it is not the bottleneck.
+
+    Serial links are limited by their baud rate; a sharded cube by the sum of its controllers' links.
+    """
+    kind, _, target = spec.partition(':')
+    if kind == 'serial':
+        baudrate = target.partition('@')[2]
+        return int(baudrate or DEFAULT_BAUDRATE) / SERIAL_BITS_PER_BYTE
+    if kind == 'shards':
+        rates = [link_rate(part) for part in target.split(',')]
+        return None if None in rates else sum(rates)
+    return None
+
+
+def open_driver(spec=None, **kwargs):
+    """Create a driver from a spec: 'sim', 'serial:<path>[@baud]', 'udp:<host>:<port>' or 'file:<path>'.
+
+    'shards:<spec>,<spec>,...' drives one controller per spec, each owning an equal slab of layers;
+    a max_rate then applies to the whole cube, the other options to every controller.
+    Without a spec, the CUBE_OUTPUT environment variable is used, defaulting to the simulator.
+    max_rate comes from the max_rate argument, else a '?max_rate=<bytes/s>' suffix, else the link
+    rate of serial links (see link_rate); None or 0 means unlimited.
+    """
+    spec = spec or os.environ.get(OUTPUT_ENV, 'sim')
+    spec, _, options = spec.partition('?')
+    for option in filter(None, options.split('&')):
+        name, _, value = option.partition('=')
+        if name != 'max_rate':
+            raise ValueError(f"unknown cube output option '{name}'")
+        kwargs.setdefault('max_rate', float(value))
+    if 'max_rate' not in kwargs:
+        kwargs['max_rate'] = link_rate(spec)
+    kwargs['max_rate'] = kwargs['max_rate'] or None
+
+    kind, _, target = spec.partition(':')
+    if kind == 'sim':
+        return SimulatorDriver(**kwargs)
+    if kind == 'serial':
+        path, _, baudrate = target.partition('@')
+        return SerialDriver(path, int(baudrate or DEFAULT_BAUDRATE), **kwargs)
+    if kind == 'udp':
+        host, _, port = target.rpartition(':')
+        return UDPDriver(host, int(port), **kwargs)
+    if kind == 'file':
+        return FileDriver(target, **kwargs)
+    if kind == 'shards':
+        max_rate = kwargs.pop('max_rate')  # Enforced across the shards, see ShardedDriver
+        return ShardedDriver([open_driver(part, max_rate=None, **kwargs) for part in target.split(',')],
+                             max_rate=max_rate)
+    raise ValueError(f"unknown cube output '{spec}'")
+
@@ -0,0 +1,178 @@
+import json
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from event_catalog import BACKGROUND
+from frame_cache import frame_key
+from frame_pipeline import cache_mode, event_frames
+from instrumentation import gauge
+from submission_worker import LOAD_ERRORS
+
+PLAYLIST_FILE = 'demo.json'  # Optional DEMO playlist, relative to the working directory
+DEFAULT_DWELL = 5.0  # Seconds each item stays on the cube
+DEFAULT_PREFETCH = 3  # Items rendered ahead of the one playing
+
+# One playlist entry; mode is 'Static' or 'Dynamic', dwell in seconds
+PlaylistItem = namedtuple('PlaylistItem', 'flavour energy event_id mode dwell')
+
+
+def default_playlist(catalog, dwell=DEFAULT_DWELL):
+    """First event of every flavour/energy sample, then the background, all played dynamically."""
+    items = []
+    for flavour in catalog.flavour_names + [BACKGROUND]:
+        for energy in catalog.energies(flavour):
+            items.append(PlaylistItem(flavour, energy, 1, 'Dynamic', dwell))
+    return items
+
+
+def load_playlist(catalog, path=PLAYLIST_FILE):
+    """Read the DEMO playlist, falling back to default_playlist() when the file does not exist.
+
+    The file is a JSON list of objects with "flavour" (name or 'Background'), "energy", "event",
+    and optionally "mode" and "dwell".
+    """
+    try:
+        with open(path, 'r') as file:
+            entries = json.load(file)
+    except FileNotFoundError:
+        return default_playlist(catalog)
+
+    return [PlaylistItem(catalog.flavour_name(entry['flavour']), str(entry['energy']), int(entry['event']),
+                         entry.get('mode', 'Dynamic'), float(entry.get('dwell', DEFAULT_DWELL)))
+            for entry in entries]
+
+
+def render_item(item, source, renderer, cache=None, library=None):
+    """Frames of one playlist item: its pre-rendered file, or via the frame cache when one is configured."""
+    if library is not None:
+        sequence = library.find(item.flavour, item.energy, item.event_id, item.mode, renderer)
+        if sequence is not None:
+            return sequence  # Frames are decoded from the mapped file as they are played
+
+    def render():
+        hits = source(item.flavour, item.energy, item.event_id)
+        flavour_renderer = renderer.for_flavour(item.flavour)
+        if item.mode == 'Static':
+            return flavour_renderer.render(hits)[None]
+        return np.stack(list(event_frames(hits, flavour_renderer)))
+
+    if cache is None:
+        return render()
+    key = frame_key(item.flavour, item.energy, item.event_id, cache_mode(item.mode), renderer)
+    return cache.get_or_render(key, render)
+
+
+def demo_frames(items, source, renderer, fps=30.0, cache=None, library=None, start=0, prefetch=DEFAULT_PREFETCH,
+                workers=2, counters=None):
+    """Loop a DEMO playlist from position `start`, yielding (position, frame) pairs; runs in the render process.
+
+    Every item is played at `fps`, its last frame held until the item has been on the cube for its
+    dwell time, while the next `prefetch` items render on `workers` threads. Items that cannot be
+    rendered are skipped and counted in counters['failures']; the loop ends if none can be.
+    """
+    items = list(items)
+    if not items:
+        return
+    executor = ThreadPoolExecutor(max_workers=workers)
+    futures = {}  # Playlist position -> future of its rendered frames
+    index, failed_in_a_row = start % len(items), 0
+    try:
+        while True:
+            # Keep the current item and the next `prefetch` items queued; forget the rest
+            wanted = [(index + step) % len(items) for step in range(prefetch + 1)]
+            for position in list(futures):
+                if position not in wanted:
+                    futures.pop(position).cancel()
+            for position in wanted:
+                if position not in futures:
+                    futures[position] = executor.submit(render_item, items[position], source, renderer, cache,
+                                                        library)
+            gauge('queue.demo', sum(future.done() for future in futures.values()))  # Items ready to play
+
+            try:
+                frames = futures.pop(index).result()  # Rendered frames stay in the frame cache
+            except LOAD_ERRORS as e:
+                print(f"DEMO: skipping {items[index]}: {e}")
+                if counters is not None:
+                    counters['failures'] = counters.get('failures', 0) + 1
+                failed_in_a_row += 1
+                if failed_in_a_row >= len(items):
+                    print("DEMO: no playable items, stopping.")
+                    return
+                index = (index + 1) % len(items)
+                continue
+            failed_in_a_row = 0
+
+            if hasattr(frames, 'frames'):
+                # Pre-rendered: frames() reuses one array, and frames wait in the render process's read-ahead buffer
+                frames = (frame.copy() for frame in frames.frames())
+            shown = 0
+            for frame in frames:
+                yield index, frame
+                shown += 1
+            for _ in range(int(round(items[index].dwell * fps)) - shown):
+                yield index, frame  # Hold the last frame for the rest of the dwell time
+            index = (index + 1) % len(items)
+    finally:
+        for future in futures.values():
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+class PlaylistController:
+    """GUI side of the DEMO: loops a playlist in the render process (see demo_frames) and follows its progress."""
+
+    def __init__(self, items, renderer, client, fps=30.0):
+        self.items = list(items)
+        self.renderer = renderer
+        self.client = client  # frame_ring.RenderClient running the playlist
+        self.fps = fps
+        self._state = 'stopped'
+
+    @property
+    def state(self):
+        return self._state
+
+    def stats(self):
+        """Progress as last reported by the render process; also asks it for a fresh report."""
+        self.client.receive()
+        for message in self.client.poll():
+            if message[0] == 'finished':
+                self._state = 'stopped'  # Nothing in the playlist could be played
+        status = self.client.status or {}
+        self.client.request_status()
+        return {
+            'state': self._state,
+            'index': status.get('index', 0),
+            'shown': status.get('shown', 0),
+            'fps': status.get('fps', 0.0),
+            'underruns': status.get('underruns', 0),
+            'failures': status.get('failures', 0)
+        }
+
+    def play(self):
+        """Start the playlist, or resume it when paused."""
+        if not self.items:
+            return
+        if self._state == 'stopped':
+            self.client.load(self.items, 'Demo', self.renderer, self.fps)
+        self.client.play()
+        self._state = 'playing'
+
+    def pause(self):
+        if self._state == 'playing':
+            self.client.pause()
+            self._state = 'paused'
+
+    resume = play
+
+    def skip(self):
+        """Move on to the next item immediately."""
+        if self._state != 'stopped':
+            self.client.skip()
+
+    def stop(self):
+        """Stop playback; play() starts the playlist over."""
+        if self._state != 'stopped':
+            self.client.stop()
+            self._state = 'stopped'
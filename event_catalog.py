@@ -0,0 +1,91 @@
+import json
+import os
+import threading
+from instrumentation import span
+
+SELECT_FILE = 'select.json'  # Default catalog file, relative to the working directory
+BACKGROUND = 'Background'  # Name (and symbol) used for the background sample
+DEFAULT_EVENT_LIMIT = 30  # Fallback limit used when a flavour/energy pair is unknown
+
+
+class EventCatalog:
+    """Cached, indexed view of select.json that reloads only when the file changes."""
+
+    def __init__(self, path=SELECT_FILE):
+        self.path = path
+        self._mtime = None  # mtime (ns) of the file the current tables were built from
+        self._lock = threading.Lock()  # Catalog is shared with worker threads
+        self.refresh()
+
+    def refresh(self):
+        """Reload the tables if the file's mtime changed. Returns True if a reload happened."""
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime == self._mtime:
+            return False  # Nothing changed on disk, keep the cached tables
+
+        with self._lock, span('load.catalog'):
+            with open(self.path, 'r') as file:
+                data = json.load(file)
+            self._build(data)
+            self._mtime = mtime
+        return True
+
+    def _build(self, data):
+        """Precompute every lookup the screens need from the raw JSON."""
+        self.data = data
+
+        # Flavour names are used for logic, symbols for display
+        self.flavour_names = list(data["flavours"]["name"])
+        self.flavour_symbols = list(data["flavours"]["symbol"])
+        self.symbol_to_name = {symbol: name for name, symbol in zip(self.flavour_names, self.flavour_symbols)}
+        self.name_to_symbol = {name: symbol for symbol, name in self.symbol_to_name.items()}
+
+        # Options shown in the flavour dropdown
+        self.flavour_options = self.flavour_symbols + [BACKGROUND]
+
+        # Every neutrino flavour shares the "neutrino" energies, Background has its own
+        neutrino = self._energy_table(data["neutrino"])
+        self._tables = {name: neutrino for name in self.flavour_names}
+        self._tables[BACKGROUND] = self._energy_table(data["background"])
+
+    @staticmethod
+    def _energy_table(section):
+        """Build (energies as strings, energy -> index, energy -> event limit) for one section."""
+        energies = [str(energy) for energy in section["energy"]]
+        index = {energy: i for i, energy in enumerate(energies)}
+        limits = {energy: limit for energy, limit in zip(energies, section["evs"])}
+        return energies, index, limits
+
+    def flavour_name(self, text):
+        """Map a dropdown symbol to its flavour name (names and 'Background' map to themselves)."""
+        return self.symbol_to_name.get(text, text)
+
+    def energies(self, flavour):
+        """Energy options (as strings) for a flavour symbol or name."""
+        table = self._tables.get(self.flavour_name(flavour))
+        return table[0] if table else []
+
+    def energy_index(self, flavour, energy):
+        """Index of an energy in the flavour's energy list, or None if unknown."""
+        table = self._tables.get(self.flavour_name(flavour))
+        return table[1].get(str(energy)) if table else None
+
+    def event_limit(self, flavour, energy, default=DEFAULT_EVENT_LIMIT):
+        """Maximum event number for a flavour/energy pair."""
+        table = self._tables.get(self.flavour_name(flavour))
+        if table is None:
+            return default
+        return table[2].get(str(energy), default)
+
+
+_shared_catalog = None  # Catalog shared by the screens and headless callers
+
+
+def get_catalog(path=SELECT_FILE):
+    """Return the shared catalog, reloading it first if the file changed on disk."""
+    global _shared_catalog
+    if _shared_catalog is None or _shared_catalog.path != path:
+        _shared_catalog = EventCatalog(path)
+    else:
+        _shared_catalog.refresh()
+    return _shared_catalog
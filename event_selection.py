@@ -0,0 +1,182 @@
+from functools import lru_cache
+import numpy as np
+
+BITMAP_SPAN = 1 << 20  # Largest id span for which membership uses a bitmap instead of a binary search
+
+
+class EventSelection:
+    """Immutable set of event ids stored as sorted, merged, inclusive intervals."""
+
+    def __init__(self, starts=(), ends=()):
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        self.starts, self.ends = _merge(starts, ends)
+        self._bitmap = None  # Built lazily on the first membership test
+
+    @classmethod
+    def parse(cls, expression):
+        """Compile an expression like '1-5,8,12-20,!14'. Raises ValueError on bad syntax."""
+        include, exclude = ([], []), ([], [])
+        for token in expression.split(','):
+            token = token.strip()
+            if not token:
+                raise ValueError(f"Empty entry in selection '{expression}'")
+
+            # A leading '!' removes the ids from the selection
+            target = include
+            if token.startswith('!'):
+                target = exclude
+                token = token[1:].strip()
+
+            if '-' in token:
+                start, end = token.split('-')  # More than one '-' raises ValueError
+                start, end = int(start.strip()), int(end.strip())
+                if start > end:
+                    raise ValueError(f"Range '{token}' is reversed")
+            else:
+                start = end = int(token)
+
+            target[0].append(start)
+            target[1].append(end)
+
+        selection = cls(*include)
+        if exclude[0]:
+            selection = selection - cls(*exclude)
+        return selection
+
+    def __len__(self):
+        """Number of distinct ids in the selection."""
+        return int((self.ends - self.starts + 1).sum())
+
+    def __bool__(self):
+        return self.starts.size > 0
+
+    def __contains__(self, event_id):
+        # Only integer ids can be selected; anything else (text, floats, bools) is simply not in the set
+        if not isinstance(event_id, (int, np.integer)) or isinstance(event_id, bool) or event_id < 0:
+            return False
+        if not self.starts.size or event_id < self.starts[0] or event_id > self.ends[-1]:
+            return False
+
+        if self.ends[-1] - self.starts[0] < BITMAP_SPAN:
+            return bool(self._get_bitmap()[event_id - self.starts[0]])  # O(1) lookup
+
+        # Very wide selections: binary search over the intervals instead
+        i = np.searchsorted(self.starts, event_id, side='right') - 1
+        return bool(event_id <= self.ends[i])
+
+    def __iter__(self):
+        return iter(self.ids().tolist())
+
+    def __eq__(self, other):
+        if not isinstance(other, EventSelection):
+            return NotImplemented
+        return np.array_equal(self.starts, other.starts) and np.array_equal(self.ends, other.ends)
+
+    def __hash__(self):
+        return hash((self.starts.tobytes(), self.ends.tobytes()))
+
+    def __repr__(self):
+        return f"EventSelection('{self}')"
+
+    def __str__(self):
+        return ','.join(str(s) if s == e else f"{s}-{e}" for s, e in zip(self.starts.tolist(), self.ends.tolist()))
+
+    def _get_bitmap(self):
+        """Boolean array over [min, max] marking the selected ids."""
+        if self._bitmap is None:
+            bitmap = np.zeros(self.ends[-1] - self.starts[0] + 1, dtype=bool)
+            # Mark interval boundaries, then a cumulative sum fills the inside of each interval
+            marks = np.zeros(bitmap.size + 1, dtype=np.int64)
+            np.add.at(marks, self.starts - self.starts[0], 1)
+            np.add.at(marks, self.ends - self.starts[0] + 1, -1)
+            bitmap[:] = np.cumsum(marks[:-1]) > 0
+            self._bitmap = bitmap
+        return self._bitmap
+
+    @property
+    def min(self):
+        return int(self.starts[0]) if self.starts.size else None
+
+    @property
+    def max(self):
+        return int(self.ends[-1]) if self.ends.size else None
+
+    def ids(self):
+        """All selected ids as a sorted int64 array."""
+        if not self.starts.size:
+            return np.empty(0, dtype=np.int64)
+        lengths = self.ends - self.starts + 1
+        # Each id is its interval's start plus its position inside the interval
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return np.repeat(self.starts, lengths) + offsets
+
+    def within(self, limit, minimum=0):
+        """True if every id lies in [minimum, limit]. O(1) since the intervals are sorted."""
+        return bool(self) and self.starts[0] >= minimum and self.ends[-1] <= limit
+
+    def __or__(self, other):
+        return EventSelection(np.concatenate([self.starts, other.starts]), np.concatenate([self.ends, other.ends]))
+
+    def __and__(self, other):
+        # Pair every interval with every overlapping interval of the other set via a sweep
+        starts, ends = [], []
+        i = j = 0
+        a_s, a_e, b_s, b_e = self.starts.tolist(), self.ends.tolist(), other.starts.tolist(), other.ends.tolist()
+        while i < len(a_s) and j < len(b_s):
+            low, high = max(a_s[i], b_s[j]), min(a_e[i], b_e[j])
+            if low <= high:
+                starts.append(low)
+                ends.append(high)
+            if a_e[i] < b_e[j]:
+                i += 1
+            else:
+                j += 1
+        return EventSelection(starts, ends)
+
+    def __sub__(self, other):
+        if not other or not self:
+            return self
+        # Complement of the other set, bounded to our own span, then intersect
+        low, high = self.starts[0], self.ends[-1]
+        gap_starts = np.concatenate([[low], other.ends + 1])
+        gap_ends = np.concatenate([other.starts - 1, [high]])
+        keep = gap_starts <= gap_ends
+        return self & EventSelection(gap_starts[keep], gap_ends[keep])
+
+
+def _merge(starts, ends):
+    """Sort intervals and merge overlapping or adjacent ones, fully vectorized."""
+    if not starts.size:
+        return starts, ends
+    order = np.argsort(starts, kind='stable')
+    starts, ends = starts[order], ends[order]
+
+    # An interval opens a new group when it starts after everything before it has ended
+    reach = np.maximum.accumulate(ends)
+    new_group = np.empty(starts.size, dtype=bool)
+    new_group[0] = True
+    new_group[1:] = starts[1:] > reach[:-1] + 1
+
+    group_ends = np.append(np.flatnonzero(new_group)[1:] - 1, starts.size - 1)
+    return starts[new_group], reach[group_ends]
+
+
+@lru_cache(maxsize=4096)
+def compile_selection(expression):
+    """Parse an expression once; repeated validations of the same text hit the cache."""
+    return EventSelection.parse(expression)
+
+
+def validate_selection(expression, limit, minimum=0):
+    """Rules of the events field: a valid expression whose ids all lie in [minimum, limit].
+
+    Returns the compiled selection, or raises ValueError saying why the expression is rejected.
+    """
+    if not expression.strip():
+        raise ValueError("Empty selection")
+    selection = compile_selection(expression)  # Raises ValueError on bad syntax
+    if not selection.within(limit, minimum):
+        raise ValueError(f"Selection '{expression}' is empty or outside {minimum}-{limit}")
+    return selection
+
@@ -0,0 +1,151 @@
+import argparse
+import os
+import struct
+import threading
+import numpy as np
+from voxel_renderer import X, Y, Z, CHARGE, T
+from instrumentation import span
+
+EVENTS_DIR = 'events'  # Default store location, relative to the working directory
+MAGIC = b'CUBEEVT1'  # File signature
+HEADER = struct.Struct('<8sIIQQ')  # magic, version, columns, events, hits
+VERSION = 1
+COLUMNS = (X, Y, Z, CHARGE, T)  # Column order inside the file, matching the renderer's hit arrays
+FIRST_EVENT = 1  # Event numbers typed by users start at 1
+
+
+def sample_path(root, flavour, energy):
+    """File holding every event of one (flavour, energy) sample, e.g. events/numu_100.evt."""
+    energy = str(energy).replace('/', '')  # 'N/A' (Background) becomes 'NA'
+    return os.path.join(root, f"{flavour}_{energy}.evt")
+
+
+class EventFile:
+    """Memory-mapped sample file: an offset index plus one float32 array per hit column.
+
+    Layout: header, int64 offsets[events + 1], float32 columns[columns][hits].
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as file:
+            magic, version, columns, events, hits = HEADER.unpack(file.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} event file")
+
+        self.n_events = events
+        self.offsets = np.memmap(path, dtype='<i8', mode='r', offset=HEADER.size, shape=(events + 1,))
+        self.columns = np.memmap(path, dtype='<f4', mode='r', offset=HEADER.size + 8 * (events + 1),
+                                 shape=(columns, hits))
+
+    def __len__(self):
+        return self.n_events
+
+    def event(self, event_id):
+        """Hits of one event as an (n, 5) array: a zero-copy view over the mapped columns."""
+        index = event_id - FIRST_EVENT
+        if not 0 <= index < self.n_events:
+            raise KeyError(f"no event {event_id} in {self.path} ({self.n_events} events)")
+        start, stop = self.offsets[index], self.offsets[index + 1]
+        return self.columns[:, start:stop].T  # Transposed view, each column stays contiguous
+
+
+class EventStore:
+    """Directory of sample files, opened on first use and kept mapped."""
+
+    def __init__(self, root=EVENTS_DIR):
+        self.root = root
+        self._files = {}
+        self._lock = threading.Lock()  # Events are fetched from pipeline and worker threads
+
+    def sample(self, flavour, energy):
+        """The mapped file of one (flavour name, energy) sample. Raises OSError if it does not exist."""
+        key = (flavour, str(energy))
+        with self._lock:
+            if key not in self._files:
+                self._files[key] = EventFile(sample_path(self.root, flavour, energy))
+            return self._files[key]
+
+    def event(self, flavour, energy, event_id):
+        """Hits of one event; O(1) and zero-copy."""
+        with span('load'):
+            return self.sample(flavour, energy).event(event_id)
+
+    __call__ = event  # Usable directly as an event source
+
+    def __reduce__(self):
+        # Worker processes re-open the samples themselves instead of pickling the mappings
+        return EventStore, (self.root,)
+
+
+def write_sample(path, events):
+    """Write a sample file from a sequence of per-event (n, 5) hit arrays."""
+    counts = np.fromiter((len(hits) for hits in events), dtype=np.int64, count=len(events))
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype('<i8')
+    hits = np.concatenate([np.asarray(h, dtype='<f4').reshape(-1, len(COLUMNS)) for h in events]) \
+        if len(events) else np.empty((0, len(COLUMNS)), dtype='<f4')
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(COLUMNS), len(events), len(hits)))
+        file.write(offsets.tobytes())
+        file.write(np.ascontiguousarray(hits.T).tobytes())  # Columnar: all x, then all y, ...
+
+
+def convert_dump(source, path, delimiter=None):
+    """Build a sample file from a text/CSV dump with one hit per line: event, x, y, z, charge, t.
+
+    Lines starting with '#' and a non-numeric header line are skipped. Events are numbered from
+    FIRST_EVENT in increasing order of the dump's event column; returns the dump's event ids in
+    that order, so event FIRST_EVENT + i is dump event ids[i].
+    """
+    number, first = _first_line(source)
+    if delimiter is None:
+        delimiter = ',' if ',' in first else None
+    skip = 0 if _is_numeric(first, delimiter) else number + 1  # Skip everything up to a header line
+    table = np.loadtxt(source, delimiter=delimiter, comments='#', skiprows=skip, ndmin=2)
+    if len(table) and table.shape[1] < 1 + len(COLUMNS):
+        raise ValueError(f"{source} has {table.shape[1]} column(s), expected {1 + len(COLUMNS)}: "
+                         "event, x, y, z, charge, t")
+
+    # Group the hits by event id in one stable sort
+    table = table[np.argsort(table[:, 0], kind='stable')]
+    ids, starts = np.unique(table[:, 0], return_index=True)
+    events = np.split(table[:, 1:1 + len(COLUMNS)], starts[1:]) if len(table) else []
+    write_sample(path, events)
+    return [int(event_id) if event_id.is_integer() else float(event_id) for event_id in ids]
+
+
+def _first_line(path):
+    """Line number and text of the first line that is neither blank nor a comment."""
+    with open(path, 'r') as file:
+        for number, line in enumerate(file):
+            if line.strip() and not line.startswith('#'):
+                return number, line
+    return 0, ''
+
+
+def _is_numeric(line, delimiter):
+    try:
+        [float(value) for value in line.split(delimiter)]
+        return True
+    except ValueError:
+        return False
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert a text/CSV event dump into the binary event store.')
+    parser.add_argument('dump', help='text/CSV file with columns: event, x, y, z, charge, t')
+    parser.add_argument('flavour', help="flavour name from select.json (e.g. numu) or 'Background'")
+    parser.add_argument('energy', help="energy from select.json (e.g. 100) or 'N/A'")
+    parser.add_argument('--root', default=EVENTS_DIR, help='store directory')
+    args = parser.parse_args()
+
+    target = sample_path(args.root, args.flavour, args.energy)
+    ids = convert_dump(args.dump, target)
+    print(f"Wrote {len(ids)} events to {target}")
+    if ids != list(range(FIRST_EVENT, FIRST_EVENT + len(ids))):
+        # Selections use the store's numbers, not the dump's
+        print("Events were renumbered (store event <- dump event):")
+        for number, event_id in enumerate(ids, FIRST_EVENT):
+            print(f"  {number} <- {event_id}")
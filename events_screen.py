@@ -1,18 +1,42 @@
+import copy
+import hashlib
+import json
 from kivy.uix.floatlayout import FloatLayout
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.button import Button
+from kivy.uix.togglebutton import ToggleButton
 from kivy.uix.label import Label
+from kivy.uix.progressbar import ProgressBar
 from kivy.uix.screenmanager import Screen
 from kivy.uix.spinner import Spinner, SpinnerOption
 from kivy.uix.textinput import TextInput
-from kivy.uix.scrollview import ScrollView
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
 from kivy.graphics import Color, Line
 from kivy.core.text import LabelBase
-import json
+from kivy.clock import Clock
+from event_catalog import get_catalog
+from event_selection import validate_selection
+from voxel_renderer import VoxelRenderer
+from event_store import FIRST_EVENT, EventStore
+from frame_cache import FrameCache
+from sequence_file import SequenceLibrary
+from submission_worker import SubmissionPool
+from compositor import PALETTE
+from colour_map import BY_FLAVOUR, PALETTES, default_colour_map, power_limit_text
+from frame_ring import get_render_client
+from instrumentation import span, traced
 
 # Register the custom font
 LabelBase.register(name='DejaVuSans', fn_regular='fonts/dejavu-sans/DejaVuSans.ttf')
 
+ROW_COLOURS = PALETTE + [None]  # Row colours in a composite; None keeps the rendered palette colours
+ROW_WEIGHTS = [1.0, 0.75, 0.5, 0.25]  # Row brightness weights in a composite
+FLAVOUR_PALETTE = 'Flavour'  # Palette spinner entry colouring each event by its flavour
+SESSION_FILE = 'session.json'  # Saved rows and settings, relative to the working directory
+SESSION_VERSION = 1
+
 
 # Custom SpinnerOption class to apply font to dropdown items
 class CustomSpinnerOption(SpinnerOption):
@@ -21,11 +45,171 @@ class CustomSpinnerOption(SpinnerOption):
         self.font_name = 'DejaVuSans'  # Apply the custom font for each option
 
 
-def load_select():
-    # Load the JSON file
-    with open('select.json', 'r') as file:  # Replace 'select.json' with your file name
-        data = json.load(file)
-        return data
+def new_row():
+    """Data model for one selection row; widgets are only created for the visible rows."""
+    return {
+        'flavour': 'Flavour',  # Selected flavour symbol (or 'Background')
+        'energy': 'Energy',  # Selected energy, as shown in the dropdown
+        'energies': [],  # Energy options for the selected flavour
+        'events': '',  # Event numbers typed by the user
+        'event_limit': 30,  # Maximum event number for the flavour/energy pair
+        'selection': None,  # Compiled event selection once the text validates
+        'colour': PALETTE[0],  # RGB colour of the row's events in a composite, None for their palette
+        'weight': 1.0,  # Brightness weight of the row's events in a composite
+        'status': '',  # Outcome of the last submission for this row, shown next to it
+        'hash': None  # Content hash of the row as last submitted, see row_hash()
+    }
+
+
+def row_hash(flavour_name, energy, selection, mode, renderer):
+    """Content hash of what a row renders: its sample, compiled event set, mode, cube and colours."""
+    content = repr((flavour_name, str(energy), str(selection), mode, renderer.key()))
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+class SelectionRow(RecycleDataViewBehavior, BoxLayout):
+    """Recycled widget row showing one entry of EventsScreen.input_rows."""
+
+    def __init__(self, **kwargs):
+        super(SelectionRow, self).__init__(orientation='horizontal', spacing=10, padding=[30, 0], **kwargs)
+        self.row = None  # Row dict currently shown by this widget
+        self.screen = None  # EventsScreen owning the data
+        self._syncing = False  # True while the widgets are being filled from the row dict
+
+        # Dropdown 1 (Spinner)
+        self.dropdown1 = Spinner(
+            text='Flavour',
+            size_hint=(20 / 100, None),  # Set size hint ratio
+            height=40,
+            font_name="DejaVuSans",  # Use the registered font for the selected item
+            option_cls=CustomSpinnerOption  # Apply the custom SpinnerOption class for dropdown items
+        )
+
+        # Dropdown 2 (Spinner)
+        self.dropdown2 = Spinner(
+            text='Energy',
+            values=[],  # Initially empty
+            size_hint=(20 / 100, None),  # Set size hint ratio
+            height=40,
+            disabled=True,  # Initially disabled
+            font_name="DejaVuSans"  # Use the registered font
+        )
+
+        # Text Input Box with centered text
+        self.text_input = TextInput(
+            hint_text='Event numbers',
+            size_hint=(27 / 100, None),  # Set size hint ratio
+            height=40,
+            halign='center',  # Center text horizontally
+            multiline=False,  # Set to False to keep it a single line
+            padding_y=(10, 10),  # Add vertical padding for centering effect
+            disabled=True,  # Initially disabled
+            font_name="DejaVuSans"  # Use the registered font
+        )
+
+        # Colour of the row in a composite; tapping it cycles through the palette
+        self.colour_button = Button(
+            size_hint=(10 / 100, None),  # Set size hint ratio
+            height=40,
+            background_normal=''  # Show the plain colour
+        )
+
+        # Brightness weight of the row in a composite; tapping it cycles through ROW_WEIGHTS
+        self.weight_button = Button(
+            size_hint=(8 / 100, None),  # Set size hint ratio
+            height=40,
+            font_name="DejaVuSans"  # Use the registered font
+        )
+
+        # Per-row submission status (progress or error)
+        self.status_label = Label(
+            size_hint=(15 / 100, None),  # Set size hint ratio
+            height=40,
+            font_size='12sp',
+            shorten=True  # Long error messages are cut to fit
+        )
+
+        # Each widget is bound once; the handlers act on whichever row is currently shown
+        self.dropdown1.bind(text=self.on_flavour)
+        self.dropdown2.bind(text=self.on_energy)
+        self.text_input.bind(text=self.on_events)
+        self.text_input.bind(on_text_validate=self.on_validate)
+        self.colour_button.bind(on_press=self.on_colour)
+        self.weight_button.bind(on_press=self.on_weight)
+
+        self.add_widget(self.dropdown1)
+        self.add_widget(self.dropdown2)
+        self.add_widget(self.text_input)
+        self.add_widget(self.colour_button)
+        self.add_widget(self.weight_button)
+        self.add_widget(self.status_label)
+
+    def refresh_view_attrs(self, rv, index, data):
+        """Show the row dict at `index` in this (possibly recycled) widget."""
+        self.row = data
+        self.screen = rv.screen
+        self.dropdown1.values = rv.screen.catalog.flavour_options
+        self.show_row()
+
+    def show_row(self):
+        """Copy the row dict into the widgets without feeding the changes back."""
+        row = self.row
+        self._syncing = True
+        self.dropdown1.text = row['flavour']
+        self.dropdown2.values = row['energies']
+        self.dropdown2.text = row['energy']
+        self.dropdown2.disabled = not row['energies']
+        self.text_input.text = row['events']
+        self.text_input.disabled = not row['energies']
+        self.status_label.text = row['status']
+        if row['colour'] is None:
+            self.colour_button.text = 'Palette'
+            self.colour_button.background_color = [0.3, 0.3, 0.3, 1]
+        else:
+            self.colour_button.text = ''
+            self.colour_button.background_color = [value / 255.0 for value in row['colour']] + [1]
+        self.weight_button.text = f"{row['weight']:.0%}"
+        self._syncing = False
+
+    def on_flavour(self, spinner, text):
+        if self._syncing or self.row is None:
+            return
+        self.screen.update_energy_dropdown(self.row, text)
+        self.show_row()
+
+    def on_energy(self, spinner, energy_text):
+        if self._syncing or self.row is None:
+            return
+        self.row['energy'] = energy_text
+        self.screen.update_event_limit(self.row, self.row['flavour'], energy_text)
+
+    def on_events(self, text_input, text):
+        if self._syncing or self.row is None:
+            return
+        self.row['events'] = text
+
+    def on_colour(self, button):
+        if self.row is None:
+            return
+        colour = self.row['colour'] if self.row['colour'] is None else tuple(self.row['colour'])
+        # Like the weight, a colour from an edited session file restarts the cycle
+        index = ROW_COLOURS.index(colour) if colour in ROW_COLOURS else -1
+        self.row['colour'] = ROW_COLOURS[(index + 1) % len(ROW_COLOURS)]
+        self.show_row()
+
+    def on_weight(self, button):
+        if self.row is None:
+            return
+        # A weight from an edited session file restarts the cycle
+        index = ROW_WEIGHTS.index(self.row['weight']) if self.row['weight'] in ROW_WEIGHTS else -1
+        self.row['weight'] = ROW_WEIGHTS[(index + 1) % len(ROW_WEIGHTS)]
+        self.show_row()
+
+    def on_validate(self, text_input):
+        if self.row is None:
+            return
+        self.screen.validate_input(self.row, self.row['events'], self.screen.catalog.data)
+        self.show_row()  # Validation may have cleared the text
 
 
 class EventsScreen(Screen):
@@ -35,8 +219,25 @@ class EventsScreen(Screen):
         # Path to the custom font that supports Greek symbols
         font_path = "DejaVuSans"  # Use the registered font
 
-        # Initialize the input rows list
-        self.input_rows = []  # Ensure this is defined here
+        # Shared catalog with the flavour/energy lookups precomputed
+        self.catalog = get_catalog()
+
+        # Rendering state: event_source(flavour, energy, event_id) returns an event's hits
+        self.event_source = EventStore()  # Memory-mapped samples under events/
+        # Colours come from lookup tables: per-flavour palettes, gamma and the cube's power budget
+        self.renderer = VoxelRenderer(colour_map=default_colour_map(self.catalog), palette=BY_FLAVOUR)
+        self.frame_cache = FrameCache()  # Rendered sequences, so repeated selections replay instantly
+        self.library = SequenceLibrary()  # Pre-rendered events, preferred over rendering
+        # Row hash -> output of that row's last render: items, renderer, frames (Static), errors
+        self.row_results = {}
+        self.last_mode = None  # Mode of the last submission, saved with the session
+        self.playback_event = None  # Polls the render process while a Dynamic playlist plays
+        self.dynamic_rows = None  # Rows whose Dynamic playback has been started for the current submission
+        self.pool = SubmissionPool()  # Loads and renders submissions off the UI thread
+        self.job = None  # Running submission job, if any
+        self.current_frame = None  # Last frame produced for the cube
+        # Render process shared with the other screens; it owns the cube output
+        self.output = get_render_client(self.renderer.geometry.shape + (3,))
 
         # Use FloatLayout to allow absolute positioning
         layout = FloatLayout()
@@ -56,26 +257,33 @@ class EventsScreen(Screen):
         self.input_container = BoxLayout(orientation='vertical', size_hint=(0.9, 0.6), padding=[30, 10],
                                          pos_hint={'center_y': 0.55, 'center_x': 0.5})
 
-        # Create a ScrollView for the input fields
-        scroll_view = ScrollView(size_hint=(1, 1))  # Fill the available space
+        # Create a RecycleView for the input rows: only the visible rows own widgets
+        self.rows_view = RecycleView(size_hint=(1, 1))  # Fill the available space
+        self.rows_view.screen = self  # Lets the recycled rows reach the catalog and handlers
+
+        # Initialize the input rows list: the row dicts are the RecycleView data itself
+        self.input_rows = self.rows_view.data
 
-        # Create a vertical BoxLayout to hold input rows
-        self.input_layout = BoxLayout(
+        # Create a vertical RecycleBoxLayout to lay out the visible rows
+        self.input_layout = RecycleBoxLayout(
             orientation='vertical',  # Stack input rows vertically
             spacing=10,
+            default_size=(None, 50),  # Every row has the same height
+            default_size_hint=(1, None),
             size_hint_y=None,
             padding=[0, 0]  # No additional padding
         )
         self.input_layout.bind(minimum_height=self.input_layout.setter('height'))  # Allow dynamic height
 
+        # Add the layout to the RecycleView, then pick the row widget (needs the layout to exist)
+        self.rows_view.add_widget(self.input_layout)
+        self.rows_view.viewclass = SelectionRow
+
         # Initial input row
         self.add_input_row()
 
-        # Add the input layout to the ScrollView
-        scroll_view.add_widget(self.input_layout)
-
-        # Add the ScrollView to the input container
-        self.input_container.add_widget(scroll_view)
+        # Add the RecycleView to the input container
+        self.input_container.add_widget(self.rows_view)
 
         # Create a white border around the visible area of the scroll view
         with self.input_container.canvas.after:
@@ -94,6 +302,24 @@ class EventsScreen(Screen):
         add_button.pos_hint = {'center_x': 0.95, 'center_y': 0.95}  # Position it below the input row
         layout.add_widget(add_button)
 
+        # Save the rows and settings to SESSION_FILE, or restore them from it
+        save_button = Button(text='Save', size_hint=(None, None), size=(60, 30),
+                             pos_hint={'center_x': 0.05, 'center_y': 0.95})
+        save_button.bind(on_press=lambda instance: self.save_session())
+        layout.add_widget(save_button)
+        load_button = Button(text='Load', size_hint=(None, None), size=(60, 30),
+                             pos_hint={'center_x': 0.13, 'center_y': 0.95})
+        load_button.bind(on_press=lambda instance: self.load_session())
+        layout.add_widget(load_button)
+
+        # Progress of the running submission and a summary of its outcome
+        self.progress_bar = ProgressBar(max=1, value=0, size_hint=(0.5, None), height=20,
+                                        pos_hint={'center_x': 0.5, 'center_y': 0.235})
+        layout.add_widget(self.progress_bar)
+        self.status_label = Label(text='', size_hint=(0.9, None), height=20, font_size='14sp',
+                                  pos_hint={'center_x': 0.5, 'center_y': 0.205})
+        layout.add_widget(self.status_label)
+
         # Add Static Submit Button
         static_button = Button(text='Submit Static', size_hint=(None, None), size=(185, 50))
         static_button.bind(on_press=lambda instance: self.submit_data(instance, "Static"))  # Bind with flag
@@ -106,6 +332,25 @@ class EventsScreen(Screen):
         dynamic_button.pos_hint = {'center_x': 0.65, 'center_y': 0.15}  # Position near the middle
         layout.add_widget(dynamic_button)
 
+        # Blend every row into one sequence instead of showing the rows one after another
+        self.composite_button = ToggleButton(text='Composite', size_hint=(None, None), size=(120, 40),
+                                             pos_hint={'center_x': 0.12, 'center_y': 0.15})
+        layout.add_widget(self.composite_button)
+        self.blend_spinner = Spinner(text='Add', values=['Add', 'Max'], size_hint=(None, None), size=(120, 40),
+                                     pos_hint={'center_x': 0.88, 'center_y': 0.15})
+        layout.add_widget(self.blend_spinner)
+
+        # Palette of the next renders; swapping only selects another precomputed table
+        self.palette_spinner = Spinner(text=FLAVOUR_PALETTE, values=[FLAVOUR_PALETTE] + [name.capitalize() for name in PALETTES],
+                                       size_hint=(None, None), size=(120, 40),
+                                       pos_hint={'center_x': 0.88, 'center_y': 0.235})
+        self.palette_spinner.bind(text=self.on_palette)
+        layout.add_widget(self.palette_spinner)
+        # Brighter frames are dimmed to the power supply's budget; show whether that is happening
+        self.power_label = Label(text=power_limit_text(self.renderer.colour_map), size_hint=(None, None),
+                                 size=(140, 30), font_size='13sp', pos_hint={'center_x': 0.12, 'center_y': 0.235})
+        layout.add_widget(self.power_label)
+
         # Add a back button at the bottom
         back_button = Button(text='Back to Main Menu', size_hint=(None, None), size=(170, 40))
         back_button.bind(on_press=self.go_back)  # Bind action for the back button
@@ -115,196 +360,361 @@ class EventsScreen(Screen):
         # Add the main layout to the screen
         self.add_widget(layout)
 
+    def on_palette(self, spinner, text):
+        """Use another palette for the following submissions (cached frames are keyed by palette)."""
+        self.renderer = copy.copy(self.renderer)  # A running job keeps the renderer it was given
+        self.renderer.palette = BY_FLAVOUR if text == FLAVOUR_PALETTE else text.lower()
+
     def update_border(self, instance, value):
         """Update the white border around the input container dynamically."""
         self.border_line.rectangle = (self.input_container.x, self.input_container.y,
                                       self.input_container.width, self.input_container.height)
 
+    @traced('ui.add_input_row')
     def add_input_row(self, instance=None):
         """Adds a new row of input fields."""
-        input_row = BoxLayout(
-            orientation='horizontal',
-            spacing=10,
-            size_hint_y=None,
-            height=50,
-            padding=[30, 0]  # Side padding for the new row
-        )
-
-        # Load the data with Greek symbols
-        data = load_select()
-
-        # Extract flavour symbols for display and names for logic
-        flavour_names = data["flavours"]["name"]
-        flavour_symbols = data["flavours"]["symbol"]
-
-        # Map the symbols to their corresponding names for later use
-        self.symbol_to_name = {symbol: name for name, symbol in zip(flavour_names, flavour_symbols)}
-
-        # Display symbols in the dropdown but use names for internal logic
-        flavour_options = flavour_symbols + ["Background"]
-
-        # Dropdown 1 (Spinner)
-        dropdown1 = Spinner(
-            text='Flavour',
-            values=flavour_options,  # Show the symbols in the dropdown
-            size_hint=(20 / 100, None),  # Set size hint ratio
-            height=40,
-            font_name="DejaVuSans",  # Use the registered font for the selected item
-            option_cls=CustomSpinnerOption  # Apply the custom SpinnerOption class for dropdown items
-        )
-
-        # Dropdown 2 (Spinner)
-        dropdown2 = Spinner(
-            text='Energy',
-            values=[],  # Initially empty
-            size_hint=(20 / 100, None),  # Set size hint ratio
-            height=40,
-            disabled=True,  # Initially disabled
-            font_name="DejaVuSans"  # Use the registered font
-        )
-
-        # Text Input Box with centered text
-        text_input = TextInput(
-            hint_text='Event numbers',
-            size_hint=(50 / 100, None),  # Set size hint ratio
-            height=40,
-            halign='center',  # Center text horizontally
-            multiline=False,  # Set to False to keep it a single line
-            padding_y=(10, 10),  # Add vertical padding for centering effect
-            disabled=True,  # Initially disabled
-            font_name="DejaVuSans"  # Use the registered font
-        )
-
-        # Bind the flavour dropdown to update the energy dropdown for the specific row
-        dropdown1.bind(text=lambda spinner, text: self.update_energy_dropdown(spinner, text, dropdown2, text_input))
-
-        # Bind text validation to the on_text_validate event (pressing "Enter")
-        text_input.bind(on_text_validate=lambda instance: self.validate_input(text_input, text_input.text, data))
-
-        input_row.add_widget(dropdown1)
-        input_row.add_widget(dropdown2)
-        input_row.add_widget(text_input)
-
-        # Add the new input row to the main input layout (stacking below)
-        self.input_layout.add_widget(input_row)
-
-        # Store the input row in the list for later access
-        self.input_rows.append((dropdown1, dropdown2, text_input))
-
-    def update_energy_dropdown(self, spinner, text, dropdown2, text_input):
-        """Update the second dropdown (energy) based on the selection in the first dropdown (flavour)."""
-        data = load_select()
-
-        # Map the selected symbol back to its corresponding name
-        flavour_name = self.symbol_to_name.get(text, text)  # Get the name or use 'text' if it's 'Background'
-
-        if flavour_name == "Background":
-            energy_options = data["background"]["energy"]
-            evs_limits = data["background"]["evs"]
+        # Rows are plain dicts; the RecycleView creates widgets only for the visible ones
+        row = new_row()
+        row['colour'] = PALETTE[len(self.input_rows) % len(PALETTE)]  # Rows start in distinct colours
+        self.input_rows.append(row)
+
+    def update_energy_dropdown(self, row, text):
+        """Update the energy options of a row based on its selected flavour."""
+        row['flavour'] = text
+
+        # Energy options (already strings) for the selected symbol or 'Background'
+        row['energies'] = self.catalog.energies(text)
+
+        # Reset the energy selection, which enables the energy dropdown and event numbers
+        row['energy'] = row['energies'][0] if row['energies'] else ''
+        self.update_event_limit(row, text, row['energy'])
+
+    def update_event_limit(self, row, flavour, energy_text):
+        """Update the limit for event numbers based on the selected flavour and energy."""
+        # Set the event limit on the row (store it for validation)
+        row['event_limit'] = self.catalog.event_limit(flavour, energy_text)
+
+        if self.catalog.energy_index(flavour, energy_text) is None:
+            # Unknown flavour/energy pair, the default limit is used
+            print(f"Failed to update event limit for energy {energy_text}: unknown selection.")
         else:
-            energy_options = data["neutrino"]["energy"]
-            evs_limits = data["neutrino"]["evs"]
-
-        # Convert energy options to strings for consistency
-        energy_options = [str(option) for option in energy_options]
+            print(f"Event limit for energy {energy_text}: {row['event_limit']}")
 
-        # Update the energy dropdown for the specific row
-        dropdown2.values = energy_options  # Set new values for the second dropdown
-        dropdown2.text = energy_options[0] if energy_options else ''  # Reset selection
-        dropdown2.disabled = False  # Enable the energy dropdown
+    def validate_input(self, row, value, data):
+        """Validate the input: ranges, single numbers and exclusions, e.g. '1-5,8,12-20,!14'."""
+        row['selection'] = None  # Forget the previous selection until this one validates
 
-        # Enable the text input box for event numbers
-        text_input.disabled = False  # Enable the text input
-
-        # Bind the energy dropdown to dynamically adjust the limit based on the selected energy
-        dropdown2.bind(text=lambda spinner, energy_text: self.update_event_limit(text_input, energy_text, evs_limits))
-
-    def update_event_limit(self, text_input, energy_text, evs_limits):
-        """Update the limit for event numbers based on the selected energy."""
-        try:
-            # Check if energy_text is 'N/A' (for Background)
-            if energy_text == "N/A":
-                event_limit = evs_limits[0]  # Background has only one limit
-            else:
-                # Convert energy_text to a string and get the index
-                energy_index = self.input_rows[-1][1].values.index(str(energy_text))  # Get the index of the energy
-                event_limit = evs_limits[energy_index]
-
-            # Set the event limit on the text input (store it for validation)
-            text_input.event_limit = event_limit
-            print(f"Event limit for energy {energy_text}: {event_limit}")
-        except (ValueError, IndexError) as e:
-            # Handle the case where energy_text is not a valid index or out of bounds
-            text_input.event_limit = 30  # Set a default limit if necessary
-            print(f"Failed to update event limit for energy {energy_text}: {str(e)}.")
-
-    def validate_input(self, instance, value, data):
-        """Validate the input to ensure it only contains integers or arrays of integers."""
         if value.strip() == "":
             return False  # Ignore empty input and mark invalid
 
-        # Get the maximum value from the evs limit (stored in the input field)
-        max_value = getattr(instance, 'event_limit', 30)  # Default to 30 if no event limit is set
+        # Get the maximum value from the evs limit (stored in the row)
+        max_value = row.get('event_limit', 30)  # Default to 30 if no event limit is set
 
         try:
-            # Allow comma-separated values, and ranges like "1-10"
-            if '-' in value:
-                start, end = value.split('-')
-                start, end = int(start.strip()), int(end.strip())
-                if start > max_value or end > max_value or start > end:
-                    instance.text = ''  # Clear input if the range exceeds the limit or is invalid
-                    return False  # Invalid input
-            elif ',' in value:
-                # Split the input by commas and convert to integers
-                int_list = [int(num.strip()) for num in value.split(',')]
-                if any(num > max_value for num in int_list):
-                    instance.text = ''  # Clear the input if any number exceeds the limit
-                    return False  # Invalid input
-            else:
-                # Single integer input
-                num = int(value)
-                if num > max_value:
-                    instance.text = ''  # Clear the input if it exceeds the limit
-                    return False  # Invalid input
-
-            # If the input is valid, return True
-            return True
+            # Same rules as the command line; compiled once per distinct text, so re-validating
+            # on submit does not re-parse
+            with span('parse'):
+                selection = validate_selection(value, max_value, minimum=FIRST_EVENT)
         except ValueError:
-            # If the input is not a valid integer or range, clear it and return False
-            instance.text = ''  # Clear the input if it's not a valid integer or list
+            # Bad syntax, or a selection that is empty or exceeds the limit: clear the input
+            row['events'] = ''
             return False
 
-    def submit_data(self, instance, mode):
-        """Collects data from all input rows and handles submission logic."""
-        data = load_select()  # Load data for validation
-        valid_submission_found = False  # Track if at least one valid submission is found
-
-        for dropdown1, dropdown2, text_input in self.input_rows:
-            selected_option1_symbol = dropdown1.text
-            selected_option2 = dropdown2.text
-            entered_text = text_input.text
-
-            # Map the selected symbol to its corresponding name
-            selected_option1_name = self.symbol_to_name.get(selected_option1_symbol, selected_option1_symbol)
+        # Keep the compiled selection for submission
+        row['selection'] = selection
+        return True
 
+    @traced('ui.submit_data')
+    def submit_data(self, instance, mode):
+        """Collects data from all input rows and hands the new or changed ones to the worker pool."""
+        self.catalog.refresh()  # Pick up edits to select.json once per submit, not per row
+        data = self.catalog.data  # Data for validation
+        valid_rows = []  # Rows that passed validation, in order
+        changed_rows = []  # Valid rows without output from an earlier submission
+
+        # A resubmit replaces whatever is still running
+        self.cancel_submission()
+        self.stop_playback()
+        self.dynamic_rows = None
+        self.last_mode = mode
+
+        for row in self.input_rows:
             # Validate the input again before processing it
-            if not self.validate_input(text_input, entered_text, data):  # Validate during submission
-                print(f'Invalid input for: {selected_option1_name}, {selected_option2}')
+            if not self.validate_input(row, row['events'], data):  # Validate during submission
+                row['status'] = 'Invalid' if row['energies'] else ''  # Untouched rows are simply skipped
                 continue  # Skip to the next row if validation fails
 
-            # If the input is valid, set the flag to True and proceed with submission
-            valid_submission_found = True  # At least one valid submission is found
-            print(
-                f'Selected Option 1: {selected_option1_name}, Selected Option 2: {selected_option2}, '
-                f'Entered Text: {entered_text}'
-            )
+            row['hash'] = row_hash(self.catalog.flavour_name(row['flavour']), row['energy'], row['selection'],
+                                   mode, self.renderer)
+            result = self.row_results.get(row['hash'])
+            if result is not None and not result['errors']:
+                row['status'] = self.row_status(result['errors'])  # Unchanged and complete: reuse
+            else:  # New, edited, or failed last time (e.g. a missing event file since restored)
+                row['status'] = 'Queued'
+                changed_rows.append(row)
+            valid_rows.append(row)
+
+        # Validation may have cleared some rows, refresh the visible widgets
+        self.rows_view.refresh_from_data()
 
         # Handle the case if no valid submissions were found
-        if not valid_submission_found:
-            print("Submission failed: No valid rows found.")
+        if not valid_rows:
+            self.status_label.text = "Submission failed: No valid rows found."
+            return
+
+        # Forget the output of rows that were edited or removed
+        hashes = {row['hash'] for row in valid_rows}
+        self.row_results = {key: result for key, result in self.row_results.items() if key in hashes}
+
+        if not changed_rows:
+            self.finish_submission(mode, valid_rows, len(valid_rows))
+            return
+
+        self.progress_bar.value = 0
+        self.status_label.text = f"Rendering {len(changed_rows)} of {len(valid_rows)} row(s)..."
+        if self.streams(mode) and valid_rows[0] not in changed_rows:
+            self.start_dynamic(valid_rows)  # The first row is ready: play while the rest render
+        self.job = self.pool.submit(
+            [list(self.playlist_items([row])) for row in changed_rows], mode, self.event_source, self.renderer,
+            cache=self.frame_cache,
+            library=self.library,
+            dispatch=lambda callback: Clock.schedule_once(lambda dt: callback()),  # Back onto the UI thread
+            on_progress=self.on_submission_progress,
+            on_row_done=lambda job, index: self.on_submission_row_done(job, changed_rows[index], index, valid_rows),
+            on_finished=lambda job: self.on_submission_finished(job, valid_rows, changed_rows)
+        )
+
+    def playlist_items(self, rows):
+        """Lazily expand validated rows into (flavour name, energy, event id) items."""
+        for row in rows:
+            flavour_name = self.catalog.flavour_name(row['flavour'])
+            for event_id in row['selection']:
+                yield flavour_name, row['energy'], event_id
+
+    @traced('ui.submission_progress')
+    def on_submission_progress(self, job):
+        if job is self.job:
+            self.progress_bar.value = job.progress
+
+    @traced('ui.submission_row_done')
+    def on_submission_row_done(self, job, row, index, rows):
+        """Show a row's outcome next to it; Dynamic playback starts as soon as the first row is ready."""
+        if job is not self.job:
+            return  # Stale callback from a cancelled submission
+        row['status'] = self.row_status(job.errors[index])
+        self.rows_view.refresh_from_data()
+        if self.streams(job.mode) and row is rows[0] and self.dynamic_rows is None:
+            # Later rows are most likely cached by the time playback reaches them; if not, the
+            # render process renders them itself, ahead of playback
+            self.start_dynamic(rows)
+
+    @staticmethod
+    def row_status(errors):
+        """Status text of a row from the errors of its events."""
+        if not errors:
+            return 'Done'
+        (flavour, energy, event_id), message = errors[0]
+        return f"{len(errors)} failed: #{event_id} {message}"
+
+    @traced('ui.submission_finished')
+    def on_submission_finished(self, job, rows, changed_rows):
+        if job is not self.job:
+            return
+        self.job = None
+        for index, row in enumerate(changed_rows):
+            self.row_results[row['hash']] = {
+                'items': job.rows[index],
+                'renderer': job.renderer,  # Cache keys of the row's frames
+                'frames': job.frames[index],
+                'errors': job.errors[index]
+            }
+        self.finish_submission(job.mode, rows, len(rows) - len(changed_rows))
+
+    def finish_submission(self, mode, rows, reused):
+        """Show the submitted rows once every one of them has output, rendered now or reused."""
+        failed = sum(1 for row in rows if self.row_results[row['hash']]['errors'])
+        self.status_label.text = (f"Submission done: {len(rows) - failed} of {len(rows)} row(s) OK, "
+                                  f"{reused} unchanged, cache hit rate {self.frame_cache.stats()['hit_rate']:.0%}")
+
+        if self.composite_button.state == 'down':
+            self.show_composite(mode, rows)
+        elif mode == "Dynamic":
+            if self.dynamic_rows is not rows:  # Not already started with the first row
+                self.start_dynamic(rows)
         else:
-            print("Submission successful: At least one valid row was submitted.")
+            for row in rows:
+                for item, frames in self.row_results[row['hash']]['frames']:
+                    self.show_frame(frames[0])
+
+    def show_composite(self, mode, rows):
+        """Blend the rendered events of every row into one sequence, in the rows' colours and weights.
+
+        The render process blends it, reading the events from the cache the pool filled, and caches
+        it under the rows' hashes, colours and weights, so an unchanged set of rows (also after
+        restoring a session) replays without compositing again.
+        """
+        self.stop_playback()
+        blend = self.blend_spinner.text.lower()
+        key = ('composite', mode, blend,
+               tuple((row['hash'], None if row['colour'] is None else tuple(row['colour']), row['weight'])
+                     for row in rows))
+        sources = []
+        for row in rows:
+            result = self.row_results[row['hash']]
+            failed = {item for item, message in result['errors']}  # Already reported on the row
+            sources.extend((item, result['renderer'], row['colour'], row['weight'])
+                           for item in result['items'] if item not in failed)
+        if not sources:
+            return
+        self.output.load_composite(key, sources, blend, mode)
+        self.output.play()
+        self.playback_event = Clock.schedule_interval(self.poll_playback, 0.25)
+
+    def streams(self, mode):
+        """Whether a submission in `mode` plays its rows as they become ready (not when composited)."""
+        return mode == "Dynamic" and self.composite_button.state != 'down'
+
+    def cancel_submission(self):
+        """Cancel the running submission job, if any."""
+        if self.job is not None:
+            self.job.cancel()
+            self.job = None
+            self.progress_bar.value = 0
+
+    def start_dynamic(self, rows):
+        """Play the selected events as time-evolving sequences, replacing any running playback."""
+        self.stop_playback()
+        if self.event_source is None:
+            self.status_label.text = "Dynamic submission: no event source available."
+            return
+
+        # The render process streams and paces the playlist, from the cache the pool fills
+        self.dynamic_rows = rows
+        self.output.load(self.playlist_items(rows), 'Dynamic', self.renderer)
+        self.output.play()
+        self.playback_event = Clock.schedule_interval(self.poll_playback, 0.25)
+
+    def show_frame(self, frame):
+        """Send a rendered frame to the cube (called from the UI and playback threads)."""
+        self.current_frame = frame
+        self.output.send_frame(frame)
+
+    @traced('ui.poll_playback')
+    def poll_playback(self, dt):
+        """Read replies from the render process; summarize and stop polling when playback ends."""
+        for message in self.output.poll():
+            if message[0] == 'error':
+                print(f"Render process: {message[1]}")
+                self.status_label.text = f"Cube output: {message[1]}"
+            elif message[0] == 'finished':
+                self.on_playback_finished(message[1])
+
+    def on_playback_finished(self, stats):
+        """Summarize a finished playback."""
+        self.stop_polling()
+        if 'error' in stats:
+            self.status_label.text = f"Playback stopped after {stats['shown']} frames: {stats['error']}"
+            return
+        if self.last_mode == 'Static':
+            return  # A Static composite is a single frame: keep the submission summary
+        summary = (f"Playback: {stats['shown']} frames at {stats['fps']:.1f} fps, {stats['dropped']} dropped, "
+                   f"{stats['underruns']} underruns, {stats['keyframes']} keyframes, {stats['coalesced']} coalesced")
+        if stats.get('shards'):
+            # Sharded cube: how far behind the slowest frame each controller was
+            summary += ", shard lag p99 " + " / ".join(f"{shard['lag_p99']:.1f}" for shard in stats['shards']) + " ms"
+        self.status_label.text = summary
+
+    def stop_polling(self):
+        if self.playback_event is not None:
+            self.playback_event.cancel()
+            self.playback_event = None
+
+    def stop_playback(self):
+        """Stop the running Dynamic playback, if any."""
+        if self.playback_event is not None:
+            self.output.stop()
+            self.stop_polling()
+
+    def save_session(self, path=SESSION_FILE):
+        """Write the rows and settings to `path` (JSON)."""
+        session = {
+            'version': SESSION_VERSION,
+            'mode': self.last_mode,  # Restoring submits again in this mode
+            'composite': self.composite_button.state == 'down',
+            'blend': self.blend_spinner.text,
+            'palette': self.palette_spinner.text,
+            'rows': [{'flavour': row['flavour'], 'energy': row['energy'], 'events': row['events'],
+                      'colour': row['colour'], 'weight': row['weight']}
+                     for row in self.input_rows if row['energies']]  # Untouched rows are left out
+        }
+        with open(path, 'w') as file:
+            json.dump(session, file, indent=2)
+        self.status_label.text = f"Saved {len(session['rows'])} row(s) to {path}"
+
+    def load_session(self, path=SESSION_FILE):
+        """Restore rows and settings from `path` and submit them again.
+
+        Rows whose output is still cached (or pre-rendered) are not rendered again, and an unchanged
+        composite replays straight from the frame cache.
+        """
+        try:
+            with open(path, 'r') as file:
+                session = json.load(file)
+        except (OSError, ValueError) as e:
+            self.status_label.text = f"Could not load session: {e}"
+            return
+        if not isinstance(session, dict) or session.get('version') != SESSION_VERSION:
+            self.status_label.text = f"Could not load session: {path} is not a version {SESSION_VERSION} session"
+            return
+        if not isinstance(session.get('rows'), list):
+            self.status_label.text = f"Could not load session: {path} has no list of rows"
+            return
+
+        # Check every entry before touching the screen; a broken entry (e.g. from editing the file by
+        # hand) is skipped and reported instead of aborting the whole session
+        entries, skipped = [], 0
+        for entry in session['rows']:
+            try:
+                colour = entry.get('colour')
+                if colour is not None:
+                    colour = tuple(colour)
+                    if len(colour) != 3 or not all(isinstance(value, (int, float)) for value in colour):
+                        raise ValueError(f"not an RGB colour: {colour}")
+                entries.append({'flavour': str(entry['flavour']), 'energy': str(entry['energy']),
+                                'events': str(entry['events']), 'colour': colour,
+                                'weight': float(entry.get('weight', 1.0))})
+            except (AttributeError, KeyError, TypeError, ValueError):
+                skipped += 1
+
+        self.cancel_submission()
+        self.stop_playback()
+        rows = []
+        for entry in entries:
+            row = new_row()
+            self.update_energy_dropdown(row, entry['flavour'])
+            row['energy'] = entry['energy']
+            self.update_event_limit(row, row['flavour'], row['energy'])
+            row['events'] = entry['events']
+            row['colour'] = entry['colour']
+            row['weight'] = entry['weight']
+            rows.append(row)
+        self.rows_view.data = rows or [new_row()]
+        self.input_rows = self.rows_view.data
+
+        self.composite_button.state = 'down' if session.get('composite') else 'normal'
+        self.blend_spinner.text = session.get('blend', 'Add')
+        self.palette_spinner.text = session.get('palette', FLAVOUR_PALETTE)  # Also selects the renderer palette
+        if session.get('mode') in ('Static', 'Dynamic') and rows:
+            self.submit_data(None, session['mode'])
+        else:
+            self.status_label.text = f"Loaded {len(rows)} row(s) from {path}"
+        if skipped:
+            self.status_label.text += f" ({skipped} invalid row(s) skipped)"
 
     def go_back(self, instance):
+        # Stop any running submission and playback before leaving the screen
+        self.cancel_submission()
+        self.stop_playback()
+
         # This will transition back to the first screen
         self.manager.current = 'first'  # Assuming the first screen is named 'first'
@@ -8,18 +8,29 @@ from kivy.uix.widget import Widget  # Import Widget for spacing
 from kivy.uix.boxlayout import BoxLayout  # Import BoxLayout for the popup
 from kivy.app import App  # Import App to stop the application
 from kivy.core.window import Window  # Import Window to close the application
-from PIL import Image as PILImage  # Import Pillow for image handling
+from kivy.clock import Clock
+from startup import image_size
+from instrumentation import traced
+
+# The DEMO/GAME modules pull in NumPy and the render process, so they are imported on first Play
 
 class FirstScreen(Screen):
     def __init__(self, **kwargs):
         super(FirstScreen, self).__init__(**kwargs)
 
+        # DEMO playlist controller, created on the first Play, and the event that refreshes its progress
+        self.demo = None
+        self.demo_stats_event = None
+
+        # GAME loop, created on the first Play, and the event that refreshes its latency readout
+        self.game = None
+        self.game_stats_event = None
+
         # Use FloatLayout to allow for absolute positioning
         layout = FloatLayout()
 
-        # Load the logo using Pillow to get its size
-        pil_image = PILImage.open('logo.png')
-        original_width, original_height = pil_image.size  # Get original dimensions
+        # Read the logo size from its header, without decoding the image
+        original_width, original_height = image_size('logo.png')
 
         # Desired new width (you can change this value as needed)
         new_width = 380
@@ -75,8 +86,9 @@ class FirstScreen(Screen):
         """Create and show a popup with Play, Pause, and Exit buttons."""
         popup_content = BoxLayout(orientation='vertical', padding=10)
 
-        # Add a label for the action type
-        popup_content.add_widget(Label(text=f"{action} Options"))
+        # Add a label for the action type (also shows the DEMO playback state)
+        self.popup_label = Label(text=f"{action} Options")
+        popup_content.add_widget(self.popup_label)
 
         # Play button
         play_button = Button(text='Play')
@@ -93,6 +105,11 @@ class FirstScreen(Screen):
         # Add buttons to the popup layout
         popup_content.add_widget(play_button)
         popup_content.add_widget(pause_button)
+        if action == "DEMO":
+            # Skip button to move on to the next playlist item
+            skip_button = Button(text='Skip')
+            skip_button.bind(on_press=lambda x: self.popup_action(action, "Skip"))  # Bind action
+            popup_content.add_widget(skip_button)
         popup_content.add_widget(exit_button)
 
         # Create the popup
@@ -103,18 +120,113 @@ class FirstScreen(Screen):
 
     def popup_exit_action(self, action):
         """Handle exit action from popup and return to first screen."""
+        if action == "DEMO" and self.demo is not None:
+            self.demo.stop()  # Leaving the DEMO menu stops the playlist
+            if self.demo_stats_event is not None:
+                self.demo_stats_event.cancel()
+                self.demo_stats_event = None
+        if action == "GAME":
+            self.stop_game()
         self.manager.current = 'first'  # Transition back to the first screen
         self.current_popup.dismiss()  # Dismiss the popup
 
+    @traced('ui.popup_action')
     def popup_action(self, action, option):
         """Handle actions from the popup."""
-        print(f"{action} - {option} selected!")
+        if action == "GAME":
+            self.game_action(option)
+            return
+
+        if option == "Play":
+            self.get_demo().play()  # Starts the playlist, or resumes it when paused
+            if self.demo_stats_event is None:
+                # The render process plays it: follow its progress while the menu is open
+                self.demo_stats_event = Clock.schedule_interval(self.update_demo_stats, 0.5)
+        elif self.demo is not None:
+            if option == "Pause":
+                self.demo.pause()
+            elif option == "Skip":
+                self.demo.skip()
+        self.update_demo_stats()
+
+    def update_demo_stats(self, *args):
+        """Show the DEMO state and position in the popup."""
+        if self.demo is None:
+            return
+        stats = self.demo.stats()
+        self.popup_label.text = (f"DEMO: {stats['state']}, item {stats['index'] + 1} of {len(self.demo.items)}, "
+                                 f"{stats['fps']:.0f} fps, {stats['underruns']} underruns")
+
+    def get_demo(self):
+        """The DEMO playlist controller, created on first use; the render process renders and plays it."""
+        if self.demo is None:
+            from event_catalog import get_catalog
+            from voxel_renderer import VoxelRenderer
+            from colour_map import BY_FLAVOUR, default_colour_map
+            from demo_playback import PlaylistController, load_playlist
+            from frame_ring import get_render_client
+            renderer = VoxelRenderer(colour_map=default_colour_map(get_catalog()), palette=BY_FLAVOUR)
+            self.demo = PlaylistController(load_playlist(get_catalog()), renderer, get_render_client())
+        return self.demo
 
     def demo_action(self, instance):
         print("DEMO button pressed!")  # Action for DEMO button
 
-    def game_action(self, instance):
-        print("GAME button pressed!")  # Action for GAME button
+    def game_action(self, option):
+        """Play/Pause the GAME loop, routing keyboard and touch input to it while it runs."""
+        if option == "Play":
+            if self.game is None:
+                from game_mode import CatchGame, GameLoop
+                from frame_ring import get_render_client
+                self.game = GameLoop(CatchGame(), sink=get_render_client().send_frame)  # Copies the frame out
+            if self.game.state == 'stopped':
+                Window.bind(on_key_down=self.on_game_key, on_touch_down=self.on_game_touch)
+                self.game_stats_event = Clock.schedule_interval(self.update_game_stats, 0.5)
+            self.game.play()
+        elif option == "Pause" and self.game is not None:
+            self.game.pause()
+        self.update_game_stats()
+
+    def stop_game(self):
+        """Stop the GAME loop and release the input bindings."""
+        if self.game is None:
+            return
+        self.game.stop()
+        Window.unbind(on_key_down=self.on_game_key, on_touch_down=self.on_game_touch)
+        if self.game_stats_event is not None:
+            self.game_stats_event.cancel()
+            self.game_stats_event = None
+
+    @traced('ui.game_key')
+    def on_game_key(self, window, key, scancode, codepoint, modifiers):
+        """Keyboard input: arrows/WASD move in x/y, page up/down or R/F in z."""
+        from game_mode import KEY_MOVES  # Already loaded by game_action
+        move = KEY_MOVES.get(key) or KEY_MOVES.get(codepoint)
+        if move is None or self.game.state != 'playing':
+            return False
+        self.game.push_input(move)
+        return True
+
+    @traced('ui.game_touch')
+    def on_game_touch(self, window, touch):
+        """Touch input: a tap outside the popup moves the cursor towards the tap."""
+        if self.game.state != 'playing' or self.current_popup.collide_point(*touch.pos):
+            return False  # Let the popup buttons handle their own touches
+        dx, dy = touch.x - window.width / 2, touch.y - window.height / 2
+        if abs(dx) > abs(dy):
+            self.game.push_input((1 if dx > 0 else -1, 0, 0))
+        else:
+            self.game.push_input((0, 1 if dy > 0 else -1, 0))
+        return True  # Do not let the tap dismiss the popup
+
+    @traced('ui.game_stats')
+    def update_game_stats(self, *args):
+        """Show the game state, score and input-to-LED latency percentiles in the popup."""
+        if self.game is None:
+            return
+        p50, p99 = self.game.latency.percentiles()
+        latency = "no input yet" if p50 is None else f"latency p50 {p50:.1f} ms, p99 {p99:.1f} ms"
+        self.popup_label.text = f"GAME: {self.game.state}, score {self.game.game.score}, {latency}"
 
     def events_action(self, instance):
         self.manager.current = 'events'  # Change to the EventsScreen
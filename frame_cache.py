@@ -0,0 +1,188 @@
+import hashlib
+import os
+import threading
+import zipfile
+import zlib
+from collections import OrderedDict
+import numpy as np
+
+CACHE_DIR = os.path.join('cache', 'frames')  # Default on-disk tier, relative to the working directory
+DEFAULT_MEMORY_BYTES = 256 * 1024 * 1024  # In-memory tier cap
+DEFAULT_DISK_BYTES = 1024 * 1024 * 1024  # On-disk tier cap
+
+
+def frame_key(flavour, energy, event_id, mode, renderer):
+    """Cache key of one rendered event: what was selected, how, and for which cube and colours."""
+    return str(flavour), str(energy), int(event_id), mode, renderer.key()
+
+
+class FrameCache:
+    """Two-tier LRU cache of rendered frame sequences (arrays of shape (frames, N, N, N, 3)).
+
+    The memory tier is capped in bytes and evicts least recently used sequences; the disk tier
+    keeps compressed copies so replays survive evictions and restarts. The disk tier is capped
+    too: files are touched when used, and the least recently used ones are deleted once the
+    directory grows past `max_disk_bytes`. Several processes may share the directory, so that
+    cap is enforced approximately.
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bytes=DEFAULT_MEMORY_BYTES, disk=True, max_disk_bytes=DEFAULT_DISK_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.disk = disk
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_bytes = None  # Size of the disk tier as last scanned plus what was written since
+        self._entries = OrderedDict()  # key -> frames, least recently used first
+        self._lock = threading.Lock()  # Shared by the UI and the rendering threads
+        self.bytes = 0  # Size of the memory tier
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.root, digest + '.npz')
+
+    def get(self, key):
+        """Cached frames for `key`, or None."""
+        with self._lock:
+            frames = self._entries.get(key)
+            if frames is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+        if frames is not None:
+            self._touch(key)  # Keep the disk copy recent too, it is what survives a restart
+            return frames
+
+        if self.disk:
+            path = self._path(key)
+            try:
+                with np.load(path) as archive:
+                    frames = archive['frames']
+            except FileNotFoundError:
+                frames = None
+            except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile, zlib.error):
+                frames = None  # Unreadable or truncated (e.g. a full disk): a miss, and not worth keeping
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            if frames is not None:
+                self._remember(key, frames)
+                self._touch(key)
+                with self._lock:
+                    self.disk_hits += 1
+                return frames
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, frames):
+        """Store frames in memory and, if enabled, compressed on disk."""
+        frames = self._remember(key, np.array(frames, dtype=np.uint8))  # Own copy, made read-only
+        if self.disk:
+            os.makedirs(self.root, exist_ok=True)
+            path = self._path(key)
+            temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"  # Unique across GUI and render processes
+            try:
+                with open(temporary, 'wb') as file:
+                    np.savez_compressed(file, frames=frames)
+                    size = file.tell()
+                os.replace(temporary, path)  # Readers never see a half-written file
+            except OSError:
+                try:
+                    os.remove(temporary)  # Don't leave a partial file behind on a full disk
+                except OSError:
+                    pass
+                raise
+            self._trim_disk(size)
+        return frames
+
+    def get_or_render(self, key, render):
+        """Cached frames for `key`, calling `render()` and caching its result on a miss."""
+        frames = self.get(key)
+        if frames is None:
+            frames = self.put(key, render())
+        return frames
+
+    def _touch(self, key):
+        """Mark the disk copy of `key` as just used."""
+        if self.disk:
+            try:
+                os.utime(self._path(key))
+            except OSError:
+                pass  # Not on disk (yet), or evicted by another process
+
+    def _trim_disk(self, written):
+        """Account for `written` new bytes; past the cap, delete least recently used files."""
+        with self._lock:
+            if self.disk_bytes is not None:
+                self.disk_bytes += written
+                if self.disk_bytes <= self.max_disk_bytes:
+                    return
+            # Rescan: other processes write to the same directory
+            files = []
+            for entry in os.scandir(self.root):
+                if entry.name.endswith('.npz'):
+                    try:
+                        info = entry.stat()
+                    except OSError:
+                        continue  # Deleted meanwhile
+                    files.append((info.st_mtime, info.st_size, entry.path))
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_disk_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass  # Already removed by another process
+                total -= size
+                self.disk_evictions += 1
+            self.disk_bytes = total
+
+    def _remember(self, key, frames):
+        """Add frames to the memory tier, evicting least recently used entries over the byte cap."""
+        frames.setflags(write=False)  # Shared between consumers, nobody may modify them
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous.nbytes
+            if frames.nbytes <= self.max_bytes:
+                self._entries[key] = frames
+                self.bytes += frames.nbytes
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted.nbytes
+                self.evictions += 1
+        return frames
+
+    def clear(self, disk=False):
+        """Empty the memory tier, and the disk tier too if asked."""
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+        if disk and os.path.isdir(self.root):
+            for name in os.listdir(self.root):
+                if name.endswith('.npz'):
+                    os.remove(os.path.join(self.root, name))
+            with self._lock:
+                self.disk_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'disk_evictions': self.disk_evictions,
+                'disk_bytes': self.disk_bytes,
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+            }
@@ -0,0 +1,310 @@
+import queue
+import threading
+import time
+import numpy as np
+from voxel_renderer import CHARGE, T
+from compositor import Accumulator, event_time_range
+from frame_cache import frame_key
+from instrumentation import gauge, span
+
+DEFAULT_FRAMES_PER_EVENT = 60  # Time slices each event is played back in
+DEFAULT_BUFFER_FRAMES = 30  # Frames the producer may run ahead of playback: a second at 30 fps
+_END = object()  # Marks the end of a frame stream
+
+
+def cache_mode(mode, n_frames=DEFAULT_FRAMES_PER_EVENT):
+    """Mode part of the cache key, matching what the frame pipeline uses for Dynamic playback."""
+    return 'Static' if mode == 'Static' else ('Dynamic', n_frames, True)
+
+
+def event_frames(hits, renderer, n_frames=DEFAULT_FRAMES_PER_EVENT, cumulative=True):
+    """Yield an event as a time-evolving frame sequence, one frame per time slice.
+
+    Voxel indices are computed once per event; each frame then only bins the hits of its own slice.
+    With `cumulative` the deposits build up over time, otherwise every frame shows its slice alone.
+    """
+    hits = np.asarray(hits)
+    geometry = renderer.geometry
+    if not len(hits):
+        yield renderer.shade(np.zeros(geometry.voxels)).reshape(geometry.shape + (3,))
+        return
+
+    # Sort the hits by time once so each slice is a contiguous range
+    hits = hits[np.argsort(hits[:, T], kind='stable')]
+    times, charge = hits[:, T], hits[:, CHARGE].astype(np.float64)  # bincount's own weight cast is slow
+    flat = geometry.voxel_index(hits)
+
+    # Slice boundaries as hit positions in the sorted arrays
+    edges = np.linspace(times[0], times[-1], n_frames + 1)[1:-1]
+    bounds = np.concatenate([[0], np.searchsorted(times, edges, side='right'), [len(hits)]])
+
+    # Scale brightness to the complete event so a build-up does not flicker
+    scale = renderer.charge_scale
+    if scale is None and cumulative:
+        scale = np.bincount(flat, weights=charge, minlength=geometry.voxels + 1)[:-1].max()
+
+    grid = np.zeros(geometry.voxels)
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        with span('render.slice'):  # The consumer's time between frames is not part of the span
+            part = np.bincount(flat[start:stop], weights=charge[start:stop], minlength=geometry.voxels + 1)[:-1]
+            grid = grid + part if cumulative else part
+            frame = renderer.shade(grid, scale).reshape(geometry.shape + (3,))
+        yield frame
+
+
+def playlist_frames(items, load_event, renderer, n_frames=DEFAULT_FRAMES_PER_EVENT, cumulative=True, cache=None,
+                    library=None):
+    """Chain the frame sequences of several events; only one event is held in memory at a time.
+
+    `items` are (flavour name, energy, event id) tuples and `load_event(flavour, energy, event_id)`
+    returns the event's hit array. Events that cannot be loaded are skipped. Events with a file in
+    the SequenceLibrary `library` are streamed from it; with a FrameCache, cached sequences are
+    replayed and newly rendered ones are stored once complete.
+    """
+    for flavour, energy, event_id in items:
+        sequence = library.find(flavour, energy, event_id, 'Dynamic', renderer, n_frames) \
+            if library is not None and cumulative else None
+        if sequence is not None:
+            # Pre-rendered: decoded straight from the mapped file. frames() reuses its array, so each
+            # frame is copied before it can wait in a BoundedFrameBuffer
+            for frame in sequence.frames():
+                yield frame.copy()
+            continue
+
+        mode = ('Dynamic', n_frames, cumulative)
+        key = frame_key(flavour, energy, event_id, mode, renderer) if cache is not None else None
+        frames = cache.get(key) if key is not None else None
+        if frames is not None:
+            yield from frames
+            continue
+
+        try:
+            hits = load_event(flavour, energy, event_id)
+        except (KeyError, IndexError, OSError, ValueError) as e:
+            print(f"Skipping event {event_id} of {flavour} {energy}: {e}")
+            continue
+
+        if key is None:
+            yield from event_frames(hits, renderer.for_flavour(flavour), n_frames, cumulative)
+            continue
+
+        # Keep this event's frames (small next to its hits) so the sequence can be cached
+        rendered = []
+        for frame in event_frames(hits, renderer.for_flavour(flavour), n_frames, cumulative):
+            rendered.append(frame)
+            yield frame
+        cache.put(key, np.stack(rendered))
+
+
+def composite_frames(sources, blend, mode, load_event, cache=None, library=None, key=None,
+                     n_frames=DEFAULT_FRAMES_PER_EVENT):
+    """Blend several events into one sequence and yield its frames; Static composites are one frame.
+
+    `sources` are (item, renderer, colour, weight) tuples, one per event of every row. Each event's
+    frames come from the SequenceLibrary `library`, the FrameCache `cache` or are rendered, and are
+    blended in one at a time. Dynamic events are lined up by their hit times. The composite is kept
+    within the power budget of the first renderer's colour map and cached under `key`.
+    """
+    frames = cache.get(key) if cache is not None and key is not None else None
+    if frames is None:
+        with span('composite'):
+            frames = _composite(sources, blend, mode, load_event, cache, library, n_frames)
+        if frames is None:
+            return  # Nothing could be loaded, already reported on the rows
+        if cache is not None and key is not None:
+            frames = cache.put(key, frames)
+    yield from frames
+
+
+def _composite(sources, blend, mode, load_event, cache, library, n_frames):
+    loaded, t_ranges = [], []
+    for item, renderer, colour, weight in sources:
+        try:
+            # Only Dynamic events are aligned, by their hit times: a scan of one column of the mapped store
+            t_ranges.append(event_time_range(load_event(*item)) if mode != 'Static' else None)
+        except (KeyError, IndexError, OSError, ValueError):
+            continue
+        loaded.append((item, renderer, colour, weight))
+    if not loaded:
+        return None
+
+    accumulator = Accumulator(1 if mode == 'Static' else n_frames, blend, None if mode == 'Static' else t_ranges)
+    for source, (item, renderer, colour, weight) in enumerate(loaded):
+        try:
+            frames = _event_sequence(item, mode, renderer, load_event, cache, library, n_frames)
+        except (KeyError, IndexError, OSError, ValueError):
+            continue
+        accumulator.add(frames, colour, weight, source)
+    if not accumulator.added:
+        return None
+    frames = accumulator.result()
+    # Blended rows can light more of the cube than any one event: keep within the power budget
+    colour_map = loaded[0][1].colour_map
+    if colour_map is not None:
+        frames = colour_map.limit(frames.reshape(len(frames), -1, 3)).reshape(frames.shape)
+    return frames
+
+
+def _event_sequence(item, mode, renderer, load_event, cache, library, n_frames):
+    """An event's (frames, N, N, N, 3) sequence: pre-rendered, cached or rendered now (and cached)."""
+    sequence = library.find(*item, mode, renderer, n_frames) if library is not None else None
+    if sequence is not None:
+        return sequence.read()
+
+    def render():
+        flavour_renderer = renderer.for_flavour(item[0])
+        hits = load_event(*item)
+        if mode == 'Static':
+            return flavour_renderer.render(hits)[None]
+        return np.stack(list(event_frames(hits, flavour_renderer, n_frames)))
+
+    if cache is None:
+        return render()
+    return cache.get_or_render(frame_key(*item, cache_mode(mode, n_frames), renderer), render)
+
+
+class BoundedFrameBuffer:
+    """Runs a frame iterator on a producer thread, holding at most `maxsize` frames ahead.
+
+    The producer blocks when the buffer is full, so memory stays flat however long the stream is,
+    and a slow frame (an event rendered on the spot, a cold cache file) is absorbed by the frames
+    already buffered instead of stalling playback. poll() never blocks, for loops that also serve
+    other work.
+    """
+
+    def __init__(self, frames, maxsize=DEFAULT_BUFFER_FRAMES):
+        self._frames = frames
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._stopped = threading.Event()
+        self.produced = 0  # Frames handed to the buffer so far
+        self.finished = False  # Set by poll() once the stream is exhausted
+        self._thread = threading.Thread(target=self._produce, daemon=True)
+        self._thread.start()
+
+    def _produce(self):
+        try:
+            for frame in self._frames:
+                if not self._put(frame):
+                    return  # Closed while waiting for room
+                self.produced += 1
+        except Exception as e:
+            self._put(e)  # Re-raised on the consumer side
+            return
+        self._put(_END)
+
+    def _put(self, item):
+        """Block until there is room (backpressure), giving up if the buffer gets closed."""
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def poll(self):
+        """The next frame, or None if none is ready yet or the stream is finished; raises the producer's errors."""
+        if self.finished:
+            return None
+        try:
+            item = self._queue.get_nowait()
+        except queue.Empty:
+            return None
+        gauge('queue.frames', self._queue.qsize())
+        if item is _END or isinstance(item, Exception):
+            self.finished = True
+            if item is not _END:
+                raise item
+            return None
+        return item
+
+    def close(self, wait=True):
+        """Stop the producer and drop any buffered frames."""
+        self._stopped.set()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        if wait and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+
+
+class FramePacer:
+    """Delivers frames to a sink at a steady target rate, dropping frames when the sink falls behind.
+
+    run() plays a whole iterator; loops that cannot block in it (the render process) drive the same
+    schedule with start(), admit() and advance().
+    """
+
+    def __init__(self, fps=30.0, clock=time.perf_counter, sleep=time.sleep):
+        self.interval = 1.0 / fps
+        self._clock = clock
+        self._sleep = sleep
+        self._stopped = threading.Event()
+        self.deadline = None  # When the next frame is due
+        self.shown = 0  # Frames delivered to the sink
+        self.dropped = 0  # Frames skipped to get back on schedule
+        self.underruns = 0  # Times the producer could not keep up
+        self.started = None
+        self.finished = None
+
+    @property
+    def achieved_fps(self):
+        end = self.finished if self.finished is not None else self._clock()
+        if self.started is None or end <= self.started:
+            return 0.0
+        return self.shown / (end - self.started)
+
+    def stats(self):
+        return {'shown': self.shown, 'dropped': self.dropped, 'underruns': self.underruns, 'fps': self.achieved_fps}
+
+    def stop(self):
+        self._stopped.set()
+
+    def start(self):
+        """Start the schedule now, or restart it after a pause."""
+        self.deadline = self._clock()
+        if self.started is None:
+            self.started = self.deadline
+
+    def admit(self, waiting):
+        """Decide about a frame the producer was asked for at `waiting`: False to drop it and catch up."""
+        now = self._clock()
+        if now - self.deadline > self.interval:
+            if now - waiting > self.interval:
+                # Nothing was ready in time: restart the schedule instead of dropping fresh frames
+                self.underruns += 1
+                self.deadline = now
+            else:
+                # The sink is behind: skip this frame to catch up
+                self.dropped += 1
+                self.deadline += self.interval
+                return False
+        return True
+
+    def advance(self):
+        """Count a frame as shown and move the deadline to the next one."""
+        self.shown += 1
+        self.deadline += self.interval
+
+    def finish(self):
+        self.finished = self._clock()
+
+    def run(self, frames, sink):
+        """Play `frames` into `sink(frame)` until exhausted or stopped."""
+        self.start()
+        frames = iter(frames)
+        while not self._stopped.is_set():
+            waiting = self._clock()
+            frame = next(frames, _END)
+            if frame is _END:
+                break
+            if not self.admit(waiting):
+                continue
+            now = self._clock()
+            if self.deadline > now:
+                self._sleep(self.deadline - now)
+            sink(frame)
+            self.advance()
+        self.finish()
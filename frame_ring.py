@@ -0,0 +1,452 @@
+import multiprocessing
+import multiprocessing.connection
+import threading
+import time
+from multiprocessing import shared_memory
+import numpy as np
+import instrumentation
+
+RING_SLOTS = 8  # Frames kept in each ring
+STARVED_POLL = 0.005  # Seconds between checks for a frame the producer has not delivered yet
+RESTART_INTERVAL = 1.0  # Seconds between attempts to restart a render process that died
+
+
+class FrameRing:
+    """Ring of preallocated voxel frames in shared memory, indexed by sequence number.
+
+    Layout: int64 header [write sequence, per-slot sequence...], then the frame slots. A writer
+    fills slot `seq % slots` and publishes `seq` last; a reader maps the slot as a NumPy view and
+    can check afterwards (still_valid) that it was not overwritten meanwhile. Nothing is pickled.
+    """
+
+    def __init__(self, shape, slots=RING_SLOTS, name=None):
+        self.shape = tuple(shape)
+        self.slots = slots
+        frame_bytes = int(np.prod(self.shape))
+        header_bytes = 8 * (1 + slots)
+        self._owner = name is None
+        if self._owner:
+            self._memory = shared_memory.SharedMemory(create=True, size=header_bytes + slots * frame_bytes)
+        else:
+            self._memory = shared_memory.SharedMemory(name=name)  # Only the creator unlinks it
+        self.name = self._memory.name
+
+        self._header = np.ndarray((1 + slots,), dtype=np.int64, buffer=self._memory.buf)
+        self._frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=self._memory.buf,
+                                  offset=header_bytes)
+        if self._owner:
+            self._header[:] = 0
+        self._lock = threading.Lock()  # Several threads of one process may write
+
+    @property
+    def sequence(self):
+        """Sequence number of the newest frame (0 before the first write)."""
+        return int(self._header[0])
+
+    def write(self, frame):
+        """Copy a frame into the next slot and publish it. Returns its sequence number."""
+        with self._lock:
+            sequence = int(self._header[0]) + 1
+            slot = sequence % self.slots
+            self._header[1 + slot] = -1  # Mark the slot as being written
+            self._frames[slot] = frame
+            self._header[1 + slot] = sequence
+            self._header[0] = sequence
+            return sequence
+
+    def latest(self):
+        """(sequence, frame view) of the newest complete frame, or (0, None) if none was written."""
+        while True:
+            sequence = int(self._header[0])
+            if not sequence:
+                return 0, None
+            slot = sequence % self.slots
+            if self._header[1 + slot] == sequence:
+                return sequence, self._frames[slot]
+            # The writer lapped us while we looked, try the newer frame
+
+    def still_valid(self, sequence):
+        """True if the slot of `sequence` has not been overwritten since it was read."""
+        return self._header[1 + sequence % self.slots] == sequence
+
+    def read(self, out):
+        """(sequence, out) with the newest complete frame copied into `out`, or (0, None) if none was written.
+
+        Unlike latest() the copy cannot be torn: if the writer laps the slot while it is being
+        copied, the copy is retried from the newer frame.
+        """
+        while True:
+            sequence, frame = self.latest()
+            if not sequence:
+                return 0, None
+            np.copyto(out, frame)
+            if self.still_valid(sequence):
+                return sequence, out
+
+    def close(self):
+        self._header = self._frames = None  # Views must go before the mapping can close
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
+
+
+def render_main(input_name, output_name, shape, control, wake, output_spec, store_root, max_rate=None):
+    """Entry point of the render process: rendering, pacing and the cube output live here.
+
+    Frames come from two places: playlists loaded over the control pipe (rendered here) and frames
+    the GUI posts into the input ring (DEMO, GAME, Static). Everything sent to the cube is also
+    published to the output ring for the GUI to preview. Between frames the process sleeps until
+    the next playlist frame is due, a command arrives or the GUI signals a post on `wake`.
+    """
+    # Heavy modules are only needed in this process
+    from cube_output import open_driver
+    from demo_playback import demo_frames
+    from event_store import EventStore
+    from frame_cache import FrameCache
+    from frame_pipeline import BoundedFrameBuffer, FramePacer, composite_frames, playlist_frames
+    from sequence_file import SequenceLibrary
+
+    inputs = FrameRing(shape, name=input_name)
+    outputs = FrameRing(shape, name=output_name)
+    try:
+        driver = open_driver(output_spec, **({} if max_rate is None else {'max_rate': max_rate}))
+    except Exception as e:
+        # A bad CUBE_OUTPUT or a missing device: say so, and keep the preview running on the simulator
+        control.send(('error', f"cube output {output_spec or ''}: {type(e).__name__}: {e}; using the simulator"))
+        driver = open_driver('sim')
+    store = EventStore(store_root)
+    cache = FrameCache()
+    library = SequenceLibrary()
+
+    frames = None  # BoundedFrameBuffer rendering the loaded playlist ahead of playback
+    pacer = None  # Its schedule, dropped frames and underruns
+    playing = False
+    waiting = None  # Since when the due frame has been waited for
+    loads = 0  # Playlists loaded so far; 'finished' says which one finished
+    demo = None  # (items, renderer, fps) of a loaded DEMO playlist, to restart it from another item
+    position = 0  # DEMO playlist position of the frame on the cube
+    counters = {}  # DEMO items that failed to render
+    posted = 0  # Last GUI frame forwarded
+    posted_frame = np.empty(inputs.shape, dtype=np.uint8)  # Private copy, so the GUI can't overwrite it mid-send
+    reported = None  # Last error sent to the GUI, so a failing link does not flood the pipe
+
+    def send(frame):
+        driver.send_frame(frame)
+        outputs.write(frame)
+
+    def play(source, fps):
+        """Replace the loaded playlist; rendering starts at once, on the buffer's producer thread."""
+        if frames is not None:
+            frames.close(wait=False)  # A producer busy rendering notices at its next frame
+        return BoundedFrameBuffer(source), FramePacer(fps)
+
+    try:
+        while True:
+            try:
+                # Frames posted by the GUI go straight out
+                if inputs.sequence > posted:
+                    sequence, frame = inputs.read(posted_frame)
+                    instrumentation.gauge('queue.ring', sequence - posted)  # More than 1: GUI frames were coalesced
+                    send(frame)
+                    posted = sequence
+
+                # Loaded playlist, paced at its frame rate
+                if playing and time.perf_counter() >= pacer.deadline:
+                    if waiting is None:
+                        waiting = time.perf_counter()
+                    frame = frames.poll()
+                    if frame is not None:
+                        if demo is not None:
+                            position, frame = frame
+                        if pacer.admit(waiting):
+                            send(frame)
+                            pacer.advance()
+                        waiting = None
+                    elif frames.finished:
+                        frames, playing, waiting = None, False, None
+                        pacer.finish()
+                        driver.flush()
+                        control.send(('finished', {**driver.stats(), **pacer.stats(), 'playlist': loads}))
+
+                # Sleep until the next playlist frame is due, a command arrives or the GUI posts a frame;
+                # while the producer is behind, look again shortly
+                if not playing:
+                    timeout = None
+                elif waiting is not None:
+                    timeout = STARVED_POLL
+                else:
+                    timeout = max(0.0, pacer.deadline - time.perf_counter())
+                multiprocessing.connection.wait([control, wake], timeout)
+                while wake.poll():
+                    wake.recv_bytes()
+
+                # Commands: ('load', items, mode, renderer, fps) with mode 'Dynamic' or 'Demo',
+                # ('composite', key, sources, blend, mode, fps), ('play',), ('pause',), ('skip',) (DEMO),
+                # ('stop',), ('status',), ('quit',),
+                # and for instrumentation ('trace', on), ('metrics',), ('dump',)
+                while control.poll():
+                    command = control.recv()
+                    if command[0] == 'load':
+                        _, items, mode, renderer, fps = command
+                        reported, loads, demo = None, loads + 1, None
+                        if mode == 'Demo':
+                            demo, position, counters = (items, renderer, fps), 0, {}
+                            frames, pacer = play(
+                                demo_frames(items, store, renderer, fps, cache=cache, library=library,
+                                            counters=counters), fps)
+                        else:
+                            frames, pacer = play(
+                                playlist_frames(items, store, renderer, cache=cache, library=library), fps)
+                        playing, waiting = False, None
+                    elif command[0] == 'composite':
+                        _, key, sources, blend, mode, fps = command
+                        reported, loads, demo = None, loads + 1, None
+                        frames, pacer = play(
+                            composite_frames(sources, blend, mode, store, cache=cache, library=library, key=key), fps)
+                        playing, waiting = False, None
+                    elif command[0] == 'play':
+                        playing, waiting = frames is not None, None
+                        if playing:
+                            pacer.start()
+                    elif command[0] == 'pause':
+                        playing = False
+                    elif command[0] == 'skip':
+                        if demo is not None and frames is not None:
+                            # Restart the DEMO at the next item; what was rendered ahead is in the cache
+                            items, renderer, fps = demo
+                            frames, _ = play(demo_frames(items, store, renderer, fps, cache=cache, library=library,
+                                                         start=position + 1, counters=counters), fps)
+                            waiting = None
+                            if playing:
+                                pacer.start()
+                    elif command[0] == 'stop':
+                        if frames is not None:
+                            frames.close(wait=False)
+                        frames, playing, demo = None, False, None
+                    elif command[0] == 'status':
+                        control.send(('status', {**(pacer.stats() if pacer is not None else {}), 'playing': playing,
+                                                 'index': position, 'failures': counters.get('failures', 0)}))
+                    elif command[0] == 'quit':
+                        return
+                    elif command[0] == 'trace':
+                        instrumentation.enable(command[1])
+                    elif command[0] == 'metrics':
+                        control.send(('metrics', instrumentation.summary()))
+                    elif command[0] == 'dump':
+                        control.send(('trace', instrumentation.trace_events('render process')))
+            except (EOFError, BrokenPipeError):
+                return  # The GUI is gone
+            except Exception as e:
+                # A failing cube link, a corrupt cache file...: drop the playlist, report it and keep serving
+                message = f"{type(e).__name__}: {e}"
+                if frames is not None:
+                    frames.close(wait=False)
+                    pacer.finish()
+                    control.send(('finished', {**driver.stats(), **pacer.stats(), 'playlist': loads, 'error': message}))
+                elif message != reported:
+                    control.send(('error', message))
+                reported = message
+                frames, playing, waiting, demo = None, False, None, None
+    finally:
+        if frames is not None:
+            frames.close(wait=False)
+        driver.close()
+        inputs.close()
+        outputs.close()
+
+
+class RenderClient:
+    """GUI side of the render process: posts frames, sends commands and previews the cube.
+
+    It exposes send_frame/flush/stats like a CubeDriver, so screens can use it as their output.
+    `max_rate` (bytes per second) overrides the output's own limit, see open_driver; 0 is unlimited.
+    """
+
+    def __init__(self, shape, output_spec=None, store_root='events', max_rate=None):
+        self.shape = tuple(shape)
+        self.output_spec = output_spec
+        self.max_rate = max_rate
+        self.store_root = store_root
+        self.inputs = FrameRing(self.shape)  # GUI -> render process
+        self.outputs = FrameRing(self.shape)  # Render process -> GUI
+        self._lock = threading.Lock()  # The Kivy thread and the DEMO/GAME threads all post through here
+        self._started = 0.0
+        self.posted = 0
+        self.restarts = 0
+        self.messages = []  # ('finished', stats) and ('error', message) replies not yet read
+        self.metrics = None  # Latest instrumentation summary of the render process
+        self.trace = None  # Trace events of the render process, after request_trace()
+        self.status = None  # Latest playback status (pacer stats, DEMO position), after request_status()
+        self._start()
+
+    def _start(self):
+        self._control, child = multiprocessing.Pipe()
+        wake, self._wake = multiprocessing.Pipe(duplex=False)  # Wakes the render process when a frame is posted
+        self._process = multiprocessing.Process(
+            target=render_main,
+            args=(self.inputs.name, self.outputs.name, self.shape, child, wake, self.output_spec, self.store_root,
+                  self.max_rate),
+            daemon=True)
+        self._process.start()
+        self._loads = 0  # Playlists loaded into this render process, to tell current replies from stale ones
+        child.close()  # Only the render process holds these ends, so its death shows up here as a broken pipe
+        wake.close()
+        self._started = time.perf_counter()
+        if instrumentation.enabled:
+            self._control.send(('trace', True))
+
+    def _restart(self, reason):
+        """Replace a dead render process; at most once per RESTART_INTERVAL so a crash at start-up can't spin."""
+        if time.perf_counter() - self._started < RESTART_INTERVAL:
+            return False
+        self._drain()  # Whatever it reported before dying
+        self.messages.append(('error', f"render process stopped ({reason}); restarted"))
+        if self._process.is_alive():
+            self._process.terminate()  # Alive but unreachable
+        self._process.join(timeout=1.0)
+        self.restarts += 1
+        self._start()
+        return True
+
+    def _send(self, command):
+        """Send a command, restarting the render process if it has died; False if it could not be delivered."""
+        with self._lock:
+            if not self._process.is_alive() and not self._restart(f"exit code {self._process.exitcode}"):
+                return False
+            for attempt in range(2):
+                try:
+                    self._control.send(command)
+                    return True
+                except (BrokenPipeError, OSError) as e:
+                    if attempt or not self._restart(type(e).__name__):
+                        return False
+
+    def send_frame(self, frame):
+        """Post a frame for the cube; copied once into shared memory, never pickled."""
+        with self._lock:
+            self.inputs.write(frame)  # The ring outlives render processes, so the frame is not lost on a restart
+            if not self._process.is_alive() and not self._restart(f"exit code {self._process.exitcode}"):
+                return False
+            try:
+                self._wake.send_bytes(b'')  # Only a wake-up: the render process reads the newest frame from the ring
+            except (BrokenPipeError, OSError) as e:
+                if not self._restart(type(e).__name__):
+                    return False
+            self.posted += 1
+            return True
+
+    def flush(self):
+        pass  # The render process flushes its own driver
+
+    def stats(self):
+        return {'frames': self.posted, 'shown_sequence': self.outputs.sequence}
+
+    def load(self, items, mode, renderer, fps=30.0):
+        """Load a playlist of (flavour, energy, event id) items, or of DEMO PlaylistItems with mode 'Demo'."""
+        self._loads += 1
+        return self._send(('load', list(items), mode, renderer, fps))
+
+    def load_composite(self, key, sources, blend, mode, fps=30.0):
+        """Load a composite of (item, renderer, colour, weight) sources; blended and cached under `key` here.
+
+        Only the sources travel over the pipe, never frames: the render process reads the events'
+        sequences from the library and the cache, see frame_pipeline.composite_frames.
+        """
+        self._loads += 1
+        return self._send(('composite', key, list(sources), blend, mode, fps))
+
+    def play(self):
+        return self._send(('play',))
+
+    def pause(self):
+        return self._send(('pause',))
+
+    def skip(self):
+        """Move a DEMO playlist on to its next item."""
+        return self._send(('skip',))
+
+    def stop(self):
+        return self._send(('stop',))
+
+    def request_status(self):
+        """Ask for the playback status; it lands in `status` with a later receive()."""
+        return self._send(('status',))
+
+    def set_tracing(self, on):
+        return self._send(('trace', on))
+
+    def request_metrics(self):
+        """Ask for a fresh instrumentation summary; it lands in `metrics` with a later receive()."""
+        return self._send(('metrics',))
+
+    def request_trace(self):
+        """Ask for the render process's trace events; they land in `trace` with a later receive()."""
+        self.trace = None
+        return self._send(('dump',))
+
+    def _drain(self):
+        """Read replies without blocking; False once the pipe is closed."""
+        try:
+            while self._control.poll():
+                message = self._control.recv()
+                if message[0] == 'metrics':
+                    self.metrics = message[1]
+                elif message[0] == 'trace':
+                    self.trace = message[1]
+                elif message[0] == 'status':
+                    self.status = message[1]
+                else:
+                    self.messages.append(message)
+        except (EOFError, OSError):
+            return False
+        return True
+
+    def receive(self):
+        """Read replies without blocking, keeping playback messages for poll()."""
+        if not self._drain():
+            # Died: report it now rather than on the next command, so a playback wait ends
+            with self._lock:
+                if not self._process.is_alive():
+                    self._restart(f"exit code {self._process.exitcode}")
+
+    def poll(self):
+        """Collect playback replies from the render process without blocking."""
+        self.receive()
+        messages, self.messages = self.messages, []
+        # A playlist replaced before it finished may still report finishing: not the current one's news
+        return [message for message in messages
+                if message[0] != 'finished' or message[1].get('playlist', self._loads) == self._loads]
+
+    def close(self):
+        if self._process.is_alive():
+            try:
+                self._control.send(('quit',))
+            except (BrokenPipeError, OSError):
+                pass
+            self._process.join(timeout=2.0)
+        self.inputs.close()
+        self.outputs.close()
+
+
+_shared_client = None  # Render process shared by every screen
+
+
+def get_render_client(shape=(8, 8, 8, 3)):
+    """The shared render process client, started on first use."""
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = RenderClient(shape)
+    return _shared_client
+
+
+def running_render_client():
+    """The shared render process client, or None if no screen has started it."""
+    return _shared_client
+
+
+def close_render_client():
+    """Stop the shared render process, if it was started."""
+    global _shared_client
+    if _shared_client is not None:
+        _shared_client.close()
+        _shared_client = None
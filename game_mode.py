@@ -0,0 +1,186 @@
+import queue
+import threading
+import time
+import numpy as np
+
+TICK_RATE = 60  # Simulation steps per second, independent of the frame rate
+FRAME_RATE = 60  # Frames emitted to the cube per second
+LATENCY_SAMPLES = 1024  # Input-to-frame latencies kept for the percentiles
+
+# Kivy key codes and characters mapped to cursor moves along (x, y, z)
+KEY_MOVES = {
+    276: (-1, 0, 0), 275: (1, 0, 0),  # Left, right
+    274: (0, -1, 0), 273: (0, 1, 0),  # Down, up
+    281: (0, 0, -1), 280: (0, 0, 1),  # Page down, page up
+    'a': (-1, 0, 0), 'd': (1, 0, 0),
+    's': (0, -1, 0), 'w': (0, 1, 0),
+    'f': (0, 0, -1), 'r': (0, 0, 1)
+}
+
+
+class LatencyTracker:
+    """Rolling window of latencies (seconds) in a preallocated ring buffer."""
+
+    def __init__(self, size=LATENCY_SAMPLES):
+        self._samples = np.zeros(size)
+        self._count = 0
+
+    def record(self, seconds):
+        self._samples[self._count % self._samples.size] = seconds
+        self._count += 1
+
+    def __len__(self):
+        return min(self._count, self._samples.size)
+
+    def percentiles(self):
+        """(p50, p99) in milliseconds, or (None, None) before the first sample."""
+        if not self._count:
+            return None, None
+        p50, p99 = np.percentile(self._samples[:len(self)], (50, 99))
+        return p50 * 1000.0, p99 * 1000.0
+
+
+class CatchGame:
+    """Steer a cursor voxel through the cube to catch a blinking neutrino."""
+
+    def __init__(self, size=8, seed=None):
+        self.size = size
+        self.cursor = [size // 2] * 3
+        self.target = [0, 0, 0]
+        self.score = 0
+        self.elapsed = 0.0
+        self._random = np.random.default_rng(seed)
+        self._respawn()
+
+    def _respawn(self):
+        while True:
+            self.target = [int(v) for v in self._random.integers(0, self.size, 3)]
+            if self.target != self.cursor:
+                return
+
+    def apply(self, move):
+        """Move the cursor by one voxel per axis, staying inside the cube."""
+        for axis in range(3):
+            self.cursor[axis] = min(self.size - 1, max(0, self.cursor[axis] + move[axis]))
+
+    def step(self, dt):
+        """Advance the simulation by one fixed timestep."""
+        self.elapsed += dt
+        if self.cursor == self.target:
+            self.score += 1
+            self._respawn()
+
+    def draw(self, frame):
+        """Draw into a preallocated (N, N, N, 3) uint8 frame, in place."""
+        frame.fill(0)
+        if int(self.elapsed * 4) % 2 == 0:  # Blink the target at 2 Hz
+            frame[self.target[0], self.target[1], self.target[2]] = (0, 120, 255)
+        frame[self.cursor[0], self.cursor[1], self.cursor[2]] = (255, 255, 255)
+
+
+class GameLoop:
+    """Fixed-timestep simulation with a decoupled, allocation-free frame path.
+
+    Inputs are timestamped when Kivy delivers them; the latency to the frame that first shows
+    them is measured when that frame has been handed to the sink (the cube output). With the render
+    process as the sink that is the write to its input ring, which wakes the process to send it on.
+    """
+
+    def __init__(self, game, sink=None, tick_rate=TICK_RATE, fps=FRAME_RATE):
+        self.game = game
+        self.sink = sink  # Called with every frame emitted; it must be done with the buffer when it returns
+        self.dt = 1.0 / tick_rate
+        self.interval = 1.0 / fps
+        self.latency = LatencyTracker()
+
+        # Double-buffered frames, allocated once and redrawn in place
+        shape = (game.size, game.size, game.size, 3)
+        self._buffers = (np.zeros(shape, dtype=np.uint8), np.zeros(shape, dtype=np.uint8))
+        self._back = 0
+        self.current_frame = self._buffers[1]
+
+        self._inputs = queue.SimpleQueue()  # (move, timestamp) pushed by the UI thread
+        self._wake = threading.Event()  # Set on input so the loop emits a frame right away
+        self._running = threading.Event()  # Cleared while paused
+        self._stopped = threading.Event()
+        self._thread = None
+        self._pending = []  # Timestamps of inputs applied but not yet shown
+        self.frames = 0
+
+    @property
+    def state(self):
+        if self._thread is None or not self._thread.is_alive():
+            return 'stopped'
+        return 'playing' if self._running.is_set() else 'paused'
+
+    def push_input(self, move, timestamp=None):
+        """Queue a cursor move; safe to call from the UI thread."""
+        self._inputs.put((move, time.perf_counter() if timestamp is None else timestamp))
+        self._wake.set()
+
+    def play(self):
+        """Start the game, or resume it when paused."""
+        if self.state == 'stopped':
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        self._running.set()
+
+    def pause(self):
+        self._running.clear()
+
+    def stop(self):
+        self._stopped.set()
+        self._running.set()  # Wake a paused loop so it can exit
+        self._wake.set()
+
+    def _drain_inputs(self):
+        while True:
+            try:
+                move, timestamp = self._inputs.get_nowait()
+            except queue.Empty:
+                return
+            self.game.apply(move)
+            self._pending.append(timestamp)
+
+    def _run(self):
+        previous = time.perf_counter()
+        accumulator = 0.0
+        next_frame = previous
+        while not self._stopped.is_set():
+            if not self._running.is_set():
+                self._running.wait()
+                previous = next_frame = time.perf_counter()  # Do not simulate the pause
+
+            now = time.perf_counter()
+            accumulator += now - previous
+            previous = now
+
+            # Inputs first, then as many fixed steps as the elapsed time calls for
+            self._wake.clear()  # Inputs arriving from here on wake the next wait
+            self._drain_inputs()
+            while accumulator >= self.dt:
+                self.game.step(self.dt)
+                accumulator -= self.dt
+
+            self._emit()
+
+            # Sleep until the next frame, waking early if an input arrives
+            next_frame = max(next_frame + self.interval, time.perf_counter())
+            self._wake.wait(max(0.0, next_frame - time.perf_counter()))
+
+    def _emit(self):
+        """Draw into the back buffer, swap, send it out and record the latency of shown inputs."""
+        frame = self._buffers[self._back]
+        self.game.draw(frame)
+        self._back ^= 1
+        self.current_frame = frame
+        if self.sink is not None:
+            self.sink(frame)
+        self.frames += 1
+
+        if self._pending:
+            emitted = time.perf_counter()
+            for timestamp in self._pending:
+                self.latency.record(emitted - timestamp)
+            self._pending.clear()
@@ -0,0 +1,179 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+TRACE_ENV = 'CUBE_TRACE'  # Set to 1 to record from startup
+HISTOGRAM_SAMPLES = 2048  # Durations kept per name for the percentiles
+TRACE_EVENTS = 200000  # Newest spans and gauge changes kept for the Chrome trace
+RATE_WINDOW = 1.0  # Seconds over which rates (e.g. frames per second) are counted
+TRACE_FILE = 'trace-{time}.json'  # Chrome trace dumps, relative to the working directory
+
+enabled = os.environ.get(TRACE_ENV, '') not in ('', '0')  # Checked first by every entry point
+
+_lock = threading.Lock()
+_histograms = {}  # Name -> RollingHistogram
+_gauges = {}  # Name -> latest value (e.g. queue depths)
+_previous = {}  # Name -> time of the previous interval() call
+_events = deque(maxlen=TRACE_EVENTS)  # (kind, name, start, duration or value, thread id)
+
+
+class RollingHistogram:
+    """Newest durations (seconds) of one kind of span, with the times they ended."""
+
+    def __init__(self, size=HISTOGRAM_SAMPLES):
+        self._samples = [0.0] * size  # Plain lists: this module stays cheap to import at startup
+        self._ends = [0.0] * size
+        self._count = 0
+
+    def record(self, seconds, end):
+        slot = self._count % len(self._samples)
+        self._samples[slot] = seconds
+        self._ends[slot] = end
+        self._count += 1
+
+    def __len__(self):
+        return min(self._count, len(self._samples))
+
+    def summary(self, now):
+        """Count, mean/p50/p99 in milliseconds and the rate per second over the last RATE_WINDOW."""
+        samples = sorted(self._samples[:len(self)])
+        recent = sum(1 for end in self._ends[:len(self)] if end > now - RATE_WINDOW)
+        return {
+            'count': self._count,
+            'mean': sum(samples) / len(samples) * 1000.0,
+            'p50': samples[len(samples) // 2] * 1000.0,
+            'p99': samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000.0,
+            'rate': recent / RATE_WINDOW
+        }
+
+
+class _Span:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.name, self.start, time.perf_counter())
+
+
+class _NullSpan:
+    """What span() returns while disabled: entering and leaving it does nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def enable(on=True):
+    global enabled
+    enabled = on
+
+
+def reset():
+    """Forget every sample, gauge and trace event."""
+    with _lock:
+        _histograms.clear()
+        _gauges.clear()
+        _previous.clear()
+        _events.clear()
+
+
+def span(name):
+    """Context manager timing a block as `name`, e.g. `with span('render'): ...`."""
+    return _Span(name) if enabled else _NULL_SPAN
+
+
+def traced(name):
+    """Decorator timing every call of a function as `name` (e.g. UI callbacks)."""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            with _Span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record(name, start, end):
+    """Record a span that ran from `start` to `end` (time.perf_counter() values)."""
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = RollingHistogram()
+        histogram.record(end - start, end)
+        _events.append(('X', name, start, end - start, threading.get_ident()))
+
+
+def interval(name):
+    """Record the time since the previous interval(name) call, e.g. frame-to-frame time."""
+    if not enabled:
+        return
+    now = time.perf_counter()
+    previous = _previous.get(name)
+    _previous[name] = now
+    if previous is not None and now - previous < 1.0:  # A pause is not a slow frame
+        with _lock:
+            histogram = _histograms.get(name)
+            if histogram is None:
+                histogram = _histograms[name] = RollingHistogram()
+            histogram.record(now - previous, now)
+
+
+def gauge(name, value):
+    """Set a level such as a queue depth; changes are also kept as trace counter events."""
+    if not enabled or _gauges.get(name) == value:
+        return
+    _gauges[name] = value
+    _events.append(('C', name, time.perf_counter(), value, 0))
+
+
+def summary():
+    """{'spans': {name: histogram summary}, 'gauges': {name: value}} for overlays and reports."""
+    now = time.perf_counter()
+    with _lock:
+        spans = {name: histogram.summary(now) for name, histogram in _histograms.items() if len(histogram)}
+        return {'spans': spans, 'gauges': dict(_gauges)}
+
+
+def trace_events(process_name=None):
+    """Recorded spans and gauges as Chrome trace events (timestamps in microseconds)."""
+    pid = os.getpid()
+    with _lock:
+        recorded = list(_events)
+    events = []
+    if process_name is not None:
+        events.append({'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': process_name}})
+    for kind, name, start, value, thread in recorded:
+        if kind == 'X':
+            events.append({'name': name, 'cat': name.partition('.')[0], 'ph': 'X', 'pid': pid, 'tid': thread,
+                           'ts': start * 1e6, 'dur': value * 1e6})
+        else:
+            events.append({'name': name, 'ph': 'C', 'pid': pid, 'ts': start * 1e6, 'args': {name: value}})
+    return events
+
+
+def dump_trace(path=None, extra_events=(), process_name='GUI'):
+    """Write this process's events (plus e.g. another process's) as a Chrome trace JSON file.
+
+    time.perf_counter() is the system's monotonic clock, so events of several processes line up.
+    Open the file in chrome://tracing or https://ui.perfetto.dev.
+    """
+    path = path or TRACE_FILE.format(time=time.strftime('%Y%m%d-%H%M%S'))
+    with open(path, 'w') as file:
+        json.dump({'traceEvents': trace_events(process_name) + list(extra_events), 'displayTimeUnit': 'ms'}, file)
+    return path
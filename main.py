@@ -1,21 +1,72 @@
+import sys
+from startup import timer  # Imported first so the startup timer covers everything below
+
 from kivy.app import App
 from kivy.uix.screenmanager import ScreenManager
-from first_screen import FirstScreen  # Import the FirstScreen class
-from events_screen import EventsScreen  # Import the EventsScreen class
 from kivy.core.window import Window  # Import Window to set the title
+from kivy.clock import Clock
+timer.mark('kivy imports')
+
+from first_screen import FirstScreen  # Import the FirstScreen class
+from metrics_overlay import MetricsOverlay
+timer.mark('app imports')
+
+
+def make_events_screen(name):
+    # Imported here: the events screen brings in NumPy, the renderer and the worker pool
+    from events_screen import EventsScreen
+    return EventsScreen(name=name)
+
+
+class LazyScreenManager(ScreenManager):
+    """ScreenManager that builds a screen the first time it is navigated to."""
+
+    def __init__(self, **kwargs):
+        super(LazyScreenManager, self).__init__(**kwargs)
+        self.factories = {}  # Screen name -> factory(name) for screens not built yet
+
+    def add_factory(self, name, factory):
+        self.factories[name] = factory
+
+    def get_screen(self, name):
+        factory = self.factories.pop(name, None)
+        if factory is not None:
+            self.add_widget(timer.measure(f"screen '{name}'", factory, name))
+        return super(LazyScreenManager, self).get_screen(name)
+
+    def has_screen(self, name):
+        return name in self.factories or super(LazyScreenManager, self).has_screen(name)
+
 
 class MyApp(App):
     def build(self):
-        # ScreenManager to manage multiple windows
-        sm = ScreenManager()
+        # ScreenManager to manage multiple windows; only the first screen is built at startup
+        sm = LazyScreenManager()
         sm.add_widget(FirstScreen(name='first'))  # Add the first screen
-        sm.add_widget(EventsScreen(name='events'))  # Add the events screen
+        sm.add_factory('events', make_events_screen)  # Built on the first visit
+        timer.mark('build')
         return sm
 
     def on_start(self):
         # Set the window title
         Window.set_title('DUNE :: LEDCube')  # Set your custom title here
 
+        # F9 toggles the metrics overlay, F10 dumps a Chrome trace
+        self.overlay = MetricsOverlay()
+        Window.bind(on_key_down=self.overlay.on_key)
+        timer.mark('window')
+        Clock.schedule_once(self.startup_done)  # Runs once the first frame has been drawn
+
+    def startup_done(self, dt):
+        timer.mark('first frame')
+        print(timer.report())
+
+    def on_stop(self):
+        # Stop the render process, if a screen started it, and release its shared memory
+        frame_ring = sys.modules.get('frame_ring')
+        if frame_ring is not None:
+            frame_ring.close_render_client()
+
 
 if __name__ == '__main__':
     MyApp().run()  # Run the Kivy application
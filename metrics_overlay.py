@@ -0,0 +1,121 @@
+import sys
+from kivy.uix.label import Label
+from kivy.core.window import Window
+from kivy.clock import Clock
+from kivy.graphics import Color, Rectangle
+import instrumentation
+
+OVERLAY_KEY = 290  # F9 shows/hides the overlay (and records while it is shown)
+DUMP_KEY = 291  # F10 writes a Chrome trace of the GUI and render processes
+UPDATE_INTERVAL = 0.5  # Seconds between overlay refreshes
+TRACE_TIMEOUT = 2.0  # Seconds to wait for the render process's trace events
+
+
+def running_render_client():
+    """The render process client if a screen started one (frame_ring is only imported by then)."""
+    frame_ring = sys.modules.get('frame_ring')
+    return frame_ring.running_render_client() if frame_ring is not None else None
+
+
+class MetricsOverlay(Label):
+    """Window-wide readout of frame rate, frame-time p99, queue depths and span percentiles."""
+
+    def __init__(self, **kwargs):
+        super(MetricsOverlay, self).__init__(
+            font_size='12sp', halign='left', valign='top', size_hint=(None, None), **kwargs)
+        self.bind(texture_size=self._fit)
+        with self.canvas.before:
+            Color(0, 0, 0, 0.6)  # Dark backdrop so the text reads over any screen
+            self._backdrop = Rectangle(pos=self.pos, size=self.size)
+        self.bind(pos=self._redraw, size=self._redraw)
+        self.shown = False
+        self._update_event = None
+        self._recording_before = instrumentation.enabled  # CUBE_TRACE keeps recording when hidden
+
+    def _fit(self, *args):
+        self.size = (self.texture_size[0] + 16, self.texture_size[1] + 12)
+        self.pos = (8, Window.height - self.height - 8)  # Top left corner
+
+    def _redraw(self, *args):
+        self._backdrop.pos = self.pos
+        self._backdrop.size = self.size
+
+    def on_key(self, window, key, scancode, codepoint, modifiers):
+        if key == OVERLAY_KEY:
+            self.toggle()
+            return True
+        if key == DUMP_KEY:
+            self.dump()
+            return True
+        return False
+
+    def toggle(self):
+        if self.shown:
+            self.hide()
+        else:
+            self.show()
+
+    def show(self):
+        self._set_recording(True)
+        Window.add_widget(self)
+        self.shown = True
+        self._update_event = Clock.schedule_interval(self.update, UPDATE_INTERVAL)
+        self.update()
+
+    def hide(self):
+        self._update_event.cancel()
+        Window.remove_widget(self)
+        self.shown = False
+        self._set_recording(self._recording_before)
+
+    def _set_recording(self, on):
+        instrumentation.enable(on)
+        client = running_render_client()
+        if client is not None:
+            client.set_tracing(on)
+
+    def update(self, *args):
+        gui = instrumentation.summary()
+        client = running_render_client()
+        render = {'spans': {}, 'gauges': {}}
+        if client is not None:
+            client.receive()  # Summary asked for on the previous update
+            render = client.metrics or render
+            client.request_metrics()
+
+        frame = render['spans'].get('frame') or gui['spans'].get('frame')
+        lines = [f"UI {Clock.get_fps():.0f} fps"]
+        if frame is not None:
+            lines.append(f"Cube {frame['rate']:.1f} fps, frame p99 {frame['p99']:.1f} ms")
+        gauges = {**gui['gauges'], **render['gauges']}
+        if gauges:
+            lines.append("Queues: " + ", ".join(f"{name.partition('.')[2] or name} {value}"
+                                                for name, value in sorted(gauges.items())))
+        for process, spans in (('gui', gui['spans']), ('render', render['spans'])):
+            for name, stats in sorted(spans.items()):
+                if name != 'frame':
+                    lines.append(f"{process} {name}: p50 {stats['p50']:.2f} ms, p99 {stats['p99']:.2f} ms, "
+                                 f"{stats['rate']:.0f}/s")
+        self.text = "\n".join(lines)
+
+    def dump(self):
+        """Write a Chrome trace, merging in the render process's events once they arrive."""
+        client = running_render_client()
+        if client is None:
+            self._write_trace([])
+            return
+        client.request_trace()
+        waited = [0.0]
+
+        def collect(dt):
+            client.receive()
+            waited[0] += dt
+            if client.trace is None and waited[0] < TRACE_TIMEOUT:
+                return  # Keep waiting
+            self._write_trace(client.trace or [])
+            return False
+        Clock.schedule_interval(collect, 0.05)
+
+    def _write_trace(self, render_events):
+        path = instrumentation.dump_trace(extra_events=render_events)
+        print(f"Wrote trace to {path}")
@@ -0,0 +1,233 @@
+import argparse
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import zlib
+import numpy as np
+from cube_output import DEFAULT_KEYFRAME_INTERVAL, DELTA, HEADER, MAGIC, decode_packet, encode_delta, encode_keyframe
+from frame_cache import frame_key
+from frame_pipeline import DEFAULT_FRAMES_PER_EVENT
+from instrumentation import span
+from submission_worker import cache_mode, render_chunk
+
+SEQUENCE_DIR = 'prerendered'  # Default library location, relative to the working directory
+SUFFIX = '.cubeseq'
+FILE_MAGIC = b'CSEQ'
+VERSION = 1
+# File: header, JSON metadata, frame records, then the frame index at `index offset`
+FILE_HEADER = struct.Struct('<4sHHIIQ')  # magic, version, reserved, metadata length, frames, index offset
+# Frame record: flags, stored length, then one cube packet (as sent to a controller), zlib'd if COMPRESSED
+RECORD = struct.Struct('<BI')
+COMPRESSED = 1
+# Index entry per frame: offset of its record and number of the keyframe it is decoded from
+INDEX = np.dtype([('offset', '<u8'), ('keyframe', '<u4')])
+
+
+def write_sequence(path, frames, metadata, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL, level=6):
+    """Write (frames, N, N, N, 3) uint8 frames as keyframes plus voxel deltas; returns the file size.
+
+    Frames are encoded like the cube packets (RLE keyframes, runs of changed voxels) and each record
+    is zlib-compressed when that makes it smaller.
+    """
+    metadata = json.dumps(dict(metadata, frames=len(frames)), sort_keys=True).encode('utf-8')
+    index = np.zeros(len(frames), dtype=INDEX)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"  # Unique across processes and threads
+    with open(temporary, 'wb') as file:
+        file.write(FILE_HEADER.pack(FILE_MAGIC, VERSION, 0, len(metadata), len(frames), 0))
+        file.write(metadata)
+        previous, keyframe = None, 0
+        for number, frame in enumerate(frames):
+            frame = np.ascontiguousarray(frame, dtype=np.uint8)
+            if previous is None or number - keyframe >= keyframe_interval:
+                kind, payload = encode_keyframe(frame)
+                keyframe = number
+            else:
+                kind, payload = DELTA, encode_delta(previous, frame) or b''  # Empty delta: frame unchanged
+            packet = HEADER.pack(MAGIC, kind, frame.shape[1], number & 0xFFFF, len(payload)) + payload
+            packed = zlib.compress(packet, level)
+            flags = COMPRESSED if len(packed) < len(packet) else 0
+            index[number] = (file.tell(), keyframe)
+            file.write(RECORD.pack(flags, len(packed) if flags else len(packet)))
+            file.write(packed if flags else packet)
+            previous = frame
+
+        index_offset = file.tell()
+        file.write(index.tobytes())
+        file.seek(0)
+        file.write(FILE_HEADER.pack(FILE_MAGIC, VERSION, 0, len(metadata), len(frames), index_offset))
+        size = index_offset + index.nbytes
+    os.replace(temporary, path)  # Readers never see a half-written file
+    return size
+
+
+class SequenceFile:
+    """Memory-mapped pre-rendered sequence: frames are decoded from packets, never rendered.
+
+    Behaves as a sequence of frames. Reading in order applies one delta per frame; any other
+    frame is reached through the index from its keyframe.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, metadata_length, count, index_offset = FILE_HEADER.unpack_from(self._map)
+        if magic != FILE_MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError(f"{path} is not a version {VERSION} sequence file")
+        self.metadata = json.loads(self._map[FILE_HEADER.size:FILE_HEADER.size + metadata_length])
+        self.index = np.frombuffer(self._map, dtype=INDEX, count=count, offset=index_offset)
+        self._frame = None  # Decoded frame at position self._position
+        self._position = -1
+        self._lock = threading.Lock()  # DEMO prefetch threads and the player may share a file
+
+    def __len__(self):
+        return len(self.index)
+
+    def _packet(self, number):
+        offset = int(self.index[number]['offset'])
+        flags, length = RECORD.unpack_from(self._map, offset)
+        data = self._map[offset + RECORD.size:offset + RECORD.size + length]
+        return zlib.decompress(data) if flags & COMPRESSED else data
+
+    def _seek(self, number):
+        """Decode frame `number` into self._frame, from the current position when it is behind it."""
+        if not 0 <= number < len(self):
+            raise IndexError(f"frame {number} out of range")
+        start = int(self.index[number]['keyframe'])
+        if not start <= self._position <= number:
+            self._position = start - 1  # Jump back or ahead: start over from the keyframe
+        while self._position < number:
+            self._position += 1
+            self._frame = decode_packet(self._packet(self._position), self._frame)
+        return self._frame
+
+    def __getitem__(self, number):
+        if number < 0:
+            number += len(self)
+        with self._lock:
+            return self._seek(number).copy()
+
+    def frames(self, start=0):
+        """Yield every frame from `start` on; each yielded array is reused for the next frame."""
+        frame = None
+        for number in range(start, len(self)):
+            if frame is None and number:
+                with self._lock:
+                    frame = self._seek(number).copy()
+            else:
+                frame = decode_packet(self._packet(number), frame)
+            yield frame
+
+    def read(self):
+        """All frames as one (frames, N, N, N, 3) array."""
+        with span('load.sequence'):
+            return np.stack([frame.copy() for frame in self.frames()])
+
+    def close(self):
+        self.index = None  # The view must go before the mapping can close
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SequenceLibrary:
+    """Directory of pre-rendered sequences, looked up before anything is rendered.
+
+    A file is only used when it was rendered for the same event, mode, cube and colours as the
+    renderer asking for it, so a palette or geometry change falls back to rendering.
+    """
+
+    def __init__(self, root=SEQUENCE_DIR):
+        self.root = root
+
+    def path(self, flavour, energy, event_id, mode):
+        """e.g. prerendered/numu_100_1_Dynamic.cubeseq"""
+        name = '_'.join(re.sub(r'[^\w.-]', '', str(part)) for part in (flavour, energy, event_id, mode))
+        return os.path.join(self.root, name + SUFFIX)
+
+    def find(self, flavour, energy, event_id, mode, renderer, n_frames=DEFAULT_FRAMES_PER_EVENT):
+        """Open SequenceFile for the event, or None when there is no matching pre-rendered file."""
+        path = self.path(flavour, energy, event_id, mode)
+        if not os.path.exists(path):
+            return None
+        try:
+            sequence = SequenceFile(path)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring pre-rendered {path}: {e}")
+            return None
+        if sequence.metadata.get('key') != repr(frame_key(flavour, energy, event_id, cache_mode(mode, n_frames),
+                                                          renderer)):
+            sequence.close()
+            return None  # Rendered for another cube, palette or frame count
+        return sequence
+
+    def prerender(self, source, renderer, flavour, energy, event_id, mode, n_frames=DEFAULT_FRAMES_PER_EVENT):
+        """Render one event and write it to the library; returns the file path."""
+        item, frames, error = render_chunk(source, renderer, mode, [(flavour, energy, event_id)], n_frames)[0]
+        if error is not None:
+            raise ValueError(error)
+        geometry = renderer.geometry
+        metadata = {
+            'flavour': flavour,
+            'energy': energy,
+            'event_id': event_id,
+            'mode': mode,
+            'geometry': {
+                'size': geometry.size,
+                'bounds': None if geometry.bounds is None else geometry.bounds.tolist(),
+                'axes': list(geometry.axes),
+                'flip': list(geometry.flip)
+            },
+            'key': repr(frame_key(*item, cache_mode(mode, n_frames), renderer))
+        }
+        path = self.path(flavour, energy, event_id, mode)
+        write_sequence(path, frames, metadata)
+        return path
+
+
+if __name__ == '__main__':
+    from event_catalog import SELECT_FILE, EventCatalog
+    from event_store import EVENTS_DIR, EventStore
+    from voxel_renderer import CubeGeometry, VoxelRenderer
+    from colour_map import BY_FLAVOUR, default_colour_map
+    from demo_playback import PLAYLIST_FILE, load_playlist
+
+    parser = argparse.ArgumentParser(description='Pre-render events for instant replay (default: the DEMO playlist).')
+    parser.add_argument('-e', '--event', nargs=3, action='append', default=[], metavar=('FLAVOUR', 'ENERGY', 'EVENT'),
+                        help='an event to pre-render instead of the playlist (repeatable)')
+    parser.add_argument('--mode', choices=('Static', 'Dynamic'), default='Dynamic', help='mode of --event events')
+    parser.add_argument('--playlist', default=PLAYLIST_FILE, help='DEMO playlist')
+    parser.add_argument('--size', type=int, default=8, help='LEDs per cube edge')
+    parser.add_argument('--root', default=SEQUENCE_DIR, help='library directory')
+    parser.add_argument('--catalog', default=SELECT_FILE, help='selection catalog')
+    parser.add_argument('--events', default=EVENTS_DIR, help='event store directory')
+    args = parser.parse_args()
+
+    catalog = EventCatalog(args.catalog)
+    # The same renderer the GUI uses, so its lookups match these files
+    renderer = VoxelRenderer(CubeGeometry(args.size), colour_map=default_colour_map(catalog), palette=BY_FLAVOUR)
+    if args.event:
+        items = [(catalog.flavour_name(flavour), energy, int(event_id), args.mode)
+                 for flavour, energy, event_id in args.event]
+    else:
+        items = [(item.flavour, item.energy, item.event_id, item.mode)
+                 for item in load_playlist(catalog, args.playlist)]
+
+    library = SequenceLibrary(args.root)
+    store = EventStore(args.events)
+    for flavour, energy, event_id, mode in items:
+        try:
+            path = library.prerender(store, renderer, flavour, energy, event_id, mode)
+        except ValueError as e:
+            print(f"Skipping {flavour} {energy} event {event_id}: {e}")
+            continue
+        print(f"Wrote {path} ({os.path.getsize(path)} bytes)")
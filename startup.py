@@ -0,0 +1,56 @@
+import struct
+import time
+from functools import lru_cache
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_HEADER = struct.Struct('>8sI4sII')  # Signature, IHDR length, b'IHDR', width, height
+
+
+class StartupTimer:
+    """Wall-clock time of each startup phase, from the moment this module was imported."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.phases = []  # (phase, seconds) in the order they ended
+
+    def mark(self, phase):
+        """End the current phase under the name `phase` and start the next one."""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def measure(self, phase, function, *args, **kwargs):
+        """Time one call on its own (e.g. a lazily built screen), outside the phase sequence."""
+        started = time.perf_counter()
+        result = function(*args, **kwargs)
+        self.phases.append((phase, time.perf_counter() - started))
+        return result
+
+    @property
+    def total(self):
+        """Time from import to the end of the last marked phase (boot-to-usable)."""
+        return self._last - self.started
+
+    def report(self):
+        lines = [f"{phase:<24}{seconds * 1000.0:8.1f} ms" for phase, seconds in self.phases]
+        lines.append(f"{'total':<24}{self.total * 1000.0:8.1f} ms")
+        return "Startup:\n" + "\n".join("  " + line for line in lines)
+
+
+timer = StartupTimer()  # Started by the first import, which main.py does before anything else
+
+
+@lru_cache(maxsize=None)
+def image_size(path):
+    """(width, height) of an image without decoding it: read from the PNG header, Pillow otherwise."""
+    with open(path, 'rb') as file:
+        header = file.read(PNG_HEADER.size)
+    if len(header) == PNG_HEADER.size:
+        signature, _, chunk, width, height = PNG_HEADER.unpack(header)
+        if signature == PNG_SIGNATURE and chunk == b'IHDR':
+            return width, height
+
+    from PIL import Image  # Only other image formats pay for Pillow
+    with Image.open(path) as image:
+        return image.size
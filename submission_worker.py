@@ -0,0 +1,212 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, CancelledError
+import numpy as np
+from frame_cache import frame_key
+from frame_pipeline import DEFAULT_FRAMES_PER_EVENT, cache_mode, event_frames
+from instrumentation import gauge
+
+CHUNK_EVENTS = 8  # Events per pool task: small enough to cancel quickly, large enough to amortize overhead
+LOAD_ERRORS = (KeyError, IndexError, OSError, ValueError)  # Per-event failures reported on the row
+
+
+def render_chunk(source, renderer, mode, items, n_frames=DEFAULT_FRAMES_PER_EVENT):
+    """Load and render a chunk of (flavour, energy, event id) items; runs inside a pool worker.
+
+    Returns (item, frames, error) tuples: frames has shape (frames, N, N, N, 3), or is None with
+    `error` describing why the event could not be rendered.
+    """
+    results = []
+    for flavour, energy, event_id in items:
+        try:
+            hits = source(flavour, energy, event_id)
+            flavour_renderer = renderer.for_flavour(flavour)
+            if mode == 'Static':
+                frames = flavour_renderer.render(hits)[None]
+            else:
+                frames = np.stack(list(event_frames(hits, flavour_renderer, n_frames)))
+        except LOAD_ERRORS as e:
+            results.append(((flavour, energy, event_id), None, str(e)))
+            continue
+        results.append(((flavour, energy, event_id), frames, None))
+    return results
+
+
+class SubmissionJob:
+    """One submit: every row's events rendered on the pool, with progress, errors and cancellation.
+
+    Callbacks are invoked through `dispatch`, e.g. to hop back onto the Kivy event loop:
+    on_progress(job), on_row_done(job, row_index), on_finished(job).
+    """
+
+    def __init__(self, pool, rows, mode, source, renderer, cache=None, library=None, dispatch=None,
+                 on_progress=None, on_row_done=None, on_finished=None):
+        self.pool = pool
+        self.rows = rows  # List of lists of (flavour, energy, event id) items, one list per row
+        self.mode = mode
+        self.source = source
+        self.renderer = renderer
+        self.cache = cache
+        self.library = library  # SequenceLibrary of pre-rendered events, used before the cache
+        self._dispatch = dispatch or (lambda callback: callback())
+        self._on_progress = on_progress
+        self._on_row_done = on_row_done
+        self._on_finished = on_finished
+
+        self.total = sum(len(items) for items in rows)  # Events to render
+        self.completed = 0  # Events rendered, served from the cache or failed
+        self.frames = [[] for _ in rows]  # Per row: (item, frames) in completion order (Static only)
+        self.errors = [[] for _ in rows]  # Per row: (item, message)
+        self.cancelled = False
+        self.finished = False
+
+        self._lock = threading.Lock()
+        self._futures = []
+        self._pending = [0] * len(rows)  # Chunks still outstanding per row
+        self._thread = threading.Thread(target=self._dispatch_chunks, daemon=True)
+
+    @property
+    def progress(self):
+        return self.completed / self.total if self.total else 1.0
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        """Cancel queued chunks; chunks already running finish but their results are discarded."""
+        self.cancelled = True
+        with self._lock:
+            futures = list(self._futures)
+        for future in futures:
+            future.cancel()
+
+    def _key(self, item):
+        return frame_key(*item, cache_mode(self.mode), self.renderer)
+
+    def _dispatch_chunks(self):
+        """Serve pre-rendered and cached events directly and queue the rest on the pool, chunk by chunk."""
+        chunks = []
+        for row_index, items in enumerate(self.rows):
+            misses = []
+            for item in items:
+                if self.cancelled:
+                    return
+                try:
+                    # A pre-rendered file is decoded lazily, frame by frame, when the frames are used
+                    frames = self.library.find(*item, self.mode, self.renderer) if self.library is not None else None
+                    if frames is None and self.cache is not None:
+                        frames = self.cache.get(self._key(item))
+                except Exception as e:
+                    # An unreadable library or cache directory: report it on the row rather than hang the job
+                    self._record(row_index, item, None, f"cache: {type(e).__name__}: {e}")
+                    continue
+                if frames is None:
+                    misses.append(item)
+                else:
+                    self._record(row_index, item, frames, None)
+            for start in range(0, len(misses), CHUNK_EVENTS):
+                chunks.append((row_index, misses[start:start + CHUNK_EVENTS]))
+            self._pending[row_index] = len(range(0, len(misses), CHUNK_EVENTS))
+
+        # Rows without misses are already complete
+        for row_index, pending in enumerate(self._pending):
+            if not pending:
+                self._row_done(row_index)
+        self._report_progress()
+
+        for row_index, items in chunks:
+            if self.cancelled:
+                return
+            try:
+                future = self.pool.executor.submit(render_chunk, self.source, self.renderer, self.mode, items)
+            except Exception as e:
+                # E.g. a pool shut down under us: the chunk still has to be accounted for
+                self._finish_chunk(row_index, [(item, None, f"{type(e).__name__}: {e}") for item in items])
+                continue
+            future.add_done_callback(
+                lambda f, row_index=row_index, items=items: self._chunk_done(row_index, items, f))
+            with self._lock:
+                self._futures.append(future)
+
+    def _chunk_done(self, row_index, items, future):
+        """Runs on a pool management thread: store results in the cache, then notify the UI."""
+        if self.cancelled:
+            return
+        try:
+            results = future.result()
+        except CancelledError:
+            return
+        except Exception as e:
+            # The whole chunk failed (e.g. a crashed worker): report every event in it
+            results = [(item, None, f"{type(e).__name__}: {e}") for item in items]
+        self._finish_chunk(row_index, results)
+
+    def _finish_chunk(self, row_index, results):
+        """Cache and record a chunk's results; the row's pending count drops whatever happens."""
+        try:
+            for item, frames, error in results:
+                if frames is not None and self.cache is not None:
+                    try:
+                        frames = self.cache.put(self._key(item), frames)
+                    except Exception as e:
+                        # E.g. a full disk: the frames are still good, but playback will have to render them again
+                        error = f"not cached: {type(e).__name__}: {e}"
+                self._record(row_index, item, frames, error)
+        finally:
+            with self._lock:
+                self._pending[row_index] -= 1
+                row_finished = self._pending[row_index] == 0
+            if row_finished:
+                self._row_done(row_index)
+            self._report_progress()
+
+    def _record(self, row_index, item, frames, error):
+        with self._lock:
+            self.completed += 1
+            if error is not None:
+                self.errors[row_index].append((item, error))
+            if frames is not None and self.mode == 'Static':
+                self.frames[row_index].append((item, frames))
+
+    def _row_done(self, row_index):
+        if self._on_row_done is not None:
+            self._dispatch(lambda: self._on_row_done(self, row_index))
+
+    def _report_progress(self):
+        if self.cancelled:
+            return
+        gauge('queue.submit', self.total - self.completed)  # Events still to render
+        if self._on_progress is not None:
+            self._dispatch(lambda: self._on_progress(self))
+        with self._lock:
+            done = not self.finished and self.completed >= self.total and not any(self._pending)
+            if done:
+                self.finished = True
+        if done and self._on_finished is not None:
+            self._dispatch(lambda: self._on_finished(self))
+
+
+class SubmissionPool:
+    """Long-lived worker pool shared by all submissions; processes by default to use every core."""
+
+    def __init__(self, workers=None, processes=True):
+        self.workers = workers or os.cpu_count() or 1
+        self.processes = processes
+        self._executor = None  # Created on first use so startup stays cheap
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            executor_cls = ProcessPoolExecutor if self.processes else ThreadPoolExecutor
+            self._executor = executor_cls(max_workers=self.workers)
+        return self._executor
+
+    def submit(self, rows, mode, source, renderer, **kwargs):
+        """Start a SubmissionJob over `rows` (lists of items); see SubmissionJob for the callbacks."""
+        return SubmissionJob(self, rows, mode, source, renderer, **kwargs).start()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
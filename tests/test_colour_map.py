@@ -0,0 +1,59 @@
+import os
+import numpy as np
+from colour_map import (DEFAULT_MAX_CURRENT, LUT_SIZE, MAX_CURRENT_ENV, ColourMap, build_lut, default_colour_map,
+                        power_limit_text)
+from event_catalog import SELECT_FILE, EventCatalog
+
+CATALOG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), SELECT_FILE)
+
+
+def test_build_lut_gamma_and_stops():
+    lut = build_lut([(255, 255, 255)], gamma=2.0)
+    assert lut.shape == (LUT_SIZE, 3) and lut.dtype == np.uint8
+    assert lut[0].tolist() == [0, 0, 0] and lut[-1].tolist() == [255, 255, 255]
+    assert lut[128, 0] == round(255 * (128 / 255) ** 2)  # Brightness follows the gamma curve
+    assert np.all(np.diff(lut[:, 0].astype(int)) >= 0)
+
+    # Colour runs through the stops from the faintest to the strongest level
+    lut = build_lut([(255, 0, 0), (0, 0, 255)], gamma=1.0)
+    assert lut[-1].tolist() == [0, 0, 255]
+    assert lut[LUT_SIZE // 2, 0] > 0 and lut[LUT_SIZE // 2, 2] > 0
+
+
+def test_apply_looks_up_the_palette():
+    colour_map = ColourMap(gamma=1.0)
+    rgb = colour_map.apply(np.array([[0.0, 0.5, 1.0]]), 'heat')
+    assert rgb.shape == (1, 3, 3)
+    assert rgb[0, 0].tolist() == [0, 0, 0] and rgb[0, 2].tolist() == [255, 0, 0]
+    # Unknown palettes fall back to white
+    assert colour_map.apply(np.array([1.0]), 'nope').tolist() == [[255, 255, 255]]
+
+
+def test_limit_dims_frames_over_budget():
+    colour_map = ColourMap(max_current=0.1, channel_current=0.02)  # Five channels fully on
+    frames = np.zeros((2, 4, 3), dtype=np.uint8)
+    frames[0, 0] = (255, 0, 0)  # One channel: within the budget
+    frames[1] = 255  # Twelve channels: dimmed
+    limited = colour_map.limit(frames)
+    assert np.array_equal(limited[0], frames[0])
+    assert limited[1].sum(dtype=np.uint64) <= colour_map.budget
+    assert limited[1].sum(dtype=np.uint64) > colour_map.budget - 12  # Rounding down loses at most 1 per channel
+    assert np.all(limited[1] == limited[1, 0, 0])  # Dimmed evenly
+
+
+def test_no_limit_without_budget():
+    frames = np.full((1, 4, 3), 255, dtype=np.uint8)
+    colour_map = ColourMap()
+    assert colour_map.budget is None and colour_map.limit(frames) is frames
+
+
+def test_default_budget(monkeypatch):
+    catalog = EventCatalog(CATALOG)
+    monkeypatch.delenv(MAX_CURRENT_ENV, raising=False)
+    assert default_colour_map(catalog).max_current == DEFAULT_MAX_CURRENT
+    monkeypatch.setenv(MAX_CURRENT_ENV, '2.5')
+    assert default_colour_map(catalog).max_current == 2.5
+    assert default_colour_map(catalog, 4).max_current == 4
+    assert default_colour_map(catalog, 0).max_current is None  # 0 turns limiting off
+    assert power_limit_text(default_colour_map(catalog, 0)) == "Power limit: off"
+    assert power_limit_text(default_colour_map(catalog, 4)) == "Power limit: 4 A"
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from compositor import ABSOLUTE, ADD, MAX, Accumulator, Layer, align_indices, composite
+
+
+def lit(frames, voxel, rgb, size=2):
+    """(frames, size, size, size, 3) sequence with one voxel lit in every frame."""
+    sequence = np.zeros((frames, size, size, size, 3), dtype=np.uint8)
+    sequence.reshape(frames, -1, 3)[:, voxel] = rgb
+    return sequence
+
+
+def test_align_indices_shared_time_axis():
+    # The second source starts halfway through the first and ends with it: output frame k shows up to
+    # t = 2.5 (k + 1), while the second source's frame j covers its event up to t = 5 + 1.25 (j + 1)
+    indices = align_indices([(0.0, 10.0), (5.0, 10.0)], 4)
+    assert indices.tolist() == [[0, 1, 2, 3], [-1, -1, 1, 3]]
+
+
+def test_align_indices_instant_event():
+    # An event without duration appears all at once at its start time
+    indices = align_indices([(0.0, 10.0), (5.0, 5.0)], 4)
+    assert indices[1].tolist() == [-1, 3, 3, 3]
+
+
+def test_add_native_layers_clips():
+    a = lit(3, 0, (200, 100, 0))
+    b = lit(3, 0, (100, 100, 50))
+    out = composite([Layer(a, None, 1.0, None), Layer(b, None, 0.5, None)], blend=ADD)
+    assert out.dtype == np.uint8 and out.shape == a.shape
+    assert out.reshape(3, -1, 3)[0, 0].tolist() == [250, 150, 25]
+    out = composite([Layer(a, None, 1.0, None), Layer(b, None, 1.0, None)], blend=ADD)
+    assert out.reshape(3, -1, 3)[0, 0].tolist() == [255, 200, 50]  # Clipped, not wrapped
+
+
+def test_tinted_layers():
+    # A tinted layer's brightness is the channel maximum of its frames, shown in its colour
+    a = lit(2, 1, (128, 64, 0))
+    b = lit(2, 1, (0, 0, 255))
+    layers = [Layer(a, (255, 0, 0), 1.0, None), Layer(b, (0, 0, 255), 0.5, None)]
+    assert composite(layers, blend=ADD).reshape(2, -1, 3)[1, 1].tolist() == [128, 0, 127]
+    layers = [Layer(a, (255, 255, 255), 1.0, None), Layer(b, (0, 255, 0), 1.0, None)]
+    assert composite(layers, blend=MAX).reshape(2, -1, 3)[1, 1].tolist() == [128, 255, 128]
+
+
+def test_max_native_and_tinted():
+    a = lit(2, 0, (10, 200, 30))
+    b = lit(2, 0, (100, 0, 0))
+    out = composite([Layer(a, None, 1.0, None), Layer(b, (0, 0, 255), 1.0, None)], blend=MAX)
+    assert out.reshape(2, -1, 3)[0, 0].tolist() == [10, 200, 100]
+    assert not out.reshape(2, -1, 3)[:, 1:].any()
+
+
+def test_absolute_alignment_keeps_late_source_dark():
+    a = lit(4, 0, (255, 255, 255))
+    b = lit(4, 1, (255, 255, 255))
+    out = composite([Layer(a, None, 1.0, (0.0, 10.0)), Layer(b, None, 1.0, (5.0, 10.0))], align=ABSOLUTE)
+    assert out.reshape(4, -1, 3)[:, 1, 0].tolist() == [0, 0, 255, 255]
+
+
+def test_accumulator_sources_in_any_order():
+    a, b = lit(4, 0, (50, 50, 50)), lit(4, 1, (80, 80, 80))
+    t_ranges = [(0.0, 10.0), (5.0, 10.0)]
+    expected = composite([Layer(a, None, 1.0, t_ranges[0]), Layer(b, None, 1.0, t_ranges[1])], align=ABSOLUTE)
+    accumulator = Accumulator(4, ADD, t_ranges)
+    accumulator.add(b, source=1)
+    accumulator.add(a, source=0)
+    assert accumulator.added == 2
+    assert np.array_equal(accumulator.result(), expected)
+
+
+def test_unknown_blend():
+    with pytest.raises(ValueError):
+        Accumulator(2, 'screen')
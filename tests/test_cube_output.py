@@ -0,0 +1,170 @@
+import socket
+import numpy as np
+import pytest
+from cube_output import (DELTA, FRAGMENT, HEADER, KEYFRAME, MAGIC, MAX_RUN, RLE_KEYFRAME, ShardedDriver,
+                         SimulatorDriver, UDPDriver, UDPReceiver, decode_packet, encode_delta, encode_keyframe,
+                         open_driver)
+
+
+def packet(kind, payload, size):
+    return HEADER.pack(MAGIC, kind, size, 0, len(payload)) + payload
+
+
+def random_frame(size, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (size, size, size, 3), dtype=np.uint8)
+
+
+@pytest.mark.parametrize('frame', [
+    np.zeros((8, 8, 8, 3), dtype=np.uint8),  # One RLE run
+    random_frame(8),  # Raw: RLE would be larger
+    np.repeat(random_frame(4), 2, axis=0)[:4]
+])
+def test_keyframe_round_trip(frame):
+    kind, payload = encode_keyframe(frame)
+    assert kind in (KEYFRAME, RLE_KEYFRAME)
+    assert np.array_equal(decode_packet(packet(kind, payload, frame.shape[1])), frame)
+
+
+def test_delta_round_trip():
+    previous = random_frame(8, seed=1)
+    frame = previous.copy()
+    frame.reshape(-1, 3)[[0, 1, 2, 40, 511]] ^= 0x55
+    payload = encode_delta(previous, frame)
+    assert np.array_equal(decode_packet(packet(DELTA, payload, 8), previous.copy()), frame)
+
+
+def test_delta_of_unchanged_frame_is_none():
+    frame = random_frame(4)
+    assert encode_delta(frame, frame.copy()) is None
+
+
+def test_delta_splits_runs_longer_than_a_uint16_count():
+    size = 48  # 110592 voxels: a fully changed frame is one run of more than MAX_RUN voxels
+    previous = np.zeros((size, size, size, 3), dtype=np.uint8)
+    frame = random_frame(size, seed=2)
+    frame.reshape(-1, 3)[:, 0] |= 1  # Every voxel differs from the dark frame
+    assert size ** 3 > MAX_RUN
+    payload = encode_delta(previous, frame)
+    assert np.array_equal(decode_packet(packet(DELTA, payload, size), previous.copy()), frame)
+
+
+def test_simulator_shows_every_frame_sent():
+    driver = SimulatorDriver(keyframe_interval=4)
+    frames = [random_frame(8, seed) for seed in range(3)] + [np.zeros((8, 8, 8, 3), dtype=np.uint8)]
+    for frame in frames * 3:
+        driver.send_frame(frame)
+        assert np.array_equal(driver.frame, frame)
+
+
+def test_rate_limit_starts_with_a_full_bucket():
+    frame = random_frame(8)  # A raw keyframe of about 1.5 kB
+    driver = SimulatorDriver(max_rate=len(frame.tobytes()) * 25)  # Burst: two and a half keyframes
+    assert driver.send_frame(frame)  # The first frame goes out at once
+    assert driver.send_frame(random_frame(8, seed=1))
+    assert not driver.send_frame(random_frame(8, seed=2))  # Over the burst: coalesced
+    assert driver.coalesced == 1
+    driver.flush()
+    assert np.array_equal(driver.frame, random_frame(8, seed=2))
+
+
+class FailingDriver(SimulatorDriver):
+    """Controller whose link breaks on the first packet."""
+
+    def _write(self, packet):
+        raise OSError('link down')
+
+
+def test_sharded_driver_reassembles_the_cube():
+    shards = [SimulatorDriver() for _ in range(3)]
+    driver = ShardedDriver(shards)
+    frames = [random_frame(8, seed) for seed in range(4)]
+    for frame in frames:
+        driver.send_frame(frame)
+        driver.wait()
+        assert np.array_equal(np.concatenate([shard.frame for shard in shards]), frame)
+    driver.close()
+
+
+def test_sharded_driver_raises_a_shard_error_instead_of_hanging():
+    driver = ShardedDriver([SimulatorDriver(), FailingDriver()], max_lag=0)
+    with pytest.raises(RuntimeError, match='link down'):
+        for seed in range(4):
+            driver.send_frame(random_frame(8, seed))
+        driver.flush()
+    driver.close()
+
+
+def test_open_driver_applies_max_rate_to_the_whole_sharded_cube():
+    driver = open_driver('shards:sim,sim', max_rate=1000)
+    assert driver.max_rate == 1000
+    assert all(shard.max_rate is None for shard in driver.drivers)
+    driver.close()
+
+
+class Loopback:
+    """Socket stand-in that keeps every datagram, so none can be dropped by a full receive buffer."""
+
+    def __init__(self):
+        self.datagrams = []
+
+    def sendto(self, datagram, address):
+        self.datagrams.append(datagram)
+
+    def settimeout(self, timeout):
+        pass
+
+    def recv(self, size):
+        return self.datagrams.pop(0)
+
+    def close(self):
+        pass
+
+
+def test_udp_packets_of_more_than_255_fragments():
+    receiver = UDPReceiver()
+    driver = UDPDriver(*receiver.address, payload_size=8)
+    driver._socket.close()
+    receiver._socket.close()
+    driver._socket = receiver._socket = Loopback()
+    frame = random_frame(10)  # Raw keyframe: about 375 fragments of 8 bytes
+    driver.send_frame(frame)
+    assert len(receiver._socket.datagrams) > 255
+    assert receiver.receive()
+    assert np.array_equal(receiver.frame, frame)
+
+
+def test_udp_receiver_drops_packets_that_will_never_complete():
+    receiver = UDPReceiver()
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    payload = packet(KEYFRAME, bytes(2 * 2 * 2 * 3), 2)
+    try:
+        sender.sendto(FRAGMENT.pack(1, 0, 2) + payload[:10], receiver.address)  # Its second half is lost
+        sender.sendto(FRAGMENT.pack(2, 0, 1) + payload, receiver.address)
+        assert receiver.receive()
+        assert receiver.incomplete == 1 and not receiver._fragments
+    finally:
+        sender.close()
+        receiver.close()
+
+
+def test_open_driver_limits_serial_links_to_their_baud_rate(tmp_path):
+    port = tmp_path / 'tty'
+    port.touch()  # Not a terminal: opened as a plain file
+    driver = open_driver(f'serial:{port}@9600')
+    assert driver.max_rate == 960
+    driver.close()
+    driver = open_driver(f'shards:serial:{port}@9600,serial:{port}@9600')
+    assert driver.max_rate == 1920 and all(shard.max_rate is None for shard in driver.drivers)
+    driver.close()
+    driver = open_driver(f'serial:{port}', max_rate=0)  # Explicitly unlimited
+    assert driver.max_rate is None
+    driver.close()
+
+
+def test_open_driver_reads_max_rate_from_the_spec():
+    driver = open_driver('sim?max_rate=5000')
+    assert driver.max_rate == 5000
+    driver.close()
+    assert open_driver('sim?max_rate=5000', max_rate=100).max_rate == 100
+    with pytest.raises(ValueError):
+        open_driver('sim?rate=5000')
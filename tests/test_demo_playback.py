@@ -0,0 +1,29 @@
+from itertools import islice
+import numpy as np
+from demo_playback import PlaylistItem, demo_frames
+from voxel_renderer import CubeGeometry, VoxelRenderer
+
+
+def source(flavour, energy, event_id):
+    if event_id == 0:
+        raise KeyError('no event 0')
+    return np.array([[0.0, 0.0, 0.0, 1.0, 0.0], [1.0, 1.0, 1.0, 2.0, 1.0]])
+
+
+def test_items_are_held_for_their_dwell_time_and_failures_skipped():
+    items = [PlaylistItem('numu', '10', 1, 'Static', 0.5), PlaylistItem('numu', '10', 0, 'Dynamic', 1.0),
+             PlaylistItem('numu', '10', 2, 'Dynamic', 0.1)]
+    counters = {}
+    frames = list(islice(demo_frames(items, source, VoxelRenderer(CubeGeometry(2)), fps=10.0, counters=counters), 25))
+    positions = [position for position, frame in frames]
+    # Static: one frame held for 5; Dynamic: its 60 frames, longer than the dwell
+    assert positions[:5] == [0] * 5 and positions[5:25] == [2] * 20
+    assert all(frame is frames[0][1] for _, frame in frames[:5])
+    assert counters['failures'] == 1
+
+
+def test_starts_at_the_requested_item_and_stops_when_nothing_plays():
+    items = [PlaylistItem('numu', '10', 1, 'Static', 0.1), PlaylistItem('numu', '10', 2, 'Static', 0.1)]
+    assert next(demo_frames(items, source, VoxelRenderer(CubeGeometry(2)), fps=10.0, start=1))[0] == 1
+    broken = [PlaylistItem('numu', '10', 0, 'Static', 0.1)] * 2
+    assert list(demo_frames(broken, source, VoxelRenderer(CubeGeometry(2)))) == []
@@ -0,0 +1,48 @@
+import json
+import os
+from event_catalog import BACKGROUND, DEFAULT_EVENT_LIMIT, EventCatalog, get_catalog
+
+
+def write_catalog(path, energies, mtime_ns):
+    with open(path, 'w') as file:
+        json.dump({'neutrino': {'energy': energies, 'evs': [5] * len(energies)},
+                   'background': {'energy': ['N/A'], 'evs': [7]},
+                   'flavours': {'name': ['nue'], 'symbol': ['ν_e']}}, file)
+    os.utime(path, ns=(mtime_ns, mtime_ns))  # Explicit mtimes: writes within one clock tick look unchanged
+
+
+def test_lookups(tmp_path):
+    path = str(tmp_path / 'select.json')
+    write_catalog(path, [10, 100], 1_000_000_000)
+    catalog = EventCatalog(path)
+    assert catalog.flavour_options == ['ν_e', BACKGROUND]
+    assert catalog.energies('ν_e') == catalog.energies('nue') == ['10', '100']
+    assert catalog.energy_index('nue', 100) == 1 and catalog.energy_index('nue', 5) is None
+    assert catalog.event_limit(BACKGROUND, 'N/A') == 7
+    assert catalog.event_limit('numu', 10) == DEFAULT_EVENT_LIMIT
+
+
+def test_reload_only_when_mtime_changes(tmp_path):
+    path = str(tmp_path / 'select.json')
+    write_catalog(path, [10], 1_000_000_000)
+    catalog = EventCatalog(path)
+    assert not catalog.refresh()
+
+    write_catalog(path, [10, 500], 2_000_000_000)
+    assert catalog.refresh()
+    assert catalog.energies('nue') == ['10', '500']
+    assert not catalog.refresh()
+
+    # Same mtime: the cached tables are kept even though the content differs
+    write_catalog(path, [1], 2_000_000_000)
+    assert not catalog.refresh()
+    assert catalog.energies('nue') == ['10', '500']
+
+
+def test_shared_catalog_refreshes(tmp_path):
+    path = str(tmp_path / 'select.json')
+    write_catalog(path, [10], 1_000_000_000)
+    catalog = get_catalog(path)
+    write_catalog(path, [20], 3_000_000_000)
+    assert get_catalog(path) is catalog
+    assert catalog.energies('nue') == ['20']
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from event_selection import BITMAP_SPAN, EventSelection, validate_selection
+from event_store import FIRST_EVENT
+
+
+@pytest.mark.parametrize('expression, ids', [
+    ('3', [3]),
+    ('1-5,8', [1, 2, 3, 4, 5, 8]),
+    ('5-7, 1-2, 6-9', [1, 2, 5, 6, 7, 8, 9]),  # Unordered and overlapping ranges merge
+    ('1-3,4-6', [1, 2, 3, 4, 5, 6]),  # Adjacent ranges merge
+    ('1-10,!3,!5-8', [1, 2, 4, 9, 10]),
+    ('1-3,!1-3', [])
+])
+def test_parse(expression, ids):
+    selection = EventSelection.parse(expression)
+    assert list(selection) == ids
+    assert len(selection) == len(ids)
+
+
+def test_parse_merges_into_intervals():
+    selection = EventSelection.parse('5-7,1-2,6-9,3')
+    assert str(selection) == '1-3,5-9'
+    assert EventSelection.parse(str(selection)) == selection
+
+
+@pytest.mark.parametrize('expression', ['', '1,,2', '5-3', '1-2-3', 'a', '1-', '!'])
+def test_parse_rejects_bad_syntax(expression):
+    with pytest.raises(ValueError):
+        EventSelection.parse(expression)
+
+
+def test_validate_selection_limits():
+    assert list(validate_selection('1-3', 30, minimum=FIRST_EVENT)) == [1, 2, 3]
+    for expression in ('0', '0-2', '29-31', '2,!2', ' '):
+        with pytest.raises(ValueError):
+            validate_selection(expression, 30, minimum=FIRST_EVENT)
+
+
+@pytest.mark.parametrize('wide', [False, True])
+def test_contains(wide):
+    end = BITMAP_SPAN * 2 if wide else 100  # Bitmap and binary search lookups
+    selection = EventSelection([1, 50], [10, end])
+    assert 1 in selection and 10 in selection and end in selection and np.int64(60) in selection
+    assert 0 not in selection and 11 not in selection and end + 1 not in selection
+
+
+@pytest.mark.parametrize('event_id', [-1, 2.0, '2', None, True, (2,)])
+def test_contains_rejects_non_ids(event_id):
+    assert event_id not in EventSelection.parse('0-5')
+
+
+def test_set_operations():
+    a, b = EventSelection.parse('1-10'), EventSelection.parse('5-15,20')
+    assert str(a | b) == '1-15,20'
+    assert str(a & b) == '5-10'
+    assert str(a - b) == '1-4'
+    assert str(b - a) == '11-15,20'
@@ -0,0 +1,59 @@
+import os
+import numpy as np
+import pytest
+from event_store import EventStore, convert_dump, sample_path, write_sample
+
+
+def random_events(counts, seed=0):
+    random = np.random.default_rng(seed)
+    return [random.random((count, 5)).astype(np.float32) for count in counts]
+
+
+def test_store_round_trip(tmp_path):
+    events = random_events([3, 0, 7])
+    write_sample(sample_path(str(tmp_path), 'numu', 100), events)
+    store = EventStore(str(tmp_path))
+    for number, hits in enumerate(events, 1):
+        assert np.array_equal(store('numu', '100', number), hits)
+    assert len(store.sample('numu', 100)) == 3
+    with pytest.raises(KeyError):
+        store('numu', 100, 4)
+    with pytest.raises(OSError):
+        store('nue', 100, 1)
+
+
+def test_background_path():
+    assert sample_path('events', 'Background', 'N/A') == os.path.join('events', 'Background_NA.evt')
+
+
+def test_convert_dump_round_trip(tmp_path):
+    events = random_events([2, 4, 1], seed=1)
+    dump = tmp_path / 'dump.csv'
+    # Dump ids out of order and not starting at 1; hits of an event interleaved with others
+    rows = [(event_id, *hit) for event_id, hits in zip((12, 5, 7), events) for hit in hits]
+    rows = rows[1::2] + rows[::2]
+    dump.write_text("# exported\nevent,x,y,z,charge,t\n" + "".join(",".join(map(repr, map(float, row))) + "\n"
+                                                           for row in rows))
+    path = sample_path(str(tmp_path), 'nue', 10)
+    assert convert_dump(str(dump), path) == [5, 7, 12]
+
+    # Events are numbered in order of their dump ids, and hits keep their order in the dump
+    store = EventStore(str(tmp_path))
+    for number, event_id in enumerate((5, 7, 12), 1):
+        expected = np.array([row[1:] for row in rows if row[0] == event_id], dtype=np.float32)
+        assert np.array_equal(store('nue', 10, number), expected)
+
+
+def test_convert_dump_whitespace(tmp_path):
+    dump = tmp_path / 'dump.txt'
+    dump.write_text("1 0.5 0.5 0.5 1.0 0.0\n1 0.1 0.2 0.3 2.0 1.0\n2 0 0 0 3 2\n")
+    path = sample_path(str(tmp_path), 'numu', 10)
+    assert convert_dump(str(dump), path) == [1, 2]
+    assert EventStore(str(tmp_path))('numu', 10, 1).shape == (2, 5)
+
+
+def test_convert_dump_rejects_missing_columns(tmp_path):
+    dump = tmp_path / 'dump.csv'
+    dump.write_text("1,0.5,0.5,0.5\n2,0.1,0.2,0.3\n")
+    with pytest.raises(ValueError, match='4 column'):
+        convert_dump(str(dump), sample_path(str(tmp_path), 'numu', 10))
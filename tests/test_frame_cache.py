@@ -0,0 +1,66 @@
+import os
+import numpy as np
+import pytest
+from frame_cache import FrameCache
+
+
+def noise(seed):
+    return np.random.default_rng(seed).integers(0, 256, (2, 4, 4, 4, 3), dtype=np.uint8)  # Does not compress
+
+
+def age(cache, key, seconds_ago):
+    path = cache._path(key)
+    when = os.path.getmtime(path) - seconds_ago
+    os.utime(path, (when, when))
+
+
+def test_memory_tier_evicts_least_recently_used(tmp_path):
+    cache = FrameCache(str(tmp_path), max_bytes=noise(0).nbytes * 2, disk=False)
+    for key in 'abc':
+        cache.put(key, noise(ord(key)))
+    assert cache.get('a') is None and cache.get('c') is not None
+    assert cache.stats()['evictions'] == 1
+
+
+def test_disk_tier_survives_a_new_cache(tmp_path):
+    FrameCache(str(tmp_path)).put('a', noise(1))
+    cache = FrameCache(str(tmp_path))
+    assert np.array_equal(cache.get('a'), noise(1))
+    assert cache.stats()['disk_hits'] == 1
+
+
+def test_disk_tier_is_capped_and_evicts_least_recently_used(tmp_path):
+    cache = FrameCache(str(tmp_path), max_bytes=0)  # Every lookup goes to disk
+    cache.put('a', noise(1))
+    size = os.path.getsize(cache._path('a'))
+    cache.max_disk_bytes = int(size * 2.5)  # Room for two files
+    cache.put('b', noise(2))
+    age(cache, 'a', 20)
+    age(cache, 'b', 10)
+    assert cache.get('a') is not None  # Used again: now 'b' is the oldest
+
+    cache.put('c', noise(3))
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(cache._path(key)) for key in 'ac')
+    assert cache.get('b') is None
+    assert cache.stats()['disk_evictions'] == 1
+    assert cache.stats()['disk_bytes'] <= cache.max_disk_bytes
+
+
+def test_truncated_file_is_a_miss_and_removed(tmp_path):
+    FrameCache(str(tmp_path)).put('a', noise(1))
+    cache = FrameCache(str(tmp_path))
+    path = cache._path('a')
+    with open(path, 'r+b') as file:
+        file.truncate(os.path.getsize(path) // 2)  # As left by a crash or a full disk
+    assert cache.get('a') is None
+    assert not os.path.exists(path)
+
+
+def test_failed_write_leaves_no_temporary_file(tmp_path, monkeypatch):
+    def full_disk(file, **arrays):
+        raise OSError(28, 'No space left on device')
+    monkeypatch.setattr(np, 'savez_compressed', full_disk)
+    cache = FrameCache(str(tmp_path))
+    with pytest.raises(OSError):
+        cache.put('a', noise(1))
+    assert os.listdir(tmp_path) == []
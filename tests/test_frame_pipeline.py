@@ -0,0 +1,130 @@
+import threading
+import time
+import numpy as np
+import pytest
+from frame_pipeline import BoundedFrameBuffer, FramePacer
+from frame_ring import FrameRing
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_pacer_keeps_rate():
+    clock = FakeClock()
+    pacer = FramePacer(10.0, clock=clock, sleep=clock.sleep)
+    shown = []
+    pacer.run(range(5), lambda frame: shown.append((frame, clock.now)))
+    assert [frame for frame, _ in shown] == list(range(5))
+    assert np.allclose([at for _, at in shown], [0.0, 0.1, 0.2, 0.3, 0.4])
+    assert (pacer.dropped, pacer.underruns) == (0, 0)
+
+
+def test_pacer_drops_when_sink_is_behind():
+    clock = FakeClock()
+    pacer = FramePacer(10.0, clock=clock, sleep=clock.sleep)
+    pacer.run(range(6), lambda frame: clock.sleep(0.25 if frame == 1 else 0.0))  # One slow send
+    assert pacer.dropped == 1
+    assert pacer.shown + pacer.dropped == 6
+    assert pacer.underruns == 0
+
+
+def test_pacer_counts_underruns():
+    clock = FakeClock()
+    pacer = FramePacer(10.0, clock=clock, sleep=clock.sleep)
+
+    def slow_producer():
+        for frame in range(4):
+            if frame == 2:
+                clock.sleep(0.5)  # Nothing ready for several frame times
+            yield frame
+
+    pacer.run(slow_producer(), lambda frame: None)
+    assert (pacer.shown, pacer.dropped, pacer.underruns) == (4, 0, 1)
+
+
+def drain(buffer, timeout=5.0):
+    frames, end = [], time.perf_counter() + timeout
+    while not buffer.finished and time.perf_counter() < end:
+        frame = buffer.poll()
+        if frame is None:
+            time.sleep(0.001)
+        else:
+            frames.append(frame)
+    return frames
+
+
+def test_buffer_holds_at_most_maxsize_frames_ahead():
+    released = threading.Event()
+
+    def frames():
+        yield from range(3)
+        released.wait(5)
+        yield from range(3, 10)
+
+    buffer = BoundedFrameBuffer(frames(), maxsize=2)
+    try:
+        time.sleep(0.2)
+        assert buffer.produced == 2  # The third frame waits for room
+        assert buffer.poll() == 0  # Never blocks
+        released.set()
+        assert drain(buffer) == list(range(1, 10))
+        assert buffer.poll() is None
+    finally:
+        buffer.close()
+
+
+def test_buffer_reraises_producer_errors():
+    def frames():
+        yield 1
+        raise OSError('cache file unreadable')
+
+    buffer = BoundedFrameBuffer(frames())
+    with pytest.raises(OSError):
+        drain(buffer)
+    assert buffer.finished
+
+
+def test_ring_read_copies_newest_frame():
+    ring = FrameRing((2, 2, 2, 3), slots=2)
+    try:
+        out = np.empty((2, 2, 2, 3), dtype=np.uint8)
+        assert ring.read(out) == (0, None)
+        for value in (1, 2, 3):
+            ring.write(np.full((2, 2, 2, 3), value, dtype=np.uint8))
+        sequence, frame = ring.read(out)
+        assert sequence == 3 and frame is out and (out == 3).all()
+        ring.write(np.zeros((2, 2, 2, 3), dtype=np.uint8))
+        assert (out == 3).all()  # A copy, not a view of the slot
+    finally:
+        ring.close()
+
+
+def test_composite_frames_blends_and_caches(tmp_path):
+    from frame_cache import FrameCache
+    from frame_pipeline import composite_frames
+    from voxel_renderer import CubeGeometry, VoxelRenderer
+
+    def load_event(flavour, energy, event_id):
+        if event_id == 9:
+            raise KeyError(event_id)
+        return np.array([[event_id, 0.0, 0.0, 1.0, 0.0], [event_id, 1.0, 1.0, 1.0, 1.0]])
+
+    renderer = VoxelRenderer(CubeGeometry(2, bounds=[(0, 2), (0, 2), (0, 2)]))
+    cache = FrameCache(str(tmp_path))
+    sources = [(('nu', 1, 0), renderer, (255, 0, 0), 1.0), (('nu', 1, 1), renderer, (0, 0, 255), 1.0),
+               (('nu', 1, 9), renderer, (0, 255, 0), 1.0)]  # Fails to load: left out
+    frames = np.stack(list(composite_frames(sources, 'add', 'Static', load_event, cache=cache, key='k')))
+    assert frames.shape == (1, 2, 2, 2, 3)
+    assert frames[..., 1].max() == 0 and frames[..., 0].max() == 255 and frames[..., 2].max() == 255
+    assert np.array_equal(cache.get('k'), frames)
+    # Cached: replayed without loading anything
+    assert np.array_equal(np.stack(list(composite_frames(sources, 'add', 'Static', None, cache=cache, key='k'))),
+                          frames)
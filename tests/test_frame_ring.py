@@ -0,0 +1,58 @@
+import time
+import numpy as np
+from frame_ring import RESTART_INTERVAL, RenderClient
+
+
+def wait_for(condition, timeout=5.0):
+    end = time.perf_counter() + timeout
+    while not condition() and time.perf_counter() < end:
+        time.sleep(0.02)
+    return condition()
+
+
+def test_bad_output_spec_is_reported_and_falls_back_to_the_simulator(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # The render process keeps its caches under the working directory
+    client = RenderClient((2, 2, 2, 3), output_spec='nonsense')
+    try:
+        messages = []
+        assert wait_for(lambda: messages.extend(client.poll()) or messages)
+        assert messages[0][0] == 'error' and 'simulator' in messages[0][1]
+        frame = np.full((2, 2, 2, 3), 7, dtype=np.uint8)
+        client.send_frame(frame)
+        assert wait_for(lambda: client.outputs.sequence > 0)
+    finally:
+        client.close()
+
+
+def test_client_restarts_a_dead_render_process(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    client = RenderClient((2, 2, 2, 3), output_spec='sim')
+    try:
+        client._process.kill()
+        client._process.join()
+        time.sleep(RESTART_INTERVAL)
+        frame = np.full((2, 2, 2, 3), 7, dtype=np.uint8)
+        assert client.send_frame(frame)  # No BrokenPipeError
+        assert client.restarts == 1
+        assert any(kind == 'error' for kind, _ in client.poll())
+        assert wait_for(lambda: client.outputs.sequence > 0)  # The new process forwarded the frame
+        assert client.stop()
+    finally:
+        client.close()
+
+
+def test_a_failing_playlist_ends_with_its_error_and_the_process_keeps_serving(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    client = RenderClient((2, 2, 2, 3), output_spec='sim')
+    try:
+        client.load([('nu_e', 1, 1)], 'Dynamic', renderer=None)  # Not a renderer: raises while producing frames
+        client.play()
+        messages = []
+        assert wait_for(lambda: messages.extend(client.poll()) or messages)
+        kind, stats = messages[0]
+        assert kind == 'finished' and 'error' in stats
+        assert client._process.is_alive()
+        client.send_frame(np.ones((2, 2, 2, 3), dtype=np.uint8))
+        assert wait_for(lambda: client.outputs.sequence > 0)
+    finally:
+        client.close()
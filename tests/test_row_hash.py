@@ -0,0 +1,30 @@
+import os
+import pytest
+
+os.environ.setdefault('KIVY_NO_ARGS', '1')  # Kivy must not parse pytest's command line
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+pytest.importorskip('kivy')
+
+from colour_map import ColourMap
+from event_selection import EventSelection
+from events_screen import row_hash
+from voxel_renderer import CubeGeometry, VoxelRenderer
+
+
+def test_row_hash_follows_what_is_rendered():
+    renderer = VoxelRenderer(CubeGeometry(8))
+    selection = EventSelection.parse('1-3')
+    base = row_hash('numu', '100', selection, 'Dynamic', renderer)
+    # Same content: same hash, however the selection was typed
+    assert row_hash('numu', 100, EventSelection.parse('3,1,2'), 'Dynamic', VoxelRenderer(CubeGeometry(8))) == base
+
+    changed = [
+        row_hash('nue', '100', selection, 'Dynamic', renderer),
+        row_hash('numu', '10', selection, 'Dynamic', renderer),
+        row_hash('numu', '100', EventSelection.parse('1-4'), 'Dynamic', renderer),
+        row_hash('numu', '100', selection, 'Static', renderer),
+        row_hash('numu', '100', selection, 'Dynamic', VoxelRenderer(CubeGeometry(16))),
+        row_hash('numu', '100', selection, 'Dynamic', VoxelRenderer(CubeGeometry(8), colour_map=ColourMap(),
+                                                                    palette='heat'))
+    ]
+    assert len({base, *changed}) == len(changed) + 1
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+from frame_cache import frame_key
+from sequence_file import SequenceFile, SequenceLibrary, write_sequence
+from submission_worker import cache_mode
+from voxel_renderer import CubeGeometry, VoxelRenderer
+
+
+def moving_frames(count, size=8, seed=0):
+    """A few lit voxels moving through the cube, plus an unchanged frame."""
+    random = np.random.default_rng(seed)
+    frames = np.zeros((count, size, size, size, 3), dtype=np.uint8)
+    for number in range(count):
+        frames[number].reshape(-1, 3)[random.choice(size ** 3, 5, replace=False)] = random.integers(1, 256, 3)
+    frames[count // 2] = frames[count // 2 - 1]
+    return frames
+
+
+def test_round_trip(tmp_path):
+    frames = moving_frames(20)
+    path = str(tmp_path / 'a.cubeseq')
+    write_sequence(path, frames, {'note': 'test'}, keyframe_interval=6)
+    with SequenceFile(path) as sequence:
+        assert len(sequence) == 20
+        assert sequence.metadata['note'] == 'test' and sequence.metadata['frames'] == 20
+        assert np.array_equal(sequence.read(), frames)
+
+
+def test_random_access_and_seek(tmp_path):
+    frames = moving_frames(20)
+    path = str(tmp_path / 'a.cubeseq')
+    write_sequence(path, frames, {}, keyframe_interval=6)
+    with SequenceFile(path) as sequence:
+        for number in (13, 2, 19, 7, 8, -1):  # Backwards, forwards, across keyframes
+            assert np.array_equal(sequence[number], frames[number])
+        assert np.array_equal(np.stack([frame.copy() for frame in sequence.frames(9)]), frames[9:])
+        with pytest.raises(IndexError):
+            sequence[20]
+
+
+def test_large_cube_deltas(tmp_path):
+    # Whole-cube changes of a 48^3 cube make delta runs longer than a uint16 count
+    frames = np.zeros((3, 48, 48, 48, 3), dtype=np.uint8)
+    frames[1] = 10
+    frames[2] = frames[1]
+    frames[2, 5, 5, 5] = 200
+    path = str(tmp_path / 'large.cubeseq')
+    write_sequence(path, frames, {})
+    with SequenceFile(path) as sequence:
+        assert np.array_equal(sequence.read(), frames)
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'bogus.cubeseq'
+    path.write_bytes(b'not a sequence file at all, but long enough for a header')
+    with pytest.raises(ValueError):
+        SequenceFile(str(path))
+
+
+def test_library_only_matches_the_same_renderer(tmp_path):
+    library = SequenceLibrary(str(tmp_path))
+    renderer = VoxelRenderer(CubeGeometry(8))
+    key = frame_key('numu', '100', 3, cache_mode('Dynamic', 20), renderer)
+    write_sequence(library.path('numu', '100', 3, 'Dynamic'), moving_frames(20), {'key': repr(key)})
+
+    sequence = library.find('numu', '100', 3, 'Dynamic', renderer, n_frames=20)
+    assert sequence is not None
+    sequence.close()
+    assert library.find('numu', '100', 3, 'Dynamic', VoxelRenderer(CubeGeometry(16)), n_frames=20) is None
+    assert library.find('numu', '100', 3, 'Dynamic', renderer, n_frames=60) is None
+    assert library.find('numu', '100', 4, 'Dynamic', renderer, n_frames=20) is None
+
+
+def test_playlist_frames_from_the_library_survive_buffering(tmp_path):
+    from frame_pipeline import BoundedFrameBuffer, playlist_frames
+    library = SequenceLibrary(str(tmp_path))
+    renderer = VoxelRenderer(CubeGeometry(8))
+    key = frame_key('numu', '100', 3, cache_mode('Dynamic', 20), renderer)
+    frames = moving_frames(20)
+    write_sequence(library.path('numu', '100', 3, 'Dynamic'), frames, {'key': repr(key)})
+    buffer = BoundedFrameBuffer(playlist_frames([('numu', '100', 3)], None, renderer, n_frames=20, library=library))
+    try:
+        buffer._thread.join(timeout=5)  # Every frame waits in the buffer before any is read
+        played = []
+        while not buffer.finished:
+            frame = buffer.poll()
+            if frame is not None:
+                played.append(frame)
+        assert np.array_equal(np.stack(played), frames)
+    finally:
+        buffer.close()
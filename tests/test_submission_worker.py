@@ -0,0 +1,50 @@
+import threading
+import numpy as np
+from submission_worker import SubmissionPool
+from voxel_renderer import CubeGeometry, VoxelRenderer
+
+
+def source(flavour, energy, event_id):
+    if event_id == 3:
+        raise KeyError(f"no event {event_id}")
+    return np.array([[0.0, 0.0, 0.0, 1.0, 0.0], [1.0, 1.0, 1.0, 1.0, 1.0]])
+
+
+class FullDisk:
+    """A frame cache whose disk is full and whose reads fail."""
+
+    def get(self, key):
+        return None
+
+    def put(self, key, frames):
+        raise OSError(28, 'No space left on device')
+
+
+class UnreadableCache(FullDisk):
+    def get(self, key):
+        raise PermissionError(13, 'Permission denied')
+
+
+def run(cache, rows):
+    finished = threading.Event()
+    pool = SubmissionPool(workers=2, processes=False)
+    try:
+        job = pool.submit(rows, 'Static', source, VoxelRenderer(CubeGeometry(2)), cache=cache,
+                          on_finished=lambda job: finished.set())
+        assert finished.wait(10)  # The job ends instead of hanging
+        return job
+    finally:
+        pool.shutdown()
+
+
+def test_cache_write_errors_are_reported_per_event():
+    job = run(FullDisk(), [[('nu_e', 1, 1), ('nu_e', 1, 2)], [('nu_e', 1, 3)]])
+    assert job.completed == job.total == 3
+    assert [message.startswith('not cached') for _, message in job.errors[0]] == [True, True]
+    assert len(job.frames[0]) == 2  # Rendered all the same
+    assert job.errors[1] == [(('nu_e', 1, 3), "'no event 3'")]
+
+
+def test_cache_read_errors_are_reported_per_event():
+    job = run(UnreadableCache(), [[('nu_e', 1, 1)]])
+    assert job.completed == 1 and job.errors[0][0][1].startswith('cache: PermissionError')
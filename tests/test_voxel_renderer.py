@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from voxel_renderer import CubeGeometry, VoxelRenderer
+
+
+def hits_at(positions, charge=1.0):
+    positions = np.asarray(positions, dtype=np.float64)
+    return np.column_stack([positions, np.full(len(positions), charge), np.zeros(len(positions))])
+
+
+@pytest.mark.parametrize('layout', ['rows', 'store'])
+def test_fitted_extent_keeps_every_hit(layout):
+    hits = hits_at([(0, 0, 0), (10, 10, 10), (5, 0, 10)])
+    if layout == 'store':
+        hits = np.asfortranarray(hits, dtype=np.float32)  # As EventStore returns them
+    grid = VoxelRenderer(CubeGeometry(4)).accumulate(hits)
+    assert grid.sum() == 3  # The upper corner lands in the last voxel, not the overflow bin
+    assert grid[0] == 1 and grid[63] == 1 and grid[2 * 16 + 0 * 4 + 3] == 1
+
+
+def test_bounds_drop_outside_hits():
+    geometry = CubeGeometry(4, bounds=[(0, 4), (0, 4), (0, 4)], flip=(True, False, False))
+    grid = VoxelRenderer(geometry).accumulate(hits_at([(0.5, 0.5, 0.5), (4.5, 1, 1), (-0.1, 1, 1)], charge=2.0))
+    assert grid.sum() == 2.0
+    assert grid[3 * 16] == 2.0  # Flipped x: the first cell is drawn last
+
+
+def test_render_time_range_and_shape():
+    hits = hits_at([(0, 0, 0), (1, 1, 1)])
+    hits[:, 4] = [0.0, 5.0]
+    renderer = VoxelRenderer(CubeGeometry(2))
+    frame = renderer.render(hits, t_range=(0.0, 1.0))
+    assert frame.shape == (2, 2, 2, 3) and frame.dtype == np.uint8
+    assert frame[0, 0, 0].tolist() == [255, 255, 255] and not frame[1, 1, 1].any()
@@ -0,0 +1,144 @@
+import copy
+import numpy as np
+from instrumentation import span
+from colour_map import BY_FLAVOUR
+
+# Columns of a hit array: one row per energy deposit
+X, Y, Z, CHARGE, T = range(5)
+INDEX_BLOCK = 32768  # Hits per block in CubeGeometry.voxel_index, small enough for the CPU cache
+
+
+class CubeGeometry:
+    """Maps detector coordinates onto an N x N x N LED cube."""
+
+    def __init__(self, size=8, bounds=None, axes=(X, Y, Z), flip=(False, False, False)):
+        self.size = size  # LEDs along each edge of the cube
+        # ((xmin, xmax), (ymin, ymax), (zmin, zmax)) in detector units; None fits each event's extent
+        self.bounds = None if bounds is None else np.asarray(bounds, dtype=np.float64)
+        self.axes = tuple(axes)  # Detector column shown along each cube axis
+        self.flip = tuple(flip)  # Mirror a cube axis (e.g. to match how the cube is mounted)
+
+    @property
+    def voxels(self):
+        return self.size ** 3
+
+    @property
+    def shape(self):
+        return (self.size, self.size, self.size)
+
+    def key(self):
+        """Hashable description of the geometry (used e.g. to key caches)."""
+        bounds = None if self.bounds is None else tuple(map(tuple, self.bounds.tolist()))
+        return self.size, bounds, self.axes, self.flip
+
+    def voxel_index(self, hits):
+        """Flat voxel index of every hit; hits outside the cube get the overflow index `voxels`.
+
+        About 11 ms per million hits in the event store's float32 column layout and 18 ms for
+        row-major float64 arrays (one core). A whole frame of 1M hits renders in about 16 / 25 ms and
+        3M hits in about 62 / 97 ms, so Static rendering keeps up with 30 fps for events of up to
+        ~1.5M hits (store layout) or ~1M hits (row-major).
+        Dynamic playback bins each event once (see event_frames) and is not limited by this.
+        """
+        size = self.size
+        first, last = min(self.axes), max(self.axes)
+        # Coordinates as contiguous float32 rows whatever the hits' layout and dtype: later passes read
+        # half the bytes of float64. Copied in blocks, as a strided row-major column is slow to gather
+        coords = np.empty((last - first + 1, len(hits)), dtype=np.float32)
+        for start in range(0, len(hits), INDEX_BLOCK):
+            np.copyto(coords[:, start:start + INDEX_BLOCK].T, hits[start:start + INDEX_BLOCK, first:last + 1],
+                      casting='unsafe')
+        if self.bounds is None:
+            # Fitted to the event's own extent
+            rows = np.subtract(self.axes, first)
+            lows, highs = coords.min(axis=1)[rows], coords.max(axis=1)[rows]
+        else:
+            lows, highs = self.bounds[:, 0], self.bounds[:, 1]
+        extents = np.where(highs > lows, highs - lows, 1.0)
+
+        flat = np.empty(len(hits), dtype=np.int32)  # int32 keeps the index passes cheap for any real cube
+        cells = np.empty(INDEX_BLOCK, dtype=np.int32)
+        test = np.empty(INDEX_BLOCK, dtype=bool)
+        outside = np.zeros(len(hits), dtype=bool) if self.bounds is not None else None
+        # Every pass of a block runs in the CPU cache instead of streaming the whole event through memory
+        for start in range(0, len(hits), INDEX_BLOCK):
+            stop = min(start + INDEX_BLOCK, len(hits))
+            block, block_cells, block_test = flat[start:stop], cells[:stop - start], test[:stop - start]
+            for axis, column in enumerate(self.axes):
+                # Scale the coordinate to [0, size]
+                scaled = coords[column - first, start:stop]
+                scaled -= np.float32(lows[axis])
+                scaled *= np.float32(size / extents[axis])
+                if outside is not None:  # Fitted to the event's own extent every hit is inside
+                    outside[start:stop] |= np.less(scaled, 0, out=block_test)
+                    outside[start:stop] |= np.greater(scaled, size, out=block_test)
+
+                # A hit exactly on the upper bound belongs to the last voxel. The first axis is
+                # written straight into the index, later ones are appended to it
+                target = block if axis == 0 else block_cells
+                np.copyto(target, scaled, casting='unsafe')
+                np.minimum(target, size - 1, out=target)
+                if self.flip[axis]:
+                    np.subtract(size - 1, target, out=target)
+                if axis:
+                    block *= size
+                    block += block_cells
+
+        if outside is not None:
+            flat[outside] = self.voxels  # Overflow bin, dropped after binning
+        return flat
+
+
+class VoxelRenderer:
+    """Bins an event's energy deposits into a voxel grid and turns it into uint8 RGB frames."""
+
+    def __init__(self, geometry=None, colour=(255, 255, 255), charge_scale=None, colour_map=None, palette=None):
+        self.geometry = geometry or CubeGeometry()
+        self.colour = np.asarray(colour, dtype=np.float32)  # Colour of a fully lit voxel
+        self.charge_scale = charge_scale  # Charge mapped to full brightness; None uses each frame's maximum
+        # Lookup-table colouring (colour_map.ColourMap) replacing the single colour when set
+        self.colour_map = colour_map
+        self.palette = palette  # Palette of the colour map, or colour_map.BY_FLAVOUR
+
+    def key(self):
+        """Hashable description of the cube geometry and colour mapping."""
+        tables = None if self.colour_map is None else (self.colour_map.key(), self.palette)
+        return self.geometry.key(), tuple(self.colour.tolist()), self.charge_scale, tables
+
+    def for_flavour(self, flavour):
+        """The renderer to use for one flavour's events: with a BY_FLAVOUR palette, that flavour's."""
+        if self.colour_map is None or self.palette != BY_FLAVOUR:
+            return self
+        renderer = copy.copy(self)  # Shares geometry and tables, only the palette differs
+        renderer.palette = self.colour_map.palette_for(flavour)
+        return renderer
+
+    def accumulate(self, hits, t_range=None):
+        """Total charge per voxel as a flat float array, optionally for hits with t in [start, stop)."""
+        hits = np.asarray(hits)
+        if not hits.size:
+            return np.zeros(self.geometry.voxels, dtype=np.float64)
+
+        flat = self.geometry.voxel_index(hits)
+        if t_range is not None:
+            flat[(hits[:, T] < t_range[0]) | (hits[:, T] >= t_range[1])] = self.geometry.voxels
+        # bincount sums in float64; converting the weights up front is much cheaper than its own cast
+        charge = hits[:, CHARGE].astype(np.float64)
+        grid = np.bincount(flat, weights=charge, minlength=self.geometry.voxels + 1)
+        return grid[:-1]  # Drop the overflow bin
+
+    def shade(self, grid, scale=None):
+        """Turn per-voxel charge (any leading shape, voxels last) into uint8 RGB values."""
+        if scale is None:
+            scale = self.charge_scale
+        if scale is None:
+            scale = grid.max(axis=-1, keepdims=True)
+        level = np.clip(grid / np.where(scale > 0, scale, 1.0), 0.0, 1.0)
+        if self.colour_map is not None:
+            return self.colour_map.apply(level, self.palette)
+        return (level[..., None] * self.colour).astype(np.uint8)
+
+    def render(self, hits, t_range=None):
+        """Render one frame of shape (N, N, N, 3), dtype uint8."""
+        with span('render'):
+            return self.shade(self.accumulate(hits, t_range)).reshape(self.geometry.shape + (3,))